@@ -0,0 +1,253 @@
+import calendar
+from collections import namedtuple
+from datetime import date
+
+from dimensiones import DIMENSIONES
+
+# Dimensiones de agrupación permitidas -> expresión sobre movimientos
+EXPRESIONES = {
+    'dia': 'fecha',
+    # Lunes de la semana de la fecha
+    'semana': "date(fecha, 'weekday 0', '-6 days')",
+    'mes': 'mes',
+    'anio': 'substr(mes, 1, 4)',
+}
+# tipo, categoria, subcategoria y metodoPago se agrupan por id y se traducen al final
+COLUMNAS_ID = {columna: (tabla, columna_id) for tabla, columna, columna_id in DIMENSIONES}
+
+DIMENSIONES_VALIDAS = tuple(EXPRESIONES) + tuple(COLUMNAS_ID)
+
+MEDIDAS = {'suma': 'SUM(monto)', 'cantidad': 'COUNT(*)', 'promedio': 'AVG(monto)'}
+
+# Las mismas medidas sobre filas ya agrupadas que traen suma y cantidad
+MEDIDAS_PREAGREGADAS = {
+    'suma': 'SUM(suma)', 'cantidad': 'SUM(cantidad)', 'promedio': 'SUM(suma) / SUM(cantidad)',
+}
+
+# Columnas de idx_mes_tipo_categoria (más monto) y la posición de cada dimensión que cubre
+COLUMNAS_INDICE = ('mes', 'tipo_id', 'categoria_id', 'subcategoria_id')
+POSICION_INDICE = {'mes': 0, 'anio': 0, 'tipo': 1, 'categoria': 2, 'subcategoria': 3}
+DIMENSIONES_INDICE = set(POSICION_INDICE)
+FILTROS_INDICE = {'tipo', 'categoria', 'subcategoria'}
+
+# Filtros que resumen_mes tiene precalculados como columna
+COLUMNAS_RESUMEN = {
+    ('tipo', 'Ingreso'): 'ingresos',
+    ('tipo', 'Egreso'): 'egresos',
+    ('categoria', 'Gastos basicos'): 'gastos_basicos',
+    ('categoria', 'Gastos deseo'): 'gastos_deseo',
+}
+
+Consulta = namedtuple('Consulta', 'dimensiones medidas filtros desde hasta')
+
+# fuente: ninguna (un filtro no existe), resumen_mes, memoria, indice o movimientos
+Plan = namedtuple('Plan', 'fuente motivo')
+
+
+def leer_fecha(valor, parametro):
+    """Valida una fecha AAAA-MM-DD de la query string. Lanza ValueError si es inválida."""
+    try:
+        if len(valor) != 10:
+            raise ValueError
+        date.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f'{parametro} inválido: {valor}. Debe tener formato AAAA-MM-DD')
+    return valor
+
+
+def _lista(args, parametro, validos, por_defecto=()):
+    valores = tuple(v.strip() for v in args.get(parametro, '').split(',') if v.strip()) or por_defecto
+    invalidos = [v for v in valores if v not in validos]
+    if invalidos:
+        raise ValueError(f'{parametro} inválido: {", ".join(invalidos)}. Debe ser de: {", ".join(validos)}')
+    if len(set(valores)) != len(valores):
+        raise ValueError(f'{parametro} tiene valores repetidos')
+    return valores
+
+
+def leer_consulta(args):
+    """Lee dimensiones, medidas, filtros y rango de fechas de la query string. Lanza ValueError si son inválidos."""
+    dimensiones = _lista(args, 'dimensiones', DIMENSIONES_VALIDAS)
+    if sum(d in EXPRESIONES for d in dimensiones) > 1:
+        raise ValueError(f'Solo se puede agrupar por una dimensión de tiempo ({", ".join(EXPRESIONES)})')
+    medidas = _lista(args, 'medidas', tuple(MEDIDAS), ('suma',))
+    filtros = {columna: args[columna] for columna in COLUMNAS_ID if args.get(columna)}
+    desde = leer_fecha(args['desde'], 'desde') if args.get('desde') else None
+    hasta = leer_fecha(args['hasta'], 'hasta') if args.get('hasta') else None
+    return Consulta(dimensiones, medidas, filtros, desde, hasta)
+
+
+def meses_completos(consulta):
+    """(primer mes, último mes) si desde y hasta abarcan meses completos; None si cortan un mes."""
+    if consulta.desde and consulta.desde[8:] != '01':
+        return None
+    if consulta.hasta:
+        anio, mes, dia = map(int, consulta.hasta.split('-'))
+        if dia != calendar.monthrange(anio, mes)[1]:
+            return None
+    return (consulta.desde and consulta.desde[:7], consulta.hasta and consulta.hasta[:7])
+
+
+def planificar(conn, consulta, motor=None):
+    """Elige la fuente más barata que puede responder la consulta."""
+    for columna, valor in consulta.filtros.items():
+        tabla, _ = COLUMNAS_ID[columna]
+        if conn.execute(f'SELECT 1 FROM {tabla} WHERE nombre = ?', (valor,)).fetchone() is None:
+            return Plan('ninguna', f'No existe {columna} {valor}: el resultado es vacío sin leer movimientos')
+
+    meses = meses_completos(consulta)
+    if meses is None:
+        return Plan('movimientos', 'El rango de fechas corta un mes: se filtra por fecha con idx_fecha')
+
+    dimensiones, filtros = set(consulta.dimensiones), consulta.filtros
+    if dimensiones <= {'mes', 'anio'} and _columna_resumen(conn, consulta) is not None:
+        return Plan('resumen_mes', 'Totales mensuales precalculados: una fila por mes')
+
+    if dimensiones <= DIMENSIONES_INDICE and set(filtros) <= FILTROS_INDICE:
+        if motor is not None:
+            return Plan('memoria', 'Columnas en memoria del motor analítico')
+        return Plan('indice', 'Preagrupa en el orden de idx_mes_tipo_categoria (índice de cobertura, sin ordenar)')
+
+    return Plan('movimientos', 'Agrupa o filtra por día, semana o método de pago: recorre movimientos')
+
+
+def _columna_resumen(conn, consulta):
+    """Columna de resumen_mes que responde la consulta, o None si no alcanza con el resumen."""
+    if not consulta.filtros:
+        # La suma de todos los montos es ingresos + egresos solo si no hay otros tipos
+        otros = conn.execute("SELECT COUNT(*) FROM tipos WHERE nombre NOT IN ('Ingreso', 'Egreso')").fetchone()[0]
+        return None if otros else 'ingresos + egresos'
+    if len(consulta.filtros) > 1:
+        return None
+    columna = COLUMNAS_RESUMEN.get(next(iter(consulta.filtros.items())))
+    # Con un filtro el resumen no tiene la cantidad de movimientos de esa columna
+    if columna is None or set(consulta.medidas) != {'suma'}:
+        return None
+    return columna
+
+
+def ejecutar(conn, consulta, plan, motor=None):
+    """Devuelve las filas agregadas (un dict por grupo) usando la fuente del plan."""
+    if plan.fuente == 'ninguna':
+        return []
+    if plan.fuente == 'resumen_mes':
+        return _desde_resumen(conn, consulta)
+    if plan.fuente == 'memoria':
+        return _desde_memoria(consulta, motor)
+    sql, valores = consulta_sql(consulta, plan.fuente == 'indice')
+    return [dict(fila) for fila in conn.execute(sql, valores)]
+
+
+def _desde_resumen(conn, consulta):
+    columna = _columna_resumen(conn, consulta)
+    dimension = {'mes': "NULLIF(mes, '') AS mes", 'anio': "substr(NULLIF(mes, ''), 1, 4) AS anio"}
+    seleccion = [dimension[d] for d in consulta.dimensiones]
+    medidas = {
+        'suma': f'SUM({columna}) AS suma',
+        'cantidad': 'SUM(movimientos) AS cantidad',
+        'promedio': f'SUM({columna}) / SUM(movimientos) AS promedio',
+    }
+    seleccion += [medidas[m] for m in consulta.medidas]
+    desde, hasta = meses_completos(consulta)
+    condiciones, valores = [], []
+    if desde:
+        condiciones.append('mes >= ?')
+        valores.append(desde)
+    if hasta:
+        condiciones.append('mes <= ?')
+        valores.append(hasta)
+    if desde or hasta:
+        # Las fechas inválidas se guardan con mes '' y ningún rango de fechas las incluye
+        condiciones.append("mes != ''")
+    if consulta.filtros:
+        # Los montos son positivos: un mes sin movimientos de la columna tiene 0
+        condiciones.append(f'{columna} != 0')
+    sql = f'SELECT {", ".join(seleccion)} FROM resumen_mes'
+    if condiciones:
+        sql += ' WHERE ' + ' AND '.join(condiciones)
+    if consulta.dimensiones:
+        sql += f' GROUP BY {", ".join(consulta.dimensiones)}'
+    sql += ' HAVING SUM(movimientos) > 0'
+    if consulta.dimensiones:
+        sql += f' ORDER BY {", ".join(consulta.dimensiones)}'
+    return [dict(fila) for fila in conn.execute(sql, valores)]
+
+
+def _desde_memoria(consulta, motor):
+    from analitica import ordinal_mes
+
+    desde, hasta = meses_completos(consulta)
+    filas = motor.agregar(
+        consulta.dimensiones, consulta.filtros,
+        ordinal_mes(desde) if desde else None, ordinal_mes(hasta) if hasta else None,
+    )
+    for fila in filas:
+        if 'promedio' in consulta.medidas:
+            fila['promedio'] = fila['suma'] / fila['cantidad']
+        for medida in ('suma', 'cantidad'):
+            if medida not in consulta.medidas:
+                del fila[medida]
+    # Mismo orden que el ORDER BY de las fuentes SQL (los nombres, no los ids)
+    return sorted(filas, key=lambda fila: tuple((fila[d] is not None, fila[d]) for d in consulta.dimensiones))
+
+
+def consulta_sql(consulta, indice=False):
+    """Arma el SELECT agregado sobre movimientos.
+
+    Con indice=True primero agrupa por el prefijo de idx_mes_tipo_categoria que
+    cubre las dimensiones pedidas: SQLite recorre el índice en orden sin ordenar
+    ni leer la tabla, y el resultado (pocas filas por mes) se vuelve a agrupar.
+    """
+    condiciones, valores = [], []
+    for columna, valor in consulta.filtros.items():
+        tabla, columna_id = COLUMNAS_ID[columna]
+        condiciones.append(f'{columna_id} = (SELECT id FROM {tabla} WHERE nombre = ?)')
+        valores.append(valor)
+    if indice:
+        desde, hasta = meses_completos(consulta)
+        limites = (('mes >= ?', desde), ('mes <= ?', hasta))
+    else:
+        limites = (('fecha >= ?', consulta.desde), ('fecha <= ?', consulta.hasta))
+    for condicion, valor in limites:
+        if valor:
+            condiciones.append(condicion)
+            valores.append(valor)
+    donde = ' WHERE ' + ' AND '.join(condiciones) if condiciones else ''
+
+    if indice:
+        prefijo = COLUMNAS_INDICE[:max((POSICION_INDICE[d] + 1 for d in consulta.dimensiones), default=0)]
+        origen = (
+            f'(SELECT {"".join(c + ", " for c in prefijo)}SUM(monto) AS suma, COUNT(*) AS cantidad'
+            f' FROM movimientos INDEXED BY idx_mes_tipo_categoria{donde}'
+            + (f' GROUP BY {", ".join(prefijo)}' if prefijo else '') + ')'
+        )
+        medidas, donde = MEDIDAS_PREAGREGADAS, ''
+    else:
+        origen, medidas = 'movimientos', MEDIDAS
+
+    internas = []
+    externas = []
+    uniones = []
+    for dimension in consulta.dimensiones:
+        if dimension in EXPRESIONES:
+            internas.append(f'{EXPRESIONES[dimension]} AS {dimension}')
+            externas.append(f'a.{dimension}')
+        else:
+            tabla, columna_id = COLUMNAS_ID[dimension]
+            internas.append(columna_id)
+            externas.append(f'{dimension}.nombre AS {dimension}')
+            uniones.append(f'JOIN {tabla} {dimension} ON {dimension}.id = a.{columna_id}')
+    grupos = len(internas)
+    internas += [f'{medidas[m]} AS {m}' for m in consulta.medidas]
+    externas += [f'a.{m}' for m in consulta.medidas]
+
+    sql = f'SELECT {", ".join(internas)} FROM {origen}{donde}'
+    if grupos:
+        sql += ' GROUP BY ' + ', '.join(str(i) for i in range(1, grupos + 1))
+    # Sin dimensiones y sin filas SQLite devolvería igual una fila con SUM NULL
+    sql += f' HAVING {medidas["cantidad"]} > 0'
+
+    sql = f'SELECT {", ".join(externas)} FROM ({sql}) a ' + ' '.join(uniones)
+    if consulta.dimensiones:
+        sql += ' ORDER BY ' + ', '.join(consulta.dimensiones)
+    return sql, valores
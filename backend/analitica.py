@@ -0,0 +1,483 @@
+import math
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from dimensiones import DIMENSIONES
+
+# Filas leídas de movimientos por cada fetchmany al cargar
+TAMANO_LOTE = 50000
+
+# Filas nuevas desde la última carga. El mes llega como ordinal año * 12 + mes - 1
+# (-1 si la fecha es inválida) para no convertir textos en Python.
+LEER_MOVIMIENTOS = '''
+    SELECT
+        id,
+        IFNULL(CAST(substr(mes, 1, 4) AS INTEGER) * 12 + CAST(substr(mes, 6, 2) AS INTEGER) - 1, -1),
+        tipo_id, categoria_id, subcategoria_id, monto
+    FROM movimientos
+    WHERE id > ?
+    ORDER BY id
+'''
+
+# version_datos sube con cada escritura; version_bajas solo con updates y deletes
+LEER_VERSIONES = '''
+    SELECT clave, valor FROM metadatos WHERE clave IN ('version_datos', 'version_bajas')
+'''
+
+Columnas = namedtuple('Columnas', 'mes tipo categoria subcategoria monto')
+
+# Estado visible para las consultas: columnas recortadas a las filas cargadas, las
+# posiciones de las filas ordenadas por mes (orden) con sus meses (meses, para
+# buscar un mes con searchsorted) y los nombres e ids de cada dimensión
+Vista = namedtuple('Vista', 'columnas orden meses nombres ids')
+
+# Tabla de dimensión de cada columna codificada
+TABLAS = {'tipo': 'tipos', 'categoria': 'categorias', 'subcategoria': 'subcategorias'}
+
+CATEGORIAS_EGRESOS = ('Gastos basicos', 'Gastos deseo')
+
+
+def ordinal_mes(mes):
+    """'AAAA-MM' -> año * 12 + mes - 1, o None si el texto no es un mes."""
+    try:
+        if len(mes) == 7 and mes[4] == '-':
+            return int(mes[:4]) * 12 + int(mes[5:]) - 1
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def texto_mes(ordinal):
+    """Inversa de ordinal_mes; el ordinal -1 (fecha inválida) es None."""
+    if ordinal < 0:
+        return None
+    return f'{ordinal // 12:04d}-{ordinal % 12 + 1:02d}'
+
+
+def _tipo_codigo(maximo):
+    # int8 mientras los ids entren; si una dimensión crece se usa el entero más chico que alcance
+    for tipo in (np.int8, np.int16, np.int32):
+        if maximo <= np.iinfo(tipo).max:
+            return np.dtype(tipo)
+    return np.dtype(np.int64)
+
+
+class MotorAnalitico:
+    """Copia en memoria de movimientos como columnas NumPy para los endpoints de agregación.
+
+    Se carga completa la primera vez y después solo agrega las filas nuevas
+    (ids mayores al último cargado). Si hubo updates o deletes (version_bajas
+    cambió) vuelve a cargar todo. Las agregaciones usan bincount sobre los
+    códigos de las dimensiones, que son los mismos ids de movimientos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columnas = None
+        self._filas = 0
+        self._ultimo_id = 0
+        self._versiones = None
+        self._vista = None
+        self._cargas = 0
+        self._incrementales = 0
+
+    def sincronizar(self, conn):
+        """Pone la copia al día con la base; no hace nada si la versión de los datos no cambió."""
+        versiones = dict(conn.execute(LEER_VERSIONES).fetchall())
+        versiones = (versiones.get('version_datos'), versiones.get('version_bajas'))
+        if versiones == self._versiones:
+            return
+        with self._lock:
+            if versiones == self._versiones:
+                return
+            if self._versiones is None or versiones[1] != self._versiones[1] or not self._agregar(conn):
+                self._cargar(conn)
+            self._versiones = versiones
+
+    def _leer_dimensiones(self, conn):
+        nombres = {}
+        for tabla, _, _ in DIMENSIONES:
+            nombres[tabla] = dict(conn.execute(f'SELECT id, nombre FROM {tabla}').fetchall())
+        ids = {tabla: {nombre: id_ for id_, nombre in valores.items()} for tabla, valores in nombres.items()}
+        return nombres, ids
+
+    def _leer_filas(self, conn, desde_id, tipos):
+        """Lee las filas con id > desde_id por lotes y las devuelve como un arreglo estructurado."""
+        dtype = [('id', np.int64), ('mes', np.int32), ('tipo', tipos['tipo']), ('categoria', tipos['categoria']),
+                 ('subcategoria', tipos['subcategoria']), ('monto', np.float64)]
+        # Tuplas simples en lugar de sqlite3.Row: NumPy las convierte sin pasar por Python fila a fila
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(LEER_MOVIMIENTOS, (desde_id,))
+        bloques = []
+        while True:
+            filas = cursor.fetchmany(TAMANO_LOTE)
+            if not filas:
+                break
+            bloques.append(np.array(filas, dtype=dtype))
+        return np.concatenate(bloques) if bloques else np.empty(0, dtype=dtype)
+
+    def _cargar(self, conn):
+        nombres, ids = self._leer_dimensiones(conn)
+        tipos = {columna: _tipo_codigo(max(nombres[tabla], default=0)) for columna, tabla in TABLAS.items()}
+        filas = self._leer_filas(conn, 0, tipos)
+        self._columnas = Columnas(*(np.ascontiguousarray(filas[campo]) for campo in Columnas._fields))
+        self._filas = len(filas)
+        self._ultimo_id = int(filas['id'][-1]) if len(filas) else 0
+        self._cargas += 1
+        self._publicar(nombres, ids)
+
+    def _agregar(self, conn):
+        """Agrega las filas nuevas. Devuelve False si hace falta una carga completa."""
+        nombres, ids = self._leer_dimensiones(conn)
+        tipos = {columna: getattr(self._columnas, columna).dtype for columna in TABLAS}
+        for columna, tabla in TABLAS.items():
+            # Un id que no entra en el tipo actual obliga a recargar con uno más ancho
+            if max(nombres[tabla], default=0) > np.iinfo(tipos[columna]).max:
+                return False
+        nuevas = self._leer_filas(conn, self._ultimo_id, tipos)
+        orden, meses = self._vista.orden, self._vista.meses
+        if len(nuevas):
+            total = self._filas + len(nuevas)
+            if total > len(self._columnas.mes):
+                # Capacidad al doble: agregar fila a fila cuesta O(1) amortizado
+                capacidad = max(total, 2 * len(self._columnas.mes))
+                columnas = []
+                for arreglo in self._columnas:
+                    nuevo = np.empty(capacidad, dtype=arreglo.dtype)
+                    nuevo[:self._filas] = arreglo[:self._filas]
+                    columnas.append(nuevo)
+                self._columnas = Columnas(*columnas)
+            # Las consultas en curso usan vistas [:filas] y no ven lo que se escribe detrás
+            for campo, arreglo in zip(Columnas._fields, self._columnas):
+                arreglo[self._filas:total] = nuevas[campo]
+            # Las filas nuevas se intercalan en el orden por mes sin volver a ordenar todo
+            ordenadas = np.argsort(nuevas['mes'], kind='stable')
+            posiciones = np.searchsorted(meses, nuevas['mes'][ordenadas], 'right')
+            orden = np.insert(orden, posiciones, (self._filas + ordenadas).astype(orden.dtype))
+            meses = np.insert(meses, posiciones, nuevas['mes'][ordenadas])
+            self._filas = total
+            self._ultimo_id = int(nuevas['id'][-1])
+        self._incrementales += 1
+        self._publicar(nombres, ids, orden, meses)
+        return True
+
+    def _publicar(self, nombres, ids, orden=None, meses=None):
+        columnas = Columnas(*(arreglo[:self._filas] for arreglo in self._columnas))
+        if orden is None:
+            orden = np.argsort(columnas.mes, kind='stable').astype(np.int32 if self._filas < 2**31 else np.int64)
+            meses = columnas.mes[orden]
+        self._vista = Vista(columnas, orden, meses, nombres, ids)
+
+    @staticmethod
+    def _sumar(columnas, claves, filas=None, contar=False):
+        """Suma monto agrupando por las columnas claves, sobre todas las filas o las posiciones de filas.
+
+        Devuelve [(código, ..., total)] ordenado por los códigos, como un GROUP BY;
+        con contar=True cada tupla termina además con la cantidad de filas. La
+        clave 'anio' es el año de la columna mes.
+        """
+        monto = columnas.monto if filas is None else columnas.monto[filas]
+        if not len(monto):
+            return []
+        # Cada combinación de códigos se lleva a un único índice entero
+        indice = np.zeros(len(monto), dtype=np.int64)
+        rangos = []
+        combinaciones = 1
+        for clave in claves:
+            valores = columnas.mes if clave == 'anio' else getattr(columnas, clave)
+            if filas is not None:
+                valores = valores[filas]
+            if clave == 'anio':
+                valores = valores // 12
+            minimo = int(valores.min())
+            tamano = int(valores.max()) - minimo + 1
+            indice = indice * tamano + (valores.astype(np.int64) - minimo)
+            rangos.append((minimo, tamano))
+            combinaciones *= tamano
+
+        if combinaciones <= max(4 * len(monto), 1 << 16):
+            cantidades = np.bincount(indice, minlength=combinaciones)
+            presentes = np.flatnonzero(cantidades)
+            cantidades = cantidades[presentes]
+            totales = np.bincount(indice, weights=monto, minlength=combinaciones)[presentes]
+        else:
+            # Demasiadas combinaciones posibles (p. ej. un rango de siglos): se compactan primero
+            presentes, inverso, cantidades = np.unique(indice, return_inverse=True, return_counts=True)
+            totales = np.bincount(inverso, weights=monto)
+
+        codigos = []
+        resto = presentes
+        for minimo, tamano in reversed(rangos):
+            codigos.append((resto % tamano + minimo).tolist())
+            resto = resto // tamano
+        codigos.reverse()
+        if contar:
+            return list(zip(*codigos, totales.tolist(), cantidades.tolist()))
+        return list(zip(*codigos, totales.tolist()))
+
+    @staticmethod
+    def _filas_meses(vista, inicio, fin):
+        """Posiciones de las filas con mes entre los ordinales inicio y fin (inclusive)."""
+        # Con el mismo tipo que meses: un int de Python haría que NumPy convierta todo el arreglo
+        tipo = vista.meses.dtype.type
+        desde = np.searchsorted(vista.meses, tipo(inicio), 'left')
+        hasta = np.searchsorted(vista.meses, tipo(fin), 'right')
+        return vista.orden[desde:hasta]
+
+    def _filas_mes(self, vista, mes):
+        ordinal = ordinal_mes(mes)
+        if ordinal is None:
+            return vista.orden[:0]
+        return self._filas_meses(vista, ordinal, ordinal)
+
+    @staticmethod
+    def _id(vista, tabla, nombre):
+        # Un nombre inexistente no coincide con ninguna fila
+        return vista.ids[tabla].get(nombre, -1)
+
+    def _por_subcategoria(self, vista, filas):
+        nombres = vista.nombres
+        return [
+            {'categoria': nombres['categorias'][categoria], 'subcategoria': nombres['subcategorias'][subcategoria],
+             'total': total}
+            for categoria, subcategoria, total in self._sumar(vista.columnas, ('categoria', 'subcategoria'), filas)
+        ]
+
+    def totales_mes(self, mes):
+        """Equivale a consultas.TOTALES_MES."""
+        vista = self._vista
+        filas = self._por_subcategoria(vista, self._filas_mes(vista, mes))
+        return sorted(filas, key=lambda fila: (fila['categoria'], fila['subcategoria']))
+
+    def detalle_movimientos(self, tipo, mes):
+        """Equivale a consultas.DETALLE_MOVIMIENTOS."""
+        vista = self._vista
+        filas = self._filas_mes(vista, mes)
+        filas = filas[vista.columnas.tipo[filas] == self._id(vista, 'tipos', tipo)]
+        return self._por_subcategoria(vista, filas)
+
+    def subcategorias_ingresos(self, mes):
+        """Equivale a consultas.SUBCATEGORIAS_INGRESOS."""
+        vista = self._vista
+        columnas = vista.columnas
+        filas = self._filas_mes(vista, mes)
+        filas = filas[
+            (columnas.tipo[filas] == self._id(vista, 'tipos', 'Ingreso'))
+            | (columnas.categoria[filas] == self._id(vista, 'categorias', 'Ahorros'))
+        ]
+        return self._por_subcategoria(vista, filas)
+
+    def subcategorias_egresos(self, mes):
+        """Equivale a consultas.SUBCATEGORIAS_EGRESOS."""
+        vista = self._vista
+        columnas = vista.columnas
+        filas = self._filas_mes(vista, mes)
+        basicos, deseo = (self._id(vista, 'categorias', categoria) for categoria in CATEGORIAS_EGRESOS)
+        categorias = columnas.categoria[filas]
+        filas = filas[
+            (columnas.tipo[filas] == self._id(vista, 'tipos', 'Egreso'))
+            & ((categorias == basicos) | (categorias == deseo))
+        ]
+        return self._por_subcategoria(vista, filas)
+
+    def subcategorias_rango(self, desde, hasta):
+        """Equivale a consultas.SUBCATEGORIAS_RANGO (desde y hasta con formato AAAA-MM ya validado)."""
+        vista = self._vista
+        nombres = vista.nombres
+        # Mismo resultado que comparar los textos: '2024-00' como desde incluye enero, como hasta no
+        anio, mes = int(desde[:4]), int(desde[5:])
+        inicio = anio * 12 + min(max(mes, 1), 13) - 1
+        anio, mes = int(hasta[:4]), int(hasta[5:])
+        fin = anio * 12 + max(min(mes, 12), 0) - 1
+        filas = self._filas_meses(vista, max(inicio, 0), fin)
+        return [
+            {'mes': texto_mes(ordinal), 'tipo': nombres['tipos'][tipo], 'categoria': nombres['categorias'][categoria],
+             'subcategoria': nombres['subcategorias'][subcategoria], 'total': total}
+            for ordinal, tipo, categoria, subcategoria, total
+            in self._sumar(vista.columnas, ('mes', 'tipo', 'categoria', 'subcategoria'), filas)
+        ]
+
+    def egresos_por_categoria(self):
+        """Equivale a consultas.EGRESOS_POR_CATEGORIA."""
+        vista = self._vista
+        columnas = vista.columnas
+        filas = np.flatnonzero(columnas.tipo == self._id(vista, 'tipos', 'Egreso'))
+        return [
+            {'categoria': vista.nombres['categorias'][categoria], 'total': total}
+            for categoria, total in self._sumar(columnas, ('categoria',), filas)
+        ]
+
+    def ingresos_por_mes(self):
+        """Equivale a consultas.INGRESOS_POR_MES."""
+        vista = self._vista
+        columnas = vista.columnas
+        filas = np.flatnonzero(columnas.tipo == self._id(vista, 'tipos', 'Ingreso'))
+        return [
+            {'mes': texto_mes(ordinal), 'total': total}
+            for ordinal, total in self._sumar(columnas, ('mes',), filas)
+        ]
+
+    def agregar(self, claves, filtros, inicio=None, fin=None):
+        """Suma y cantidad de movimientos agrupados por claves (anio, mes, tipo, categoria, subcategoria).
+
+        filtros es {columna: nombre} sobre tipo, categoria y subcategoria; inicio
+        y fin son ordinales de mes inclusive (None: sin límite). Devuelve dicts
+        con los nombres de cada clave, 'suma' y 'cantidad'.
+        """
+        vista = self._vista
+        columnas, nombres = vista.columnas, vista.nombres
+        if inicio is None and fin is None:
+            filas = np.arange(self._filas)
+        else:
+            # Con algún límite las fechas inválidas (ordinal -1) quedan afuera, como en SQL
+            filas = self._filas_meses(vista, max(inicio or 0, 0), 2**31 - 1 if fin is None else fin)
+        for columna, nombre in filtros.items():
+            filas = filas[getattr(columnas, columna)[filas] == self._id(vista, TABLAS[columna], nombre)]
+
+        def nombre(clave, codigo):
+            if clave == 'mes':
+                return texto_mes(codigo)
+            if clave == 'anio':
+                return f'{codigo:04d}' if codigo >= 0 else None
+            return nombres[TABLAS[clave]][codigo]
+
+        return [
+            {**{clave: nombre(clave, codigo) for clave, codigo in zip(claves, grupo[:-2])},
+             'suma': grupo[-2], 'cantidad': grupo[-1]}
+            for grupo in self._sumar(columnas, claves, filas, contar=True)
+        ]
+
+    def resumen_mes(self):
+        """Totales por mes con las columnas de la tabla resumen_mes (para contrastarla en verificar)."""
+        vista = self._vista
+        columnas = vista.columnas
+        ahorros = [self._id(vista, 'categorias', categoria) for categoria in ('Ahorros', 'Inversiones')]
+        grupos = {
+            'ingresos': columnas.tipo == self._id(vista, 'tipos', 'Ingreso'),
+            'egresos': columnas.tipo == self._id(vista, 'tipos', 'Egreso'),
+            'gastos_basicos': columnas.categoria == self._id(vista, 'categorias', 'Gastos basicos'),
+            'gastos_deseo': columnas.categoria == self._id(vista, 'categorias', 'Gastos deseo'),
+            'ahorros': np.isin(columnas.categoria, ahorros),
+        }
+        meses = {}
+        ordinales, cantidades = np.unique(columnas.mes, return_counts=True)
+        for ordinal, cantidad in zip(ordinales.tolist(), cantidades.tolist()):
+            meses[ordinal] = dict.fromkeys(grupos, 0.0)
+            meses[ordinal]['movimientos'] = cantidad
+        for campo, mascara in grupos.items():
+            for ordinal, total in self._sumar(columnas, ('mes',), np.flatnonzero(mascara)):
+                meses[ordinal][campo] = total
+        return [dict(mes=texto_mes(ordinal), **totales) for ordinal, totales in meses.items()]
+
+    def estadisticas(self):
+        """Filas cargadas, memoria usada y cantidad de cargas completas e incrementales."""
+        columnas, vista = self._columnas, self._vista
+        if columnas is None:
+            return {'filas': 0, 'cargas_completas': 0, 'cargas_incrementales': 0}
+        # Columnas más la permutación ordenada por mes y los meses ordenados
+        bytes_por_fila = sum(arreglo.dtype.itemsize for arreglo in columnas) \
+            + vista.orden.dtype.itemsize + vista.meses.dtype.itemsize
+        capacidad = len(columnas.mes)
+        return {
+            'filas': self._filas,
+            'capacidad': capacidad,
+            'bytes_por_fila': bytes_por_fila,
+            'bytes_usados': bytes_por_fila * self._filas,
+            'bytes_reservados': bytes_por_fila * capacidad,
+            'mb_por_millon_de_filas': round(bytes_por_fila * 1_000_000 / 2**20, 2),
+            'tipos': {campo: str(arreglo.dtype) for campo, arreglo in zip(Columnas._fields, columnas)},
+            'cargas_completas': self._cargas,
+            'cargas_incrementales': self._incrementales,
+        }
+
+
+def _comparar(esperado, obtenido, clave):
+    """Diferencias entre dos listas de filas agrupadas por clave (los totales se comparan con tolerancia)."""
+    esperado = {tuple(fila[c] for c in clave): fila for fila in map(dict, esperado)}
+    obtenido = {tuple(fila[c] for c in clave): fila for fila in obtenido}
+    diferencias = []
+    for grupo in esperado.keys() | obtenido.keys():
+        a, b = esperado.get(grupo), obtenido.get(grupo)
+        if a is None or b is None or any(
+            not math.isclose(a[campo], b[campo], rel_tol=1e-9, abs_tol=1e-6)
+            for campo in a if campo not in clave
+        ):
+            diferencias.append({'grupo': grupo, 'sql': a, 'memoria': b})
+    return diferencias
+
+
+def verificar(conn, motor):
+    """Compara cada agregación del motor con la consulta SQL equivalente. Devuelve {consulta: diferencias}."""
+    import consultas
+
+    motor.sincronizar(conn)
+    meses = [fila[0] for fila in conn.execute('SELECT DISTINCT mes FROM movimientos WHERE mes IS NOT NULL')]
+    clave_subcategoria = ('categoria', 'subcategoria')
+    comparaciones = [
+        ('resumen_mes', conn.execute('SELECT * FROM resumen_mes'), motor.resumen_mes(), ('mes',)),
+        ('egresos-por-categoria', conn.execute(consultas.EGRESOS_POR_CATEGORIA), motor.egresos_por_categoria(),
+         ('categoria',)),
+        ('ingresos-por-mes', conn.execute(consultas.INGRESOS_POR_MES), motor.ingresos_por_mes(), ('mes',)),
+        ('resumen-subcategorias', conn.execute(consultas.SUBCATEGORIAS_RANGO, ('0000-00', '9999-99')),
+         motor.subcategorias_rango('0000-00', '9999-99'), ('mes', 'tipo') + clave_subcategoria),
+    ]
+    for mes in meses:
+        comparaciones += [
+            (f'dashboard {mes}', conn.execute(consultas.TOTALES_MES, (mes,)), motor.totales_mes(mes),
+             clave_subcategoria),
+            (f'ingresos {mes}', conn.execute(consultas.SUBCATEGORIAS_INGRESOS, (mes,)),
+             motor.subcategorias_ingresos(mes), clave_subcategoria),
+            (f'egresos {mes}', conn.execute(consultas.SUBCATEGORIAS_EGRESOS, (mes,)),
+             motor.subcategorias_egresos(mes), clave_subcategoria),
+        ]
+        for tipo in ('Ingreso', 'Egreso'):
+            comparaciones.append((
+                f'detalle {tipo} {mes}', conn.execute(consultas.DETALLE_MOVIMIENTOS, (tipo, mes)),
+                motor.detalle_movimientos(tipo, mes), clave_subcategoria,
+            ))
+
+    problemas = {}
+    for nombre, sql, memoria, clave in comparaciones:
+        esperado = sql.fetchall()
+        if nombre == 'resumen_mes':
+            # La tabla guarda '' para las fechas inválidas; el motor devuelve None como resumen_mensual
+            esperado = [dict(fila, mes=fila['mes'] or None) for fila in esperado]
+        diferencias = _comparar(esperado, memoria, clave)
+        if diferencias:
+            problemas[nombre] = diferencias
+    return problemas
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from db import conectar
+    from migraciones import migrar
+
+    comandos = ('verificar', 'memoria')
+    if len(sys.argv) != 2 or sys.argv[1] not in comandos:
+        print(f"Uso: python analitica.py <{'|'.join(comandos)}>")
+        sys.exit(1)
+
+    migrar()
+    conn = conectar()
+    motor = MotorAnalitico()
+    inicio = time.perf_counter()
+    motor.sincronizar(conn)
+    print(f"Carga: {motor.estadisticas()['filas']} filas en {time.perf_counter() - inicio:.2f}s")
+
+    if sys.argv[1] == 'verificar':
+        problemas = verificar(conn, motor)
+        if problemas:
+            for nombre, diferencias in problemas.items():
+                print(f"{nombre}: {len(diferencias)} diferencias, p. ej. {diferencias[0]}")
+            sys.exit(1)
+        print("Sin diferencias con las consultas SQL")
+    else:
+        for clave, valor in motor.estadisticas().items():
+            print(f"{clave}: {valor}")
+    conn.close()
@@ -1,12 +1,28 @@
-from flask import Flask, jsonify, request, send_file
+import os
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Flask, Response, g, jsonify, make_response, request, send_file, stream_with_context
 from flask_cors import CORS
-import sqlite3
-import pandas as pd
-from io import BytesIO
  # from reportlab.pdfgen import canvas
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-import os
+
+from cache import CacheRespuestas
+import agregados
+import busqueda
+import cambios
+import consultas
+import cuotas
+import escritura
+import exportacion
+import ingesta
+import paginacion
+import streaming
+import tendencias
+import transacciones
+from db import METRICAS_HABILITADAS, obtener_pool, version_datos
+from parametros import PARAMETROS
+from validacion import ErrorRegistro, esquema
 
 app = Flask(__name__)
 # Configurar CORS para permitir específicamente el origen del frontend
@@ -15,199 +31,283 @@ CORS(app, resources={
         "origins": "http://localhost:3000",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["X-Siguiente-Cursor", "X-Revision", "ETag"],
         "supports_credentials": True
     }
 })
 
-# Ruta relativa a la base de datos
-db_path = os.path.join(os.path.dirname(__file__), 'datos.db')
+# Movimientos recientes incluidos por defecto en /api/dashboard
+DASHBOARD_ULTIMOS = 10
 
-def inicializar_db():
-    """Inicializa la base de datos creando la tabla si no existe."""
-    conn = None
-    try:
-        print(f"Inicializando base de datos en: {db_path}")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Verificar si la tabla existe
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='datos'")
-        if not cursor.fetchone():
-            print("Creando tabla datos...")
-            # Crear tabla de datos
-            cursor.execute('''
-                CREATE TABLE datos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    fecha DATE NOT NULL,
-                    tipo TEXT NOT NULL,
-                    categoria TEXT NOT NULL,
-                    subcategoria TEXT NOT NULL,
-                    metodoPago TEXT NOT NULL,
-                    monto REAL NOT NULL,
-                    detalle TEXT,
-                    cuotas INTEGER DEFAULT 1
-                )
-            ''')
-            
-            # Crear índices para mejorar el rendimiento
-            print("Creando índices...")
-            cursor.execute('CREATE INDEX idx_fecha ON datos(fecha)')
-            cursor.execute('CREATE INDEX idx_tipo ON datos(tipo)')
-            cursor.execute('CREATE INDEX idx_categoria ON datos(categoria)')
-            
-            conn.commit()
-            print("Base de datos inicializada correctamente")
-        else:
-            print("La tabla datos ya existe")
-            
-    except Exception as e:
-        print(f"Error al inicializar la base de datos: {str(e)}")
-        if conn:
-            conn.rollback()
-        raise
+# Agrupación del dashboard: ingresos y ahorros por un lado, gastos básicos y de deseo por el otro
+CATEGORIAS_INGRESOS_DASHBOARD = ('Ingresos', 'Ahorros')
+CATEGORIAS_EGRESOS_DASHBOARD = ('Gastos basicos', 'Gastos deseo')
+
+# Latencia por ruta y tiempo de cada consulta (opcional, METRICAS=1): se publican en /api/metrics
+if METRICAS_HABILITADAS:
+    from metricas import instalar, metricas
 
-# Inicializar la base de datos al arrancar la aplicación
-inicializar_db()
+    instalar(app)
+
+# Motor analítico en memoria (opcional, ANALITICA_MEMORIA=1): los endpoints de
+# agregación se calculan con NumPy sobre una copia de movimientos en lugar de SQL.
+# Se carga en el primer pedido que lo usa: al importar app la base puede no estar migrada
+motor = None
+if os.environ.get('ANALITICA_MEMORIA') == '1':
+    from analitica import MotorAnalitico
+
+    motor = MotorAnalitico()
 
 def get_db_connection():
-    """Obtiene una conexión a la base de datos."""
-    try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+    """Obtiene la conexión del pool asociada al contexto de la aplicación."""
+    if 'db' not in g:
+        g.db = obtener_pool().obtener()
+    return g.db
+
+@app.teardown_appcontext
+def liberar_conexion(exception):
+    """Devuelve la conexión al pool al terminar el pedido."""
+    conn = g.pop('db', None)
+    if conn is not None:
+        obtener_pool().devolver(conn)
+
+def motor_analitico(conn):
+    """Devuelve el motor en memoria al día con la base, o None si está deshabilitado."""
+    if motor is not None:
+        motor.sincronizar(conn)
+    return motor
+
+# Respuestas de los endpoints de lectura, invalidadas por la versión de los datos
+cache_respuestas = CacheRespuestas()
+
+def cacheado(vista):
+    """Sirve la vista desde la cache mientras no cambien los datos, con ETag y 304."""
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        version = version_datos(get_db_connection())
+        clave = request.path + '?' + urlencode(sorted(request.args.items(multi=True)))
+        entrada = cache_respuestas.obtener(clave, version)
+        if entrada is None:
+            respuesta = make_response(vista(*args, **kwargs))
+            # Los errores no se guardan
+            if respuesta.status_code != 200:
+                return respuesta
+            entrada = cache_respuestas.guardar(clave, version, respuesta.get_data(), respuesta.mimetype)
+
+        if request.if_none_match.contains_weak(entrada.etag):
+            cache_respuestas.registrar_no_modificado()
+            respuesta = Response(status=304)
+        else:
+            respuesta = Response(entrada.cuerpo, mimetype=entrada.mimetype)
+        respuesta.set_etag(entrada.etag)
+        # El navegador puede guardarla pero debe revalidar con If-None-Match
+        respuesta.headers['Cache-Control'] = 'no-cache'
+        return respuesta
+    return envoltura
+
+def respuesta_streaming(cursor, columnas, formato):
+    """Envía las filas del cursor a medida que se leen, sin armar la lista completa en memoria."""
+    filas = streaming.generar_filas(cursor, columnas, formato)
+    return Response(stream_with_context(filas), mimetype=streaming.FORMATOS[formato])
+
+def calcular_resumen_mensual(conn):
+    """Resumen por mes (más una fila Total) con la distribución 60/30/10, leído de resumen_mes."""
+    # Lee el resumen precalculado: una fila por mes en lugar de recorrer todos los movimientos
+    resumen = conn.execute('''
+        SELECT 
+            substr(NULLIF(mes, ''), 1, 4) AS "año",
+            substr(NULLIF(mes, ''), 6, 2) AS mes_numero,
+            NULLIF(mes, '') AS mes,
+            ROUND(ingresos, 2) AS ingresos,
+            ROUND(egresos, 2) AS egresos,
+            ROUND(gastos_basicos, 2) AS gastos_basicos,
+            ROUND(gastos_deseo, 2) AS gastos_deseo,
+            ROUND(ahorros, 2) AS ahorros
+        FROM resumen_mes
+        ORDER BY mes DESC
+    ''').fetchall()
+
+    datos_procesados = []
+    totales = {'ingresos': 0.0, 'gastos_basicos': 0.0, 'gastos_deseo': 0.0, 'ahorros': 0.0, 'egresos': 0.0}
+
+    for item in resumen:
+        item_dict = dict(item)
+        ingresos = float(item_dict.get('ingresos', 0)) or 0.0
+        egresos = float(item_dict.get('egresos', 0)) or 0.0
         
-        # Crear la tabla si no existe
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS datos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha DATE NOT NULL,
-                tipo TEXT NOT NULL,
-                categoria TEXT NOT NULL,
-                subcategoria TEXT NOT NULL,
-                metodoPago TEXT NOT NULL,
-                monto REAL NOT NULL,
-                detalle TEXT,
-                cuotas INTEGER DEFAULT 1
-            )
-        ''')
+        item_dict['presupuesto_basicos'] = round(ingresos * tendencias.PRESUPUESTO['basicos'], 2)
+        item_dict['presupuesto_deseo'] = round(ingresos * tendencias.PRESUPUESTO['deseo'], 2)
+        item_dict['presupuesto_ahorros'] = round(ingresos * tendencias.PRESUPUESTO['ahorros'], 2)
         
-        # Crear índices si no existen
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_fecha ON datos(fecha)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tipo ON datos(tipo)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_categoria ON datos(categoria)')
+        item_dict['real_basicos'] = round((item_dict['gastos_basicos'] / ingresos * 100), 2) if ingresos != 0 else 0.0
+        item_dict['real_deseo'] = round((item_dict['gastos_deseo'] / ingresos * 100), 2) if ingresos != 0 else 0.0
+        item_dict['real_ahorros'] = round((item_dict['ahorros'] / ingresos * 100), 2) if ingresos != 0 else 0.0
         
-        conn.commit()
-        return conn
-    except Exception as e:
-        print(f"Error al conectar a la base de datos: {str(e)}")
-        if conn:
-            conn.rollback()
-        raise
-
-PARAMETROS = {
-    'tipos': ['Ingreso', 'Egreso'],
-    'categorias': ['Gastos basicos', 'Gastos deseo', 'Inversiones', 'Ahorros', 'Ingresos'],
-    'cuentas': ['Tarjeta de Credito', 'Mercado Pago', 'Cuenta Debito - Tarjeta', 'Cuenta Debito - Transferencia'],
-    'subcategorias': {
-        'Gastos basicos': ['Supermercado', 'Servicios', 'Transporte', 'Salud', 'Educacion', 'Vivienda'],
-        'Gastos deseo': ['Entretenimiento', 'Delivery', 'Ropa', 'Deuda', 'Otros'],
-        'Inversiones': ['Acciones', 'Bonos', 'Crypto', 'Otros'],
-        'Ahorros': ['Cuenta', 'Plazo Fijo', 'Otros'],
-        'Ingresos': ['Sueldo Empresa', 'Ingresos Propios', 'Otros']
-    }
-}
+        saldo = ingresos - egresos
+        item_dict['saldo'] = round(saldo, 2)
+        item_dict['saldo_simbolo'] = '↑' if saldo > 0 else '↓' if saldo < 0 else '='
 
-def normalizar_texto(texto):
-    """Normaliza el texto para manejar problemas de codificación y acentos."""
-    if not texto:
-        return texto
-    
-    # Mapeo de caracteres acentuados a no acentuados
-    mapeo = {
-        'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u',
-        'ñ': 'n', 'ü': 'u',
-        'Á': 'A', 'É': 'E', 'Í': 'I', 'Ó': 'O', 'Ú': 'U',
-        'Ñ': 'N', 'Ü': 'U',
-        'Ã¡': 'a', 'Ã©': 'e', 'Ã­': 'i', 'Ã³': 'o', 'Ãº': 'u',
-        'Ã±': 'n', 'Ã¼': 'u',
-        'Ã': 'A', 'Ã': 'E', 'Ã': 'I', 'Ã': 'O', 'Ã': 'U',
-        'Ã': 'N', 'Ã': 'U',
-        'â€"': '-', 'â€"': '-'
+        datos_procesados.append(item_dict)
+        
+        totales['ingresos'] += ingresos
+        totales['gastos_basicos'] += item_dict['gastos_basicos']
+        totales['gastos_deseo'] += item_dict['gastos_deseo']
+        totales['ahorros'] += item_dict['ahorros']
+        totales['egresos'] += egresos
+
+    total_row = {
+        'año': 'Total',
+        'mes': '',
+        'ingresos': round(totales['ingresos'], 2),
+        'presupuesto_basicos': round(totales['ingresos'] * tendencias.PRESUPUESTO['basicos'], 2),
+        'presupuesto_deseo': round(totales['ingresos'] * tendencias.PRESUPUESTO['deseo'], 2),
+        'presupuesto_ahorros': round(totales['ingresos'] * tendencias.PRESUPUESTO['ahorros'], 2),
+        'real_basicos': round((totales['gastos_basicos'] / totales['ingresos'] * 100), 2) if totales['ingresos'] != 0 else 0.0,
+        'real_deseo': round((totales['gastos_deseo'] / totales['ingresos'] * 100), 2) if totales['ingresos'] != 0 else 0.0,
+        'real_ahorros': round((totales['ahorros'] / totales['ingresos'] * 100), 2) if totales['ingresos'] != 0 else 0.0,
+        'saldo': round(totales['ingresos'] - totales['egresos'], 2),
+        'saldo_simbolo': '↑' if (totales['ingresos'] - totales['egresos']) > 0 else '↓'
     }
-    
-    texto_normalizado = texto
-    for problema, solucion in mapeo.items():
-        texto_normalizado = texto_normalizado.replace(problema, solucion)
-    
-    return texto_normalizado
+    datos_procesados.append(total_row)
+
+    return datos_procesados
+
+def listar_datos(conn, filtros=None, parametros=(), tabla='datos', columnas_validas=paginacion.COLUMNAS_DATOS):
+    """Lista registros de la tabla aplicando limit/cursor/fields/stream de la query string."""
+    try:
+        limite, cursor, columnas = paginacion.leer_parametros(request.args, columnas_validas)
+        formato = streaming.formato_pedido(request.args, request.accept_mimetypes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if formato:
+        sql, valores = paginacion.construir_consulta(tabla, columnas, filtros, parametros, limite, cursor)
+        return respuesta_streaming(conn.execute(sql, valores), columnas, formato)
+
+    registros, siguiente = paginacion.consultar_pagina(
+        conn, tabla, columnas, filtros, parametros, limite, cursor
+    )
+    respuesta = jsonify(registros)
+    if siguiente:
+        respuesta.headers['X-Siguiente-Cursor'] = siguiente
+    return respuesta
 
 @app.route('/api/parametros', methods=['GET'])
+@cacheado
 def get_parametros():
     return jsonify(PARAMETROS)
 
+@app.route('/api/db/estadisticas', methods=['GET'])
+def estadisticas_db():
+    return jsonify(obtener_pool().estadisticas())
+
+@app.route('/api/escritura/estadisticas', methods=['GET'])
+def estadisticas_escritura():
+    return jsonify(escritura.obtener_escritor().estadisticas())
+
+@app.route('/api/metrics', methods=['GET'])
+def exportar_metricas():
+    """Métricas de este proceso en el formato de texto de Prometheus."""
+    if not METRICAS_HABILITADAS:
+        return jsonify({'error': 'Las métricas están deshabilitadas (METRICAS=1 para habilitarlas)'}), 404
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/consultas-lentas', methods=['GET'])
+def consultas_lentas():
+    """Últimas consultas que superaron METRICAS_CONSULTA_LENTA_MS, con su plan de ejecución."""
+    if not METRICAS_HABILITADAS:
+        return jsonify({'error': 'Las métricas están deshabilitadas (METRICAS=1 para habilitarlas)'}), 404
+    return jsonify(metricas.consultas_lentas())
+
+@app.route('/api/cache/estadisticas', methods=['GET'])
+def estadisticas_cache():
+    return jsonify(cache_respuestas.estadisticas())
+
+@app.route('/api/analitica/estadisticas', methods=['GET'])
+def estadisticas_analitica():
+    if motor is None:
+        return jsonify({'habilitado': False})
+    return jsonify({'habilitado': True, **motor.estadisticas()})
+
 @app.route('/api/resumen-mensual', methods=['GET'])
+@cacheado
 def resumen_mensual():
     conn = get_db_connection()
     try:
-        resumen = conn.execute('''
-            SELECT 
-                strftime("%Y", fecha) AS "año",
-                strftime("%m", fecha) AS mes_numero,
-                strftime("%Y-%m", fecha) AS mes,
-                ROUND(SUM(CASE WHEN tipo = 'Ingreso' THEN monto ELSE 0 END), 2) AS ingresos,
-                ROUND(SUM(CASE WHEN tipo = 'Egreso' THEN monto ELSE 0 END), 2) AS egresos,
-                ROUND(SUM(CASE WHEN categoria = 'Gastos basicos' THEN monto ELSE 0 END), 2) AS gastos_basicos,
-                ROUND(SUM(CASE WHEN categoria = 'Gastos deseo' THEN monto ELSE 0 END), 2) AS gastos_deseo,
-                ROUND(SUM(CASE WHEN categoria IN ('Ahorros', 'Inversiones') THEN monto ELSE 0 END), 2) AS ahorros
-            FROM datos
-            GROUP BY mes
-            ORDER BY mes DESC
-        ''').fetchall()
+        return jsonify(calcular_resumen_mensual(conn))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        datos_procesados = []
-        totales = {'ingresos': 0.0, 'gastos_basicos': 0.0, 'gastos_deseo': 0.0, 'ahorros': 0.0, 'egresos': 0.0}
+@app.route('/api/dashboard', methods=['GET'])
+@cacheado
+def dashboard():
+    """Todo lo que muestra el dashboard en una respuesta: resumen mensual, totales del mes, últimos movimientos y parámetros."""
+    try:
+        ultimos = int(request.args.get('ultimos', DASHBOARD_ULTIMOS))
+    except ValueError:
+        ultimos = -1
+    if ultimos < 0 or ultimos > paginacion.LIMITE_MAXIMO:
+        return jsonify({'error': f'ultimos debe estar entre 0 y {paginacion.LIMITE_MAXIMO}'}), 400
 
-        for item in resumen:
-            item_dict = dict(item)
-            ingresos = float(item_dict.get('ingresos', 0)) or 0.0
-            egresos = float(item_dict.get('egresos', 0)) or 0.0
-            
-            item_dict['presupuesto_basicos'] = round(ingresos * 0.6, 2)
-            item_dict['presupuesto_deseo'] = round(ingresos * 0.3, 2)
-            item_dict['presupuesto_ahorros'] = round(ingresos * 0.1, 2)
-            
-            item_dict['real_basicos'] = round((item_dict['gastos_basicos'] / ingresos * 100), 2) if ingresos != 0 else 0.0
-            item_dict['real_deseo'] = round((item_dict['gastos_deseo'] / ingresos * 100), 2) if ingresos != 0 else 0.0
-            item_dict['real_ahorros'] = round((item_dict['ahorros'] / ingresos * 100), 2) if ingresos != 0 else 0.0
-            
-            saldo = ingresos - egresos
-            item_dict['saldo'] = round(saldo, 2)
-            item_dict['saldo_simbolo'] = '↑' if saldo > 0 else '↓' if saldo < 0 else '='
+    conn = get_db_connection()
+    try:
+        resumen = calcular_resumen_mensual(conn)
+        # Sin mes explícito se muestra el más reciente (resumen viene ordenado por mes descendente)
+        mes = request.args.get('mes') or next((r['mes'] for r in resumen if r['mes']), None)
+
+        if not mes:
+            totales = []
+        elif motor_analitico(conn):
+            totales = motor.totales_mes(mes)
+        else:
+            totales = conn.execute(consultas.TOTALES_MES, (mes,)).fetchall()
+        ingresos = {}
+        egresos = {}
+        for fila in totales:
+            if fila['categoria'] in CATEGORIAS_INGRESOS_DASHBOARD:
+                destino = ingresos
+            elif fila['categoria'] in CATEGORIAS_EGRESOS_DASHBOARD:
+                destino = egresos
+            else:
+                continue
+            destino[fila['subcategoria']] = destino.get(fila['subcategoria'], 0) + fila['total']
 
-            datos_procesados.append(item_dict)
-            
-            totales['ingresos'] += ingresos
-            totales['gastos_basicos'] += item_dict['gastos_basicos']
-            totales['gastos_deseo'] += item_dict['gastos_deseo']
-            totales['ahorros'] += item_dict['ahorros']
-            totales['egresos'] += egresos
-
-        total_row = {
-            'año': 'Total',
-            'mes': '',
-            'ingresos': round(totales['ingresos'], 2),
-            'presupuesto_basicos': round(totales['ingresos'] * 0.6, 2),
-            'presupuesto_deseo': round(totales['ingresos'] * 0.3, 2),
-            'presupuesto_ahorros': round(totales['ingresos'] * 0.1, 2),
-            'real_basicos': round((totales['gastos_basicos'] / totales['ingresos'] * 100), 2) if totales['ingresos'] != 0 else 0.0,
-            'real_deseo': round((totales['gastos_deseo'] / totales['ingresos'] * 100), 2) if totales['ingresos'] != 0 else 0.0,
-            'real_ahorros': round((totales['ahorros'] / totales['ingresos'] * 100), 2) if totales['ingresos'] != 0 else 0.0,
-            'saldo': round(totales['ingresos'] - totales['egresos'], 2),
-            'saldo_simbolo': '↑' if (totales['ingresos'] - totales['egresos']) > 0 else '↓'
-        }
-        datos_procesados.append(total_row)
-
-        return jsonify(datos_procesados)
+        movimientos = []
+        if ultimos:
+            movimientos, _ = paginacion.consultar_pagina(conn, 'datos', paginacion.COLUMNAS_DATOS, limite=ultimos)
+
+        return jsonify({
+            'mes': mes,
+            'resumen': resumen,
+            'categorias': [dict(fila) for fila in totales],
+            'ingresos': [{'subcategoria': sub, 'monto': monto} for sub, monto in ingresos.items()],
+            'egresos': [{'subcategoria': sub, 'monto': monto} for sub, monto in egresos.items()],
+            'ultimos_movimientos': movimientos,
+            'parametros': PARAMETROS,
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/tendencias', methods=['GET'])
+def tendencias_mensuales():
+    """Series por mes: saldo acumulado, acumulado del año, promedios móviles, presupuesto y proyección del mes.
+
+    No pasa por la cache de respuestas: la proyección depende de la fecha de hoy.
+    """
+    try:
+        ventanas, presupuesto, desde, hasta, hoy, mes = tendencias.leer_parametros(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_db_connection()
+    try:
+        # Los totales mensuales salen del resumen precalculado: una fila por mes
+        series = tendencias.series_mensuales(conn.execute('SELECT * FROM resumen_mes').fetchall(), ventanas, presupuesto)
+        return jsonify({
+            'presupuesto': presupuesto,
+            'ventanas': ventanas,
+            'meses': tendencias.filas_json(series, desde, hasta),
+            'proyeccion': tendencias.proyectar_mes(conn, mes, hoy),
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -218,32 +318,21 @@ def registros_filtrados():
     
     conn = get_db_connection()
     try:
-        query = '''
-            SELECT * FROM datos
-            WHERE fecha BETWEEN ? AND ?
-            ORDER BY fecha DESC
-        '''
-        registros = conn.execute(query, (fecha_inicio, fecha_fin)).fetchall()
-        return jsonify([dict(row) for row in registros])
+        return listar_datos(conn, 'fecha BETWEEN ? AND ?', (fecha_inicio, fecha_fin))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/detalle-movimientos')
+@cacheado
 def detalle_movimientos():
     mes = request.args.get('mes')
     tipo = request.args.get('tipo')
     conn = get_db_connection()
     try:
-        query = '''
-            SELECT 
-                categoria,
-                subcategoria,
-                SUM(monto) as total
-            FROM datos
-            WHERE tipo = ? AND strftime("%Y-%m", fecha) = ?
-            GROUP BY categoria, subcategoria
-        '''
-        datos = conn.execute(query, (tipo, mes)).fetchall()
+        if motor_analitico(conn):
+            datos = motor.detalle_movimientos(tipo, mes)
+        else:
+            datos = conn.execute(consultas.DETALLE_MOVIMIENTOS, (tipo, mes)).fetchall()
         
         resultado = []
         categorias = {item['categoria'] for item in datos}
@@ -255,163 +344,180 @@ def detalle_movimientos():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/buscar', methods=['GET'])
+def buscar_movimientos():
+    """Búsqueda de texto completo en el detalle, con filtros, rango de fechas y paginación por cursor."""
+    try:
+        consulta = busqueda.leer_busqueda(request.args)
+        limite, cursor, columnas = paginacion.leer_parametros(request.args)
+        cursor = busqueda.leer_cursor(consulta, cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_db_connection()
+    try:
+        registros, siguiente = busqueda.buscar(
+            conn, consulta, columnas, limite or busqueda.LIMITE_POR_DEFECTO, cursor
+        )
+        respuesta = jsonify(registros)
+        if siguiente:
+            respuesta.headers['X-Siguiente-Cursor'] = siguiente
+        return respuesta
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/datos', methods=['GET', 'POST'])
 def manejar_datos():
     conn = get_db_connection()
     if request.method == 'GET':
-        registros = conn.execute('SELECT * FROM datos ORDER BY fecha DESC').fetchall()
-        return jsonify([dict(row) for row in registros])
+        # Leída antes que los registros: lo que cambie en el medio vuelve a llegar por /api/datos/cambios
+        revision = cambios.revision_actual(conn)
+        respuesta = make_response(listar_datos(conn))
+        respuesta.headers['X-Revision'] = str(revision)
+        return respuesta
     
     elif request.method == 'POST':
-        data = request.get_json()
+        data = request.get_json(silent=True)
         try:
-            cuotas = int(data.get('cuotas', 1))
-            if cuotas < 1 or cuotas > 36:
-                return jsonify({'error': 'Número de cuotas inválido (1-36)'}), 400
-            
-            monto_total = float(data['monto'])
-            monto_por_cuota = monto_total / cuotas
-            fecha_base = datetime.strptime(data['fecha'], '%Y-%m-%d').date()
-            detalle_base = data['detalle']
-
-            for i in range(cuotas):
-                nueva_fecha = fecha_base + relativedelta(months=i)
-                conn.execute('''
-                    INSERT INTO datos 
-                    (fecha, tipo, categoria, subcategoria, metodoPago, monto, detalle, cuotas)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    nueva_fecha.strftime('%Y-%m-%d'),
-                    data['tipo'],
-                    data['categoria'],
-                    data['subcategoria'],
-                    data['metodoPago'],
-                    monto_por_cuota,
-                    f"{detalle_base} (Cuota {i+1}/{cuotas})",
-                    cuotas
-                ))
-            
-            conn.commit()
-            return jsonify({'mensaje': f'Registro guardado en {cuotas} cuotas!'}), 201
-        
+            fila = esquema.validar(data)
+        except ErrorRegistro as e:
+            return jsonify({'error': str(e), 'campo': e.campo}), 400
+        cuotas_plan = fila[7]
+
+        def guardar(conn_escritor):
+            if cuotas_plan == 1:
+                ingesta.insertar_filas(conn_escritor, [fila])
+                return None
+            # El plan se guarda una vez y sus cuotas se insertan con un solo executemany
+            return cuotas.crear_plan(conn_escritor, fila)
+
+        try:
+            # El escritor del proceso confirma este registro junto con los demás pendientes
+            plan_id = escritura.obtener_escritor().ejecutar(guardar)
+            return jsonify({'mensaje': f'Registro guardado en {cuotas_plan} cuotas!', 'plan_id': plan_id}), 201
+
+        except TimeoutError as e:
+            return jsonify({'error': str(e)}), 503
         except Exception as e:
-            conn.rollback()
             return jsonify({'error': str(e)}), 500
 
-@app.route('/api/datos/bulk', methods=['POST'])
-def importar_datos():
+@app.route('/api/planes-cuotas', methods=['GET'])
+def listar_planes_cuotas():
+    """Lista los planes de cuotas con la cantidad de cuotas registradas de cada uno."""
     try:
-        print("Recibiendo datos para importación...")
-        data = request.get_json()
-        print("Datos recibidos:", data)
-        
-        if not data or not isinstance(data, list):
-            print("Error: datos no es una lista")
-            return jsonify({'error': 'Datos inválidos: se esperaba una lista de registros'}), 400
-
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        registros_insertados = 0
-        errores = []
-        for i, registro in enumerate(data, 1):
+        filas = conn.execute(f'''
+            SELECT {", ".join('p.' + c for c in cuotas.COLUMNAS_PLAN)},
+                   (SELECT COUNT(*) FROM movimientos m WHERE m.plan_id = p.id) AS cuotas_registradas
+            FROM planes_cuotas p
+            ORDER BY p.fecha_inicio DESC, p.id DESC
+        ''').fetchall()
+        return jsonify([dict(fila) for fila in filas])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/planes-cuotas/<int:plan_id>', methods=['GET', 'PUT', 'DELETE'])
+def manejar_plan_cuotas(plan_id):
+    """Consulta, edita (PUT) o cancela (DELETE, opcionalmente ?desde=AAAA-MM-DD) un plan de cuotas."""
+    conn = get_db_connection()
+    try:
+        if request.method == 'GET':
+            plan = cuotas.obtener_plan(conn, plan_id)
+            plan['detalle_cuotas'] = cuotas.cuotas_del_plan(conn, plan_id)
+            return jsonify(plan)
+
+        if request.method == 'PUT':
+            datos_plan = request.get_json(silent=True)
+            if not isinstance(datos_plan, dict):
+                return jsonify({'error': 'Datos inválidos: se esperaba un objeto'}), 400
+            plan = escritura.obtener_escritor().ejecutar(
+                lambda conn_escritor: cuotas.actualizar_plan(conn_escritor, plan_id, datos_plan))
+            return jsonify(plan)
+
+        desde = request.args.get('desde')
+        if desde:
             try:
-                print(f"\nProcesando registro {i}:", registro)
-                
-                # Normalizar campos de texto
-                registro['categoria'] = normalizar_texto(registro['categoria'])
-                registro['subcategoria'] = normalizar_texto(registro['subcategoria'])
-                registro['metodoPago'] = normalizar_texto(registro['metodoPago'])
-                
-                # Validar campos requeridos
-                campos_requeridos = ['fecha', 'tipo', 'categoria', 'subcategoria', 'metodoPago', 'monto']
-                campos_faltantes = [campo for campo in campos_requeridos if campo not in registro or not registro[campo]]
-                if campos_faltantes:
-                    raise ValueError(f'Campos requeridos faltantes: {", ".join(campos_faltantes)}')
-
-                # Validar tipo
-                if registro['tipo'] not in PARAMETROS['tipos']:
-                    raise ValueError(f'Tipo inválido: {registro["tipo"]}. Debe ser uno de: {", ".join(PARAMETROS["tipos"])}')
-
-                # Validar categoría
-                if registro['categoria'] not in PARAMETROS['categorias']:
-                    raise ValueError(f'Categoría inválida: {registro["categoria"]}. Debe ser una de: {", ".join(PARAMETROS["categorias"])}')
-
-                # Validar subcategoría
-                subcategorias_validas = PARAMETROS['subcategorias'].get(registro['categoria'], [])
-                if registro['subcategoria'] not in subcategorias_validas:
-                    raise ValueError(f'Subcategoría inválida: {registro["subcategoria"]}. Para la categoría {registro["categoria"]}, debe ser una de: {", ".join(subcategorias_validas)}')
-
-                # Validar método de pago
-                if registro['metodoPago'] not in PARAMETROS['cuentas']:
-                    raise ValueError(f'Método de pago inválido: {registro["metodoPago"]}. Debe ser uno de: {", ".join(PARAMETROS["cuentas"])}')
-
-                # Validar monto
-                try:
-                    monto = float(registro['monto'])
-                    if monto <= 0:
-                        raise ValueError('El monto debe ser mayor a 0')
-                except ValueError:
-                    raise ValueError(f'Monto inválido: {registro["monto"]}. Debe ser un número mayor a 0')
-
-                print(f"Registro {i} válido, insertando en la base de datos...")
-                # Insertar registro
-                cursor.execute('''
-                    INSERT INTO datos 
-                    (fecha, tipo, categoria, subcategoria, metodoPago, monto, detalle, cuotas)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    registro['fecha'],
-                    registro['tipo'],
-                    registro['categoria'],
-                    registro['subcategoria'],
-                    registro['metodoPago'],
-                    monto,
-                    registro.get('detalle', ''),
-                    registro.get('cuotas', 1)
-                ))
-                registros_insertados += 1
-                print(f"Registro {i} insertado exitosamente")
-
-            except Exception as e:
-                error_msg = f'Error en registro {i}: {str(e)}'
-                print(error_msg)
-                errores.append(error_msg)
-                continue
+                datetime.strptime(desde, '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'error': f'Fecha inválida: {desde}. Debe tener formato AAAA-MM-DD'}), 400
+        eliminadas = escritura.obtener_escritor().ejecutar(
+            lambda conn_escritor: cuotas.cancelar_plan(conn_escritor, plan_id, desde))
+        return jsonify({'mensaje': f'Plan {plan_id} cancelado', 'cuotas_eliminadas': eliminadas})
+
+    except cuotas.PlanNoEncontrado as e:
+        return jsonify({'error': str(e)}), 404
+    except ErrorRegistro as e:
+        return jsonify({'error': str(e), 'campo': e.campo}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datos/cambios', methods=['GET'])
+def get_cambios_datos():
+    """Altas, cambios y bajas de movimientos posteriores a la revisión desde, con la nueva revisión."""
+    try:
+        desde, limite = cambios.leer_parametros(request.args)
+        return jsonify(cambios.cambios_desde(get_db_connection(), desde, limite))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datos/bulk', methods=['POST'])
+def importar_datos():
+    """Importa registros en lote: JSON (lista) o NDJSON en streaming (application/x-ndjson)."""
+    diferir_indices = request.args.get('diferir_indices') in ('1', 'true')
+    escritor = escritura.obtener_escritor()
+    try:
+        data = None
+        if request.mimetype == 'application/x-ndjson':
+            lotes = ingesta.lotes_de_ndjson(request.stream)
+        else:
+            data = request.get_json(silent=True)
+            if not data or not isinstance(data, list):
+                return jsonify({'error': 'Datos inválidos: se esperaba una lista de registros'}), 400
+            lotes = ingesta.lotes_de_lista(data)
+
+        if data is not None and len(data) <= ingesta.TAMANO_LOTE and not diferir_indices:
+            # Lote chico: se valida en este hilo y se confirma junto con las demás escrituras pendientes
+            filas, errores = ingesta.validar_lote(data)
+            registros_insertados = len(filas)
+            if filas:
+                escritor.ejecutar(lambda conn_escritor: ingesta.insertar_filas(conn_escritor, filas))
+        else:
+            # Carga grande o en streaming: corre sola en el escritor, con su propia transacción
+            registros_insertados, errores = escritor.ejecutar(
+                lambda conn_escritor: ingesta.importar(conn_escritor, lotes, diferir_indices), propia=True)
+        print(f"Importación completada. Registros insertados: {registros_insertados}, con errores: {len(errores)}")
 
-        conn.commit()
-        print(f"\nImportación completada. Registros insertados: {registros_insertados}")
-        print("Errores encontrados:", errores)
-        
         return jsonify({
             'mensaje': f'Se importaron {registros_insertados} registros exitosamente',
             'registros_importados': registros_insertados,
-            'errores': errores
+            'errores': [f"Error en registro {e['fila']}: {e['error']}" for e in errores],
+            'detalle_errores': errores
         }), 201
 
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print("Error general:", str(e))
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/datos-dashboard', methods=['GET'])
+@cacheado
 def datos_dashboard():
     conn = get_db_connection()
     try:
-        egresos = conn.execute('''
-            SELECT categoria, SUM(monto) as total 
-            FROM datos 
-            WHERE tipo = 'Egreso'
-            GROUP BY categoria
-        ''').fetchall()
-        
-        ingresos = conn.execute('''
-            SELECT strftime("%Y-%m", fecha) as mes, SUM(monto) as total
-            FROM datos 
-            WHERE tipo = 'Ingreso'
-            GROUP BY mes
-            ORDER BY mes
-        ''').fetchall()
-        
+        if motor_analitico(conn):
+            egresos = motor.egresos_por_categoria()
+            ingresos = motor.ingresos_por_mes()
+        else:
+            # Agrupan por ids sobre movimientos; los nombres se agregan al final
+            egresos = conn.execute(consultas.EGRESOS_POR_CATEGORIA).fetchall()
+            ingresos = conn.execute(consultas.INGRESOS_POR_MES).fetchall()
+
         return jsonify({
             'egresos': [dict(row) for row in egresos],
             'ingresos': [dict(row) for row in ingresos]
@@ -419,13 +525,29 @@ def datos_dashboard():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/exportar')
 @app.route('/api/exportar-excel')
 def exportar_excel():
+    """Exporta los registros filtrados como xlsx (por defecto), csv o parquet, sin archivos temporales."""
+    formato = request.args.get('format', 'xlsx')
+    if formato not in exportacion.FORMATOS:
+        return jsonify({'error': f'Formato inválido: {formato}. Debe ser uno de: {", ".join(exportacion.FORMATOS)}'}), 400
+
     conn = get_db_connection()
     try:
-        df = pd.read_sql_query("SELECT * FROM datos", conn)
-        df.to_excel("registro.xlsx", index=False)
-        return send_file("registro.xlsx", as_attachment=True)
+        sql, valores = exportacion.consulta_exportacion(request.args)
+        cursor = conn.execute(sql, valores)
+        nombre = f'registro.{formato}'
+        if formato == 'csv':
+            return Response(
+                stream_with_context(exportacion.generar_csv(cursor)),
+                mimetype=exportacion.FORMATOS['csv'],
+                headers={'Content-Disposition': f'attachment; filename={nombre}'}
+            )
+        archivo = exportacion.libro_xlsx(cursor) if formato == 'xlsx' else exportacion.archivo_parquet(cursor)
+        return send_file(archivo, mimetype=exportacion.FORMATOS[formato], as_attachment=True, download_name=nombre)
+    except exportacion.FormatoNoDisponible as e:
+        return jsonify({'error': str(e)}), 501
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -457,37 +579,102 @@ def exportar_pdf():
 
 @app.route('/api/transacciones', methods=['GET'])
 def get_transacciones():
+    """Libro de transacciones filtrado por clave_cuenta, clave_territorio, desde y hasta, con paginación."""
+    try:
+        filtros, parametros = transacciones.leer_filtros(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT fecha, clave_cuenta, descripcion, monto, clave_territorio FROM transacciones")
-    transacciones = cursor.fetchall()
-
-    data = []
-    for row in transacciones:
-        data.append({
-            "fecha": row[0],
-            "clave_cuenta": row[1],
-            "descripcion": row[2],
-            "monto": row[3],
-            "clave_territorio": row[4]
-        })
-    return jsonify(data)
+    return listar_datos(conn, filtros, parametros, 'transacciones', transacciones.COLUMNAS_TRANSACCIONES)
+
+@app.route('/api/transacciones/bulk', methods=['POST'])
+def importar_transacciones():
+    """Carga transacciones en lote: JSON (lista) o NDJSON en streaming (application/x-ndjson)."""
+    diferir_indices = request.args.get('diferir_indices') in ('1', 'true')
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            lotes = ingesta.lotes_de_ndjson(request.stream)
+        else:
+            data = request.get_json(silent=True)
+            if not data or not isinstance(data, list):
+                return jsonify({'error': 'Datos inválidos: se esperaba una lista de transacciones'}), 400
+            lotes = ingesta.lotes_de_lista(data)
+
+        insertadas, errores = escritura.obtener_escritor().ejecutar(
+            lambda conn_escritor: transacciones.importar(conn_escritor, lotes, diferir_indices), propia=True)
+        print(f"Carga de transacciones completada. Insertadas: {insertadas}, con errores: {len(errores)}")
+        return jsonify({
+            'mensaje': f'Se cargaron {insertadas} transacciones exitosamente',
+            'registros_importados': insertadas,
+            'detalle_errores': errores
+        }), 201
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print("Error general:", str(e))
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/transacciones/totales', methods=['GET'])
+@cacheado
+def totales_transacciones():
+    """Totales del libro por cuenta, territorio o ambos (por=cuenta,territorio) entre desde y hasta."""
+    try:
+        por, filtros, desde, hasta = transacciones.leer_totales(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_db_connection()
+    try:
+        return jsonify(transacciones.totales(conn, por, filtros, desde, hasta))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/resumen-subcategorias', methods=['GET'])
+@cacheado
+def resumen_subcategorias():
+    """Desglose por subcategoría de ingresos y egresos de cada mes entre desde y hasta (AAAA-MM), agrupado por mes."""
+    desde = request.args.get('desde') or '0000-00'
+    hasta = request.args.get('hasta') or '9999-99'
+    for valor in (desde, hasta):
+        if len(valor) != 7 or valor[4] != '-' or not (valor[:4] + valor[5:]).isdigit():
+            return jsonify({'error': f'Mes inválido: {valor}. Debe tener formato AAAA-MM'}), 400
+    conn = get_db_connection()
+    try:
+        if motor_analitico(conn):
+            filas = motor.subcategorias_rango(desde, hasta)
+        else:
+            filas = conn.execute(consultas.SUBCATEGORIAS_RANGO, (desde, hasta)).fetchall()
+        return jsonify(consultas.agrupar_subcategorias(filas))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/agregados', methods=['GET'])
+@cacheado
+def consultar_agregados():
+    """Agregación genérica: dimensiones, medidas y filtros de la query string. Informa la fuente que usó."""
+    try:
+        consulta = agregados.leer_consulta(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_db_connection()
+    try:
+        plan = agregados.planificar(conn, consulta, motor_analitico(conn))
+        filas = agregados.ejecutar(conn, consulta, plan, motor)
+        return jsonify({'plan': plan._asdict(), 'filas': filas})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/resumen-subcategorias-ingresos', methods=['GET'])
+@cacheado
 def resumen_subcategorias_ingresos():
     mes = request.args.get('mes')
     if not mes:
         return jsonify({'error': 'Falta el parámetro mes'}), 400
     conn = get_db_connection()
     try:
-        query = '''
-            SELECT categoria, subcategoria, SUM(monto) as total
-            FROM datos
-            WHERE strftime('%Y-%m', fecha) = ?
-              AND (tipo = 'Ingreso' OR categoria = 'Ahorros')
-            GROUP BY categoria, subcategoria
-        '''
-        datos = conn.execute(query, (mes,)).fetchall()
+        if motor_analitico(conn):
+            datos = motor.subcategorias_ingresos(mes)
+        else:
+            datos = conn.execute(consultas.SUBCATEGORIAS_INGRESOS, (mes,)).fetchall()
         resultado = []
         for row in datos:
             resultado.append({
@@ -500,20 +687,17 @@ def resumen_subcategorias_ingresos():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/resumen-subcategorias-egresos', methods=['GET'])
+@cacheado
 def resumen_subcategorias_egresos():
     mes = request.args.get('mes')
     if not mes:
         return jsonify({'error': 'Falta el parámetro mes'}), 400
     conn = get_db_connection()
     try:
-        query = '''
-            SELECT categoria, subcategoria, SUM(monto) as total
-            FROM datos
-            WHERE tipo = 'Egreso' AND categoria IN ('Gastos basicos', 'Gastos deseo')
-              AND strftime('%Y-%m', fecha) = ?
-            GROUP BY categoria, subcategoria
-        '''
-        datos = conn.execute(query, (mes,)).fetchall()
+        if motor_analitico(conn):
+            datos = motor.subcategorias_egresos(mes)
+        else:
+            datos = conn.execute(consultas.SUBCATEGORIAS_EGRESOS, (mes,)).fetchall()
         resultado = []
         for row in datos:
             resultado.append({
@@ -526,4 +710,9 @@ def resumen_subcategorias_egresos():
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    # Servidor de desarrollo. Bajo gunicorn las migraciones las aplica el proceso maestro
+    # (gunicorn.conf.py); con otros servidores, python migraciones.py antes de arrancar
+    from migraciones import migrar
+
+    migrar()
     app.run()
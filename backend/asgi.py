@@ -0,0 +1,226 @@
+# Modo de servicio asyncio: gunicorn asgi:app -k uvicorn_worker.UvicornWorker (o uvicorn asgi:app;
+# sin gunicorn.conf.py las migraciones se aplican antes con python migraciones.py)
+#
+# Las rutas de Flask no cambian. Cada pedido se atiende en un pool acotado de hilos
+# y el event loop solo lee y escribe en los sockets: las conexiones lentas o inactivas
+# no ocupan un hilo, y las exportaciones, volcados completos y cargas masivas tienen
+# sus propios hilos, de modo que no dejan en cola a los pedidos del dashboard.
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from app import app as aplicacion_flask
+from db import POOL_MAX_CONEXIONES
+
+# Pedidos pesados atendidos a la vez por proceso
+ASGI_HILOS_PESADOS = int(os.environ.get('ASGI_HILOS_PESADOS', '2'))
+
+# Resto de los pedidos atendidos a la vez: entre ambos no superan las conexiones del pool
+ASGI_HILOS = int(os.environ.get('ASGI_HILOS', str(max(1, POOL_MAX_CONEXIONES - ASGI_HILOS_PESADOS))))
+
+# Bytes de una respuesta en streaming que se juntan en el hilo antes de enviarlos al socket
+BLOQUE_RESPUESTA = 64 * 1024
+
+RUTAS_PESADAS = ('/api/exportar', '/api/exportar-excel', '/api/datos-dashboard',
+                 '/api/datos/bulk', '/api/transacciones/bulk')
+
+# Listados que sin limit devuelven (o transmiten) la tabla completa
+RUTAS_LISTADO = ('/api/datos', '/api/registros-filtrados', '/api/transacciones')
+
+
+def es_pesado(metodo, ruta, query_string):
+    """Indica si el pedido va al pool de pedidos pesados."""
+    if ruta in RUTAS_PESADAS:
+        return True
+    return metodo == 'GET' and ruta in RUTAS_LISTADO and 'limit' not in parse_qs(query_string)
+
+
+class EntradaASGI:
+    """wsgi.input que pide el cuerpo al servidor ASGI a medida que se lee, desde cualquier hilo."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = bytearray()
+        self._fin = False
+
+    def _llenar(self):
+        mensaje = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        self._buffer += mensaje.get('body', b'')
+        # Si el cliente se desconecta el cuerpo queda truncado y Werkzeug lo detecta por Content-Length
+        self._fin = mensaje['type'] == 'http.disconnect' or not mensaje.get('more_body', False)
+
+    def _extraer(self, cantidad):
+        datos = bytes(self._buffer[:cantidad])
+        del self._buffer[:cantidad]
+        return datos
+
+    def read(self, size=-1):
+        while not self._fin and (size is None or size < 0 or len(self._buffer) < size):
+            self._llenar()
+        return self._extraer(len(self._buffer) if size is None or size < 0 else size)
+
+    def readline(self, size=-1):
+        while not self._fin and b'\n' not in self._buffer and (size is None or size < 0 or len(self._buffer) < size):
+            self._llenar()
+        fin = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        return self._extraer(fin if size is None or size < 0 else min(fin, size))
+
+    def __iter__(self):
+        while True:
+            linea = self.readline()
+            if not linea:
+                return
+            yield linea
+
+
+def entorno_wsgi(scope, entrada):
+    """Arma el environ WSGI de un pedido HTTP ASGI."""
+    raiz = scope.get('root_path', '')
+    ruta = scope['path'][len(raiz):] if raiz and scope['path'].startswith(raiz) else scope['path']
+    servidor = scope.get('server') or ('localhost', 80)
+    entorno = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': raiz.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': ruta.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': entrada,
+        # El cuerpo termina donde termina el stream: vale también para pedidos sin Content-Length
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for nombre, valor in scope['headers']:
+        nombre = nombre.decode('latin-1').upper().replace('-', '_')
+        clave = nombre if nombre in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + nombre
+        valor = valor.decode('latin-1')
+        entorno[clave] = entorno[clave] + ',' + valor if clave in entorno else valor
+    return entorno
+
+
+def siguiente_bloque(iterador):
+    """Junta partes de la respuesta hasta BLOQUE_RESPUESTA bytes. Devuelve (bloque, terminada)."""
+    partes = []
+    tamano = 0
+    for parte in iterador:
+        if parte:
+            partes.append(parte)
+            tamano += len(parte)
+            if tamano >= BLOQUE_RESPUESTA:
+                return b''.join(partes), False
+    return b''.join(partes), True
+
+
+class AplicacionASGI:
+    """Adapta una aplicación WSGI a ASGI ejecutándola en un pool acotado de hilos."""
+
+    def __init__(self, aplicacion, hilos=ASGI_HILOS, hilos_pesados=ASGI_HILOS_PESADOS):
+        self.aplicacion = aplicacion
+        self.hilos = max(1, hilos)
+        self.hilos_pesados = max(1, hilos_pesados)
+        self._pool = ThreadPoolExecutor(self.hilos + self.hilos_pesados, thread_name_prefix='asgi')
+        self._livianos = None
+        self._pesados = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._ciclo_de_vida(receive, send)
+        elif scope['type'] == 'http':
+            await self._atender(scope, receive, send)
+        else:
+            raise ValueError(f"Tipo de conexión no soportado: {scope['type']}")
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                self._pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _responder(self, entorno, loop, enviar, desconectado):
+        """Corre la vista y recorre su respuesta hasta close() en un mismo hilo del pool.
+
+        Los generadores de stream_with_context restauran el contexto de Flask del hilo
+        donde arrancaron: si se reanudaran en otro, el contexto no se cerraría y la
+        conexión del pedido no volvería al pool.
+        """
+        respuesta = {}
+
+        def start_response(estado, encabezados, exc_info=None):
+            respuesta['estado'] = estado
+            respuesta['encabezados'] = encabezados
+            return lambda datos: respuesta.setdefault('escrito', []).append(datos)
+
+        def enviar_bloque(*mensajes):
+            # Espera a que el socket acepte el bloque: el hilo no genera más rápido de lo que lee el cliente
+            asyncio.run_coroutine_threadsafe(enviar(mensajes), loop).result()
+
+        iterable = self.aplicacion(entorno, start_response)
+        try:
+            iterador = iter(iterable)
+            bloque, terminada = siguiente_bloque(iterador)
+            bloque = b''.join(respuesta.pop('escrito', ())) + bloque
+            enviar_bloque({
+                'type': 'http.response.start',
+                'status': int(respuesta['estado'].split(' ', 1)[0]),
+                'headers': [(nombre.lower().encode('latin-1'), valor.encode('latin-1'))
+                            for nombre, valor in respuesta['encabezados']],
+            }, {'type': 'http.response.body', 'body': bloque, 'more_body': not terminada})
+            while not terminada and not desconectado.is_set():
+                bloque, terminada = siguiente_bloque(iterador)
+                enviar_bloque({'type': 'http.response.body', 'body': bloque, 'more_body': not terminada})
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    async def _atender(self, scope, receive, send):
+        if self._livianos is None:
+            self._livianos = asyncio.Semaphore(self.hilos)
+            self._pesados = asyncio.Semaphore(self.hilos_pesados)
+        loop = asyncio.get_running_loop()
+        pesado = es_pesado(scope['method'], scope['path'], scope['query_string'].decode('latin-1'))
+        desconectado = threading.Event()
+        vigia = None
+
+        async def enviar(mensajes):
+            nonlocal vigia
+            for mensaje in mensajes:
+                await send(mensaje)
+            # Con la respuesta empezada la vista ya leyó el cuerpo: receive() solo puede traer la desconexión
+            if vigia is None and mensajes[-1].get('more_body'):
+                vigia = asyncio.create_task(self._vigilar(receive, desconectado))
+
+        # El lugar se conserva hasta cerrar la respuesta: un streaming retiene su hilo y su conexión del pool
+        async with self._pesados if pesado else self._livianos:
+            entorno = entorno_wsgi(scope, EntradaASGI(receive, loop))
+            try:
+                await loop.run_in_executor(self._pool, self._responder, entorno, loop, enviar, desconectado)
+            finally:
+                # Si se cancela el pedido, el hilo deja de generar en el próximo bloque
+                desconectado.set()
+                if vigia is not None:
+                    vigia.cancel()
+
+    @staticmethod
+    async def _vigilar(receive, desconectado):
+        # Deja de generar una respuesta en streaming si el cliente se fue
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        desconectado.set()
+
+
+app = AplicacionASGI(aplicacion_flask)
@@ -0,0 +1,452 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from urllib.parse import quote, urlsplit
+
+# generador, db y app se importan dentro de ejecutar: db.DB_PATH se fija al importar y
+# tiene que apuntar a la base del benchmark, nunca a backend/datos.db
+
+FILAS = 10000
+REPETICIONES = 30
+
+# Los endpoints que recorren toda la base se repiten menos veces
+REPETICIONES_PESADAS = 3
+
+# Registros por pedido en /api/datos/bulk (JSON) y tope de filas de las cargas en streaming
+LOTE_BULK = 5000
+MAX_FILAS_CARGA = 100000
+
+# Modo --carga: lecturas del dashboard que repiten los clientes y exportación de los clientes pesados
+RUTAS_CARGA = (
+    '/api/dashboard', '/api/resumen-mensual', '/api/parametros', '/api/datos?limit=100',
+    '/api/tendencias', '/api/buscar?q=coto', '/api/agregados?dimensiones=mes,categoria',
+    '/api/transacciones/totales?por=cuenta', '/api/resumen-subcategorias',
+)
+RUTAS_CARGA_PESADAS = ('/api/exportar?format=xlsx', '/api/datos')
+CLIENTES_CARGA = (50, 100, 200, 500)
+DURACION_CARGA = 10
+
+
+def percentiles(tiempos):
+    """p50, p95 y p99 (más media, mínimo y máximo) en milisegundos."""
+    ms = sorted(t * 1000 for t in tiempos)
+    if len(ms) > 1:
+        cortes = statistics.quantiles(ms, n=100, method='inclusive')
+        p50, p95, p99 = cortes[49], cortes[94], cortes[98]
+    else:
+        p50 = p95 = p99 = ms[0]
+    return {
+        'n': len(ms), 'p50': round(p50, 3), 'p95': round(p95, 3), 'p99': round(p99, 3),
+        'media': round(statistics.fmean(ms), 3), 'min': round(ms[0], 3), 'max': round(ms[-1], 3),
+    }
+
+
+def rss_pico_mb():
+    """Máximo de memoria residente del proceso hasta ahora (ru_maxrss está en KB en Linux)."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def medir(funcion, repeticiones, antes=None):
+    """Ejecuta funcion una vez para calentar y después `repeticiones` veces. Devuelve los tiempos."""
+    funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def version():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version}
+
+
+def preparar_base(ruta, filas, semilla, reutilizar=None):
+    """Copia la base indicada o genera una nueva en ruta. Devuelve el resultado de la generación."""
+    import generador
+    from migraciones import migrar
+
+    if reutilizar:
+        shutil.copy(reutilizar, ruta)
+        # La copia puede venir de una versión anterior del esquema
+        with redirect_stdout(StringIO()):
+            migrar(ruta)
+        return {'origen': reutilizar}
+    inicio = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        generador.cargar(ruta, filas, semilla)
+    duracion = time.perf_counter() - inicio
+    return {
+        'origen': 'generador', 'segundos': round(duracion, 2), 'filas_por_s': round(filas / duracion),
+        'archivo_mb': round(os.path.getsize(ruta) / 2 ** 20, 1),
+    }
+
+
+def endpoints_lectura(conn, cliente):
+    """(nombre, url, pesado) de cada endpoint de lectura, con parámetros tomados de la base."""
+    meses = [fila[0] for fila in conn.execute('SELECT mes FROM resumen_mes WHERE mes IS NOT NULL ORDER BY mes')]
+    mes = meses[len(meses) // 2]
+    desde, hasta = meses[len(meses) // 4], meses[3 * len(meses) // 4]
+    plan = conn.execute('SELECT MIN(id) FROM planes_cuotas').fetchone()[0]
+    anio = mes[:4]
+    siguiente = cliente.get('/api/datos?limit=100').headers.get('X-Siguiente-Cursor', '')
+    lista = [
+        ('parametros', '/api/parametros', False),
+        ('resumen-mensual', '/api/resumen-mensual', False),
+        ('dashboard', f'/api/dashboard?mes={mes}', False),
+        ('tendencias', '/api/tendencias', False),
+        ('datos', '/api/datos?limit=100', False),
+        ('datos-pagina-2', f'/api/datos?limit=100&cursor={quote(siguiente)}', False),
+        ('datos-filtrados', f'/api/datos?limit=100&categoria=Gastos%20deseo&desde={desde}-01', False),
+        ('registros-filtrados', f'/api/registros-filtrados?fecha_inicio={mes}-01&fecha_fin={mes}-31&limit=100', False),
+        ('detalle-movimientos', f'/api/detalle-movimientos?mes={mes}&tipo=Egreso', False),
+        ('resumen-subcategorias', f'/api/resumen-subcategorias?desde={desde}&hasta={hasta}', False),
+        ('resumen-subcategorias-ingresos', f'/api/resumen-subcategorias-ingresos?mes={mes}', False),
+        ('resumen-subcategorias-egresos', f'/api/resumen-subcategorias-egresos?mes={mes}', False),
+        ('datos-dashboard', '/api/datos-dashboard', True),
+        ('agregados-mes-categoria', '/api/agregados?dimensiones=mes,categoria', False),
+        ('agregados-semana', f'/api/agregados?dimensiones=semana&desde={anio}-01-10&hasta={anio}-11-20', False),
+        ('agregados-metodo-pago', '/api/agregados?dimensiones=metodoPago&medidas=suma,cantidad,promedio', True),
+        ('buscar-relevancia', '/api/buscar?q=coto', False),
+        ('buscar-recientes', '/api/buscar?q=farmacia&orden=recientes', False),
+        ('buscar-prefijo', '/api/buscar?q=comp*', False),
+        ('planes-cuotas', '/api/planes-cuotas', True),
+        ('plan-cuotas', f'/api/planes-cuotas/{plan}', False),
+        ('exportar-csv-mes', f'/api/exportar?format=csv&fecha_inicio={mes}-01&fecha_fin={mes}-31', False),
+        ('exportar-xlsx-mes', f'/api/exportar?format=xlsx&fecha_inicio={mes}-01&fecha_fin={mes}-31', False),
+        ('transacciones', '/api/transacciones?limit=100', False),
+        ('transacciones-totales-cuenta', '/api/transacciones/totales?por=cuenta', False),
+        ('transacciones-totales-rango', f'/api/transacciones/totales?por=territorio&desde={desde}-10&hasta={hasta}-20',
+         False),
+    ]
+    return lista
+
+
+def medir_endpoints(cliente, lista, repeticiones, limpiar_cache):
+    """Latencia de cada endpoint sin cache (se vacía antes de cada pedido) y con la cache caliente."""
+    resultados = {}
+    for nombre, url, pesado in lista:
+        veces = REPETICIONES_PESADAS if pesado else repeticiones
+        respuesta = cliente.get(url)
+        cuerpo = respuesta.get_data()
+        if respuesta.status_code != 200:
+            resultados[nombre] = {'url': url, 'estado': respuesta.status_code, 'error': cuerpo[:200].decode()}
+            continue
+
+        def pedir():
+            cliente.get(url).get_data()
+
+        resultados[nombre] = {
+            'url': url, 'estado': 200, 'bytes': len(cuerpo),
+            'frio': percentiles(medir(pedir, veces, limpiar_cache)),
+            'cache': percentiles(medir(pedir, veces)),
+        }
+        print(f"  {nombre:32} p50 {resultados[nombre]['frio']['p50']:9.2f} ms"
+              f"  p99 {resultados[nombre]['frio']['p99']:9.2f} ms  cache {resultados[nombre]['cache']['p50']:7.2f} ms")
+    return resultados
+
+
+def medir_sql(ruta, repeticiones):
+    """Latencia de las consultas de consultas.CONSULTAS_INDEXADAS y otras frecuentes, directo sobre SQLite."""
+    from consultas import CONSULTAS_INDEXADAS
+    from db import conectar
+
+    conn = conectar(ruta)
+    meses = [fila[0] for fila in conn.execute('SELECT mes FROM resumen_mes WHERE mes IS NOT NULL ORDER BY mes')]
+    mes = meses[len(meses) // 2]
+    consultas = dict(CONSULTAS_INDEXADAS)
+    consultas.update({
+        'resumen-mes': ('SELECT * FROM resumen_mes', ()),
+        'ultimos-datos': ('SELECT * FROM datos ORDER BY fecha DESC, id DESC LIMIT 100', ()),
+        'datos-del-mes': ('SELECT * FROM datos WHERE mes = ?', (mes,)),
+        'busqueda-fts': ("SELECT COUNT(*) FROM movimientos_fts WHERE movimientos_fts MATCH 'coto'", ()),
+        'totales-transacciones': (
+            'SELECT clave_cuenta, SUM(total), SUM(cantidad) FROM resumen_transacciones GROUP BY clave_cuenta', ()),
+    })
+    resultados = {}
+    for nombre, (sql, parametros) in consultas.items():
+        filas = len(conn.execute(sql, parametros).fetchall())
+        resultados[nombre] = {
+            'filas': filas,
+            **percentiles(medir(lambda: conn.execute(sql, parametros).fetchall(), repeticiones)),
+        }
+        print(f"  {nombre:32} p50 {resultados[nombre]['p50']:9.3f} ms  ({filas} filas)")
+    conn.close()
+    return resultados
+
+
+def medir_escritura(cliente, directorio, filas, semilla, repeticiones):
+    """POST /api/datos por registro, /api/datos/bulk en JSON y NDJSON, e import_excel.py sobre CSV."""
+    import generador
+    import import_excel
+
+    resultados = {}
+    registro = next(generador.registros(1, semilla + 1))
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        estado = cliente.post('/api/datos', json=registro).status_code
+        tiempos.append(time.perf_counter() - inicio)
+        if estado != 201:
+            raise RuntimeError(f'POST /api/datos devolvió {estado}')
+    resultados['post-datos'] = percentiles(tiempos)
+
+    cantidad = min(filas, MAX_FILAS_CARGA)
+    registros = list(generador.registros(cantidad, semilla + 2))
+    inicio = time.perf_counter()
+    tiempos = []
+    with redirect_stdout(StringIO()):
+        for desde in range(0, cantidad, LOTE_BULK):
+            comienzo = time.perf_counter()
+            cliente.post('/api/datos/bulk', json=registros[desde:desde + LOTE_BULK])
+            tiempos.append(time.perf_counter() - comienzo)
+    duracion = time.perf_counter() - inicio
+    resultados['bulk-json'] = {'filas': cantidad, 'lote': LOTE_BULK, 'filas_por_s': round(cantidad / duracion),
+                               'por_pedido': percentiles(tiempos)}
+
+    ruta_ndjson = os.path.join(directorio, 'carga.ndjson')
+    generador.escribir_ndjson(ruta_ndjson, cantidad, semilla + 3)
+    with open(ruta_ndjson, 'rb') as archivo:
+        cuerpo = archivo.read()
+    inicio = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        respuesta = cliente.post('/api/datos/bulk', data=cuerpo, content_type='application/x-ndjson')
+    duracion = time.perf_counter() - inicio
+    resultados['bulk-ndjson'] = {'filas': respuesta.get_json()['registros_importados'],
+                                 'filas_por_s': round(cantidad / duracion), 'segundos': round(duracion, 3)}
+
+    ruta_csv = os.path.join(directorio, 'carga.csv')
+    generador.escribir_csv(ruta_csv, cantidad, semilla + 4)
+    inicio = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        importadas = import_excel.importar_archivos([ruta_csv])
+    duracion = time.perf_counter() - inicio
+    resultados['import-excel-csv'] = {'filas': importadas, 'filas_por_s': round(cantidad / duracion),
+                                      'segundos': round(duracion, 3)}
+    for nombre in ('bulk-json', 'bulk-ndjson', 'import-excel-csv'):
+        print(f"  {nombre:32} {resultados[nombre]['filas_por_s']:>10,} filas/s")
+    return resultados
+
+
+def ejecutar(filas, semilla=None, repeticiones=REPETICIONES, reutilizar=None, directorio=None):
+    """Corre el benchmark completo y devuelve el resultado como dict serializable a JSON."""
+    temporal = None
+    if directorio is None:
+        directorio = temporal = tempfile.mkdtemp(prefix='benchmark_')
+    ruta = os.path.abspath(os.path.join(directorio, 'benchmark.db'))
+    os.environ['DATOS_DB'] = ruta
+    import db
+    if os.path.abspath(db.DB_PATH) != ruta:
+        raise RuntimeError(f'db ya estaba importado con DATOS_DB={db.DB_PATH}: el benchmark escribiría en esa base')
+    import generador
+
+    semilla = generador.SEMILLA if semilla is None else semilla
+    try:
+        resultado = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'version': version(),
+            'parametros': {'filas': filas, 'semilla': semilla, 'repeticiones': repeticiones},
+            'rss_pico_mb': {'inicio': rss_pico_mb()},
+        }
+        print(f"Preparando base con {filas} movimientos...")
+        resultado['base'] = preparar_base(ruta, filas, semilla, reutilizar)
+        resultado['rss_pico_mb']['base'] = rss_pico_mb()
+
+        with redirect_stdout(StringIO()):
+            from app import app, cache_respuestas
+        cliente = app.test_client()
+        resultado['rss_pico_mb']['app'] = rss_pico_mb()
+
+        print("Endpoints de lectura (test client):")
+        conn = sqlite3.connect(ruta)
+        lista = endpoints_lectura(conn, cliente)
+        conn.close()
+        resultado['endpoints'] = medir_endpoints(cliente, lista, repeticiones, cache_respuestas.limpiar)
+        resultado['rss_pico_mb']['endpoints'] = rss_pico_mb()
+
+        print("Consultas SQL:")
+        resultado['sql'] = medir_sql(ruta, repeticiones)
+        resultado['rss_pico_mb']['sql'] = rss_pico_mb()
+
+        print("Escritura:")
+        resultado['escritura'] = medir_escritura(cliente, directorio, filas, semilla, repeticiones)
+        resultado['rss_pico_mb']['escritura'] = rss_pico_mb()
+        return resultado
+    finally:
+        if temporal:
+            shutil.rmtree(temporal, ignore_errors=True)
+
+
+async def _pedir(lector, escritor, host, ruta):
+    """GET con keep-alive. Devuelve (estado, bytes del cuerpo, el servidor cierra la conexión)."""
+    escritor.write(f'GET {ruta} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode('latin-1'))
+    await escritor.drain()
+    linea = await lector.readline()
+    if not linea:
+        raise ConnectionError('El servidor cerró la conexión')
+    estado = int(linea.split()[1])
+    encabezados = {}
+    while (linea := await lector.readline()) not in (b'\r\n', b''):
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        encabezados[nombre.strip().lower()] = valor.strip().lower()
+    cerrar = encabezados.get('connection') == 'close'
+    if 'content-length' in encabezados:
+        tamano = len(await lector.readexactly(int(encabezados['content-length'])))
+    elif encabezados.get('transfer-encoding') == 'chunked':
+        tamano = 0
+        while (parte := int((await lector.readline()).split(b';')[0], 16)) > 0:
+            tamano += len(await lector.readexactly(parte + 2)) - 2
+        await lector.readline()
+    else:
+        tamano, cerrar = len(await lector.read()), True
+    return estado, tamano, cerrar
+
+
+async def _cliente(host, puerto, rutas, desplazamiento, fin, tiempos, errores):
+    """Un cliente que repite pedidos en secuencia hasta fin, reconectando si el servidor cierra."""
+    conexion = None
+    i = desplazamiento
+    while time.monotonic() < fin:
+        ruta = rutas[i % len(rutas)]
+        i += 1
+        inicio = time.perf_counter()
+        try:
+            if conexion is None:
+                conexion = await asyncio.open_connection(host, puerto)
+            estado, _, cerrar = await _pedir(*conexion, f'{host}:{puerto}', ruta)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errores.append(ruta)
+            cerrar, estado = True, None
+        if estado is not None:
+            if estado >= 400:
+                errores.append(ruta)
+            else:
+                tiempos.append(time.perf_counter() - inicio)
+        if cerrar and conexion is not None:
+            conexion[1].close()
+            conexion = None
+    if conexion is not None:
+        conexion[1].close()
+
+
+async def _nivel_de_carga(host, puerto, clientes, pesados, duracion):
+    fin = time.monotonic() + duracion
+    livianos, pesadas, errores = [], [], []
+    tareas = [_cliente(host, puerto, RUTAS_CARGA, i, fin, livianos, errores) for i in range(clientes)]
+    tareas += [_cliente(host, puerto, RUTAS_CARGA_PESADAS, i, fin, pesadas, errores) for i in range(pesados)]
+    inicio = time.perf_counter()
+    await asyncio.gather(*tareas)
+    transcurrido = time.perf_counter() - inicio
+    resultado = {
+        'clientes': clientes, 'clientes_pesados': pesados, 'segundos': round(transcurrido, 2),
+        'pedidos_por_s': round(len(livianos) / transcurrido, 1), 'errores': len(errores),
+        'latencia': percentiles(livianos) if livianos else None,
+        'pesados_completados': len(pesadas),
+    }
+    if pesadas:
+        resultado['latencia_pesados'] = percentiles(pesadas)
+    return resultado
+
+
+def medir_carga(url, niveles, pesados, duracion):
+    """Throughput y latencia de un servidor ya levantado con N clientes concurrentes por nivel.
+
+    Los clientes livianos recorren RUTAS_CARGA (lecturas del dashboard); otros `pesados`
+    clientes piden exportaciones completas a la vez, para ver si las lecturas quedan en cola.
+    """
+    direccion = urlsplit(url)
+    host, puerto = direccion.hostname, direccion.port or 80
+    resultados = []
+    for clientes in niveles:
+        resultado = asyncio.run(_nivel_de_carga(host, puerto, clientes, pesados, duracion))
+        latencia = resultado['latencia'] or {'p50': 0, 'p95': 0, 'p99': 0}
+        print(f"  {clientes:4} clientes: {resultado['pedidos_por_s']:8.1f} pedidos/s  p50 {latencia['p50']:8.2f} ms"
+              f"  p95 {latencia['p95']:8.2f} ms  p99 {latencia['p99']:8.2f} ms"
+              f"  pesados {resultado['pesados_completados']}  errores {resultado['errores']}")
+        resultados.append(resultado)
+    return resultados
+
+
+def comparar(anterior, actual):
+    """Imprime p50 y p95 de dos corridas lado a lado con la razón actual / anterior."""
+    print(f"{'':40} {'p50 antes':>10} {'p50 ahora':>10} {'razón':>7} {'p95 antes':>10} {'p95 ahora':>10}")
+    for seccion, clave in (('endpoints', 'frio'), ('sql', None)):
+        for nombre, medida in actual.get(seccion, {}).items():
+            previa = anterior.get(seccion, {}).get(nombre)
+            if not previa or 'error' in medida or 'error' in previa:
+                continue
+            a, b = (previa[clave], medida[clave]) if clave else (previa, medida)
+            razon = b['p50'] / a['p50'] if a['p50'] else float('inf')
+            print(f"{seccion + '/' + nombre:40} {a['p50']:10.2f} {b['p50']:10.2f} {razon:7.2f} "
+                  f"{a['p95']:10.2f} {b['p95']:10.2f}")
+    for medida, previa in zip(actual.get('carga', ()), anterior.get('carga', ())):
+        if medida['latencia'] and previa['latencia']:
+            print(f"{'carga/' + str(medida['clientes']) + ' clientes':40} {previa['latencia']['p50']:10.2f} "
+                  f"{medida['latencia']['p50']:10.2f} {medida['latencia']['p50'] / previa['latencia']['p50']:7.2f} "
+                  f"{previa['latencia']['p95']:10.2f} {medida['latencia']['p95']:10.2f}"
+                  f"  ({previa['pedidos_por_s']} -> {medida['pedidos_por_s']} pedidos/s)")
+    for nombre, medida in actual.get('escritura', {}).items():
+        previa = anterior.get('escritura', {}).get(nombre, {})
+        if 'filas_por_s' in medida and 'filas_por_s' in previa:
+            print(f"{'escritura/' + nombre:40} {previa['filas_por_s']:>10,} {medida['filas_por_s']:>10,} filas/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de los endpoints, el SQL y las cargas sobre un libro sintético.')
+    parser.add_argument('--filas', type=int, default=FILAS, help='movimientos del libro generado (10000 a 10000000)')
+    parser.add_argument('--semilla', type=int, help='semilla del generador (por defecto generador.SEMILLA)')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--db', help='usa una copia de esta base en lugar de generar una')
+    parser.add_argument('--salida', help='archivo JSON de resultados (por defecto benchmark_<filas>.json)')
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTERIOR', 'ACTUAL'),
+                        help='compara dos archivos de resultados en lugar de correr el benchmark')
+    parser.add_argument('--carga', metavar='URL', help='mide throughput contra un servidor ya levantado (ej. http://127.0.0.1:5000)')
+    parser.add_argument('--clientes', default=','.join(map(str, CLIENTES_CARGA)),
+                        help='niveles de clientes concurrentes del modo --carga, separados por coma')
+    parser.add_argument('--pesados', type=int, default=2, help='clientes que piden exportaciones durante la carga')
+    parser.add_argument('--duracion', type=float, default=DURACION_CARGA, help='segundos por nivel de carga')
+    args = parser.parse_args()
+
+    if args.comparar:
+        with open(args.comparar[0]) as a, open(args.comparar[1]) as b:
+            comparar(json.load(a), json.load(b))
+        sys.exit(0)
+
+    if args.carga:
+        print(f"Carga contra {args.carga}:")
+        niveles = [int(n) for n in args.clientes.split(',')]
+        resultado = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'version': version(),
+            'parametros': {'url': args.carga, 'pesados': args.pesados, 'duracion': args.duracion},
+            'carga': medir_carga(args.carga, niveles, args.pesados, args.duracion),
+        }
+        with open(args.salida or 'benchmark_carga.json', 'w') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        sys.exit(0)
+
+    resultado = ejecutar(args.filas, args.semilla, args.repeticiones, args.db)
+    salida = args.salida or f'benchmark_{args.filas}.json'
+    with open(salida, 'w') as archivo:
+        json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+    print(f"Resultados en {salida} (RSS pico {resultado['rss_pico_mb']['escritura']} MB)")
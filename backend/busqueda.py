@@ -0,0 +1,143 @@
+from collections import namedtuple
+
+from agregados import COLUMNAS_ID, leer_fecha
+from paginacion import codificar_cursor
+
+# relevancia: bm25 sobre detalle; recientes: los últimos movimientos cargados primero
+ORDENES = ('relevancia', 'recientes')
+
+# La relevancia se calcula sobre las coincidencias más recientes: el costo de
+# ordenar queda acotado aunque el término aparezca en casi todos los movimientos
+CANDIDATOS_RELEVANCIA = 2000
+
+LIMITE_POR_DEFECTO = 20
+
+# Los prefijos de 2 y 3 letras están indexados; uno de una sola letra recorrería medio vocabulario
+LARGO_MINIMO_PREFIJO = 2
+
+Busqueda = namedtuple('Busqueda', 'expresion orden filtros desde hasta')
+
+
+def expresion_fts(texto):
+    """Convierte el texto buscado en una expresión MATCH de FTS5.
+
+    Cada palabra es un término entre comillas (la sintaxis de FTS5 no se
+    interpreta) y deben aparecer todas. Una palabra terminada en * busca por prefijo.
+    """
+    terminos = []
+    for palabra in texto.split():
+        prefijo = palabra.endswith('*')
+        palabra = palabra.rstrip('*').replace('"', '')
+        if not palabra:
+            continue
+        if prefijo and len(palabra) < LARGO_MINIMO_PREFIJO:
+            raise ValueError(f'El prefijo {palabra}* debe tener al menos {LARGO_MINIMO_PREFIJO} letras')
+        terminos.append(f'"{palabra}"' + ('*' if prefijo else ''))
+    if not terminos:
+        raise ValueError('q no tiene palabras para buscar')
+    return ' '.join(terminos)
+
+
+def leer_busqueda(args):
+    """Lee q, orden, filtros y rango de fechas de la query string. Lanza ValueError si son inválidos."""
+    expresion = expresion_fts(args.get('q', ''))
+    orden = args.get('orden', 'relevancia')
+    if orden not in ORDENES:
+        raise ValueError(f'orden inválido: {orden}. Debe ser uno de: {", ".join(ORDENES)}')
+    filtros = {columna: args[columna] for columna in COLUMNAS_ID if args.get(columna)}
+    desde = leer_fecha(args['desde'], 'desde') if args.get('desde') else None
+    hasta = leer_fecha(args['hasta'], 'hasta') if args.get('hasta') else None
+    return Busqueda(expresion, orden, filtros, desde, hasta)
+
+
+def _coincidencias(busqueda):
+    """FROM y WHERE de los movimientos que coinciden con la búsqueda y sus filtros."""
+    condiciones, valores = ['movimientos_fts MATCH ?'], [busqueda.expresion]
+    for columna, valor in busqueda.filtros.items():
+        tabla, columna_id = COLUMNAS_ID[columna]
+        condiciones.append(f'm.{columna_id} = (SELECT id FROM {tabla} WHERE nombre = ?)')
+        valores.append(valor)
+    for condicion, valor in (('m.fecha >= ?', busqueda.desde), ('m.fecha <= ?', busqueda.hasta)):
+        if valor:
+            condiciones.append(condicion)
+            valores.append(valor)
+    origen = 'movimientos_fts f'
+    if len(condiciones) > 1:
+        origen += ' JOIN movimientos m ON m.id = f.rowid'
+    return origen, condiciones, valores
+
+
+def _corte_relevancia(conn, busqueda):
+    """Menor id entre las CANDIDATOS_RELEVANCIA coincidencias más recientes (0 si hay menos)."""
+    origen, condiciones, valores = _coincidencias(busqueda)
+    fila = conn.execute(
+        f'SELECT f.rowid FROM {origen} WHERE {" AND ".join(condiciones)}'
+        ' ORDER BY f.rowid DESC LIMIT 1 OFFSET ?',
+        valores + [CANDIDATOS_RELEVANCIA - 1],
+    ).fetchone()
+    return fila[0] if fila else 0
+
+
+def leer_cursor(busqueda, cursor):
+    """Adapta un cursor ya decodificado (posición, id) al orden pedido. Lanza ValueError si no corresponde."""
+    posicion, id_registro = cursor
+    if busqueda.orden == 'relevancia':
+        if not (isinstance(posicion, list) and len(posicion) == 2
+                and all(isinstance(v, (int, float)) for v in posicion)):
+            raise ValueError('El cursor no corresponde al orden relevancia')
+        return posicion[0], id_registro, posicion[1]
+    if posicion is not None:
+        raise ValueError('El cursor no corresponde al orden recientes')
+    return id_registro
+
+
+def buscar(conn, busqueda, columnas, limite=LIMITE_POR_DEFECTO, cursor=None):
+    """Devuelve (registros, siguiente_cursor) con las columnas de datos de cada coincidencia.
+
+    En orden de relevancia el cursor guarda (rango, id) del último registro y
+    el corte de candidatos de la primera página, para que las páginas siguientes
+    ordenen el mismo conjunto aunque se carguen movimientos nuevos.
+    """
+    origen, condiciones, valores = _coincidencias(busqueda)
+    if busqueda.orden == 'relevancia':
+        if cursor:
+            rango, ultimo_id, corte = cursor
+        else:
+            corte = _corte_relevancia(conn, busqueda)
+        condiciones.append('f.rowid >= ?')
+        valores.append(corte)
+        pagina = (
+            f'SELECT f.rowid AS id, bm25(movimientos_fts) AS rango FROM {origen}'
+            f' WHERE {" AND ".join(condiciones)}'
+        )
+        if cursor:
+            pagina = f'SELECT id, rango FROM ({pagina}) WHERE rango > ? OR (rango = ? AND id < ?)'
+            valores += [rango, rango, ultimo_id]
+        # A igual relevancia, primero los más recientes
+        orden = 'p.rango, p.id DESC'
+    else:
+        if cursor:
+            condiciones.append('f.rowid < ?')
+            valores.append(cursor)
+        pagina = f'SELECT f.rowid AS id, NULL AS rango FROM {origen} WHERE {" AND ".join(condiciones)}'
+        orden = 'p.id DESC'
+    # Se pide una fila extra para saber si hay una página siguiente
+    pagina += f' ORDER BY {orden.replace("p.", "")} LIMIT ?'
+    valores.append(limite + 1)
+
+    seleccion = ', '.join(f'd.{c}' for c in columnas)
+    filas = conn.execute(
+        f'SELECT {seleccion}, p.id AS _id, p.rango AS _rango FROM ({pagina}) p'
+        f' JOIN datos d ON d.id = p.id ORDER BY {orden}',
+        valores,
+    ).fetchall()
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        if busqueda.orden == 'relevancia':
+            siguiente = codificar_cursor([ultima['_rango'], corte], ultima['_id'])
+        else:
+            siguiente = codificar_cursor(None, ultima['_id'])
+    return [{c: fila[c] for c in columnas} for fila in filas], siguiente
@@ -0,0 +1,64 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+# Cantidad máxima de respuestas guardadas por proceso
+CACHE_MAX_ENTRADAS = int(os.environ.get('CACHE_RESPUESTAS_MAX', '256'))
+
+Entrada = namedtuple('Entrada', 'version etag cuerpo mimetype')
+
+
+class CacheRespuestas:
+    """Cache LRU de respuestas de lectura, válida mientras no cambie la versión de los datos."""
+
+    def __init__(self, max_entradas=CACHE_MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._no_modificados = 0
+        self._expulsadas = 0
+
+    def obtener(self, clave, version):
+        """Devuelve la entrada guardada para la clave si corresponde a la versión indicada."""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada.version == version:
+                self._entradas.move_to_end(clave)
+                self._hits += 1
+                return entrada
+            self._misses += 1
+            return None
+
+    def guardar(self, clave, version, cuerpo, mimetype):
+        """Guarda una respuesta y devuelve su entrada, con ETag calculado sobre el cuerpo."""
+        entrada = Entrada(version, hashlib.blake2b(cuerpo, digest_size=16).hexdigest(), cuerpo, mimetype)
+        with self._lock:
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self._expulsadas += 1
+        return entrada
+
+    def registrar_no_modificado(self):
+        with self._lock:
+            self._no_modificados += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        """Devuelve contadores de uso de la cache."""
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'hits': self._hits,
+                'misses': self._misses,
+                'no_modificados': self._no_modificados,
+                'expulsadas': self._expulsadas,
+            }
@@ -0,0 +1,79 @@
+from paginacion import COLUMNAS_DATOS
+
+# Cambios por respuesta: el cliente repite el pedido con la revisión devuelta mientras hay_mas
+LIMITE_POR_DEFECTO = 5000
+LIMITE_MAXIMO = 50000
+
+REVISION_ACTUAL = 'SELECT IFNULL(MAX(revision), 0) FROM revisiones_movimientos'
+
+# Página de cambios: recorre el índice de revisiones a partir de la del cliente
+CAMBIOS = '''
+    SELECT id, revision, eliminado
+    FROM revisiones_movimientos
+    WHERE revision > ? AND revision <= ? AND (eliminado = 0 OR ? > 0)
+    ORDER BY revision
+    LIMIT ?
+'''
+
+# Registros vivos de la página. Con un LEFT JOIN SQLite materializaría la vista datos completa;
+# con JOIN la aplana y busca cada movimiento por id
+REGISTROS = f'''
+    SELECT {', '.join('d.' + c for c in COLUMNAS_DATOS)}
+    FROM revisiones_movimientos r
+    JOIN datos d ON d.id = r.id
+    WHERE r.revision > ? AND r.revision <= ? AND r.eliminado = 0
+    ORDER BY r.revision
+'''
+
+
+def revision_actual(conn):
+    """Última revisión asignada a un movimiento (0 si la base no tiene cambios)."""
+    return conn.execute(REVISION_ACTUAL).fetchone()[0]
+
+
+def _entero(args, parametro, por_defecto):
+    valor = args.get(parametro)
+    if valor is None:
+        return por_defecto
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValueError(f'{parametro} inválido: {valor}')
+
+
+def leer_parametros(args):
+    """Lee desde y limit de la query string. Lanza ValueError si son inválidos."""
+    desde = _entero(args, 'desde', 0)
+    if desde < 0:
+        raise ValueError('desde debe ser mayor o igual a 0')
+    limite = _entero(args, 'limit', LIMITE_POR_DEFECTO)
+    if limite < 1 or limite > LIMITE_MAXIMO:
+        raise ValueError(f'limit debe estar entre 1 y {LIMITE_MAXIMO}')
+    return desde, limite
+
+
+def cambios_desde(conn, desde, limite=LIMITE_POR_DEFECTO):
+    """Movimientos dados de alta o modificados y ids eliminados después de la revisión desde.
+
+    Con desde=0 se omiten las lápidas: el cliente no tiene nada que borrar. La
+    revisión devuelta es la que el cliente pasa como desde en el próximo pedido.
+    Lanza ValueError si desde es posterior a la revisión actual (la base se
+    recreó): el cliente debe volver a cargar todo.
+    """
+    # Se fija el tope antes de leer: lo que se escriba mientras tanto llega en el próximo pedido
+    hasta = revision_actual(conn)
+    if desde > hasta:
+        raise ValueError(f'desde ({desde}) es posterior a la revisión actual ({hasta}): recargar todos los datos')
+    filas = conn.execute(CAMBIOS, (desde, hasta, desde, limite + 1)).fetchall()
+    hay_mas = len(filas) > limite
+    revision = filas[limite - 1]['revision'] if hay_mas else hasta
+
+    # Un movimiento que cambie entre las dos lecturas pasa a una revisión posterior y llega en el próximo pedido
+    registros = conn.execute(REGISTROS, (desde, revision)).fetchall() if filas else []
+    return {
+        'desde': desde,
+        'revision': revision,
+        'registros': [dict(fila) for fila in registros],
+        'eliminados': [fila['id'] for fila in filas[:limite] if fila['eliminado']],
+        'hay_mas': hay_mas,
+    }
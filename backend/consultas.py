@@ -0,0 +1,120 @@
+import cambios
+
+# Consultas de los desgloses mensuales. Filtran por la columna mes (no por
+# strftime sobre fecha) para resolverse con idx_mes_tipo_categoria sobre movimientos.
+
+# Los totales se agrupan por los ids de movimientos y recién después se traducen
+# a nombres con las tablas de dimensión (unas pocas filas por mes).
+def _con_nombres(agregado, columnas_extra=''):
+    return f'''
+    SELECT {columnas_extra}c.nombre AS categoria, s.nombre AS subcategoria, a.total
+    FROM ({agregado}) a
+    JOIN categorias c ON c.id = a.categoria_id
+    JOIN subcategorias s ON s.id = a.subcategoria_id
+'''
+
+
+DETALLE_MOVIMIENTOS = _con_nombres('''
+        SELECT categoria_id, subcategoria_id, SUM(monto) AS total
+        FROM movimientos
+        WHERE tipo_id = (SELECT id FROM tipos WHERE nombre = ?) AND mes = ?
+        GROUP BY categoria_id, subcategoria_id
+''')
+
+SUBCATEGORIAS_INGRESOS = _con_nombres('''
+        SELECT categoria_id, subcategoria_id, SUM(monto) AS total
+        FROM movimientos
+        WHERE mes = ?
+          AND (tipo_id = (SELECT id FROM tipos WHERE nombre = 'Ingreso')
+               OR categoria_id = (SELECT id FROM categorias WHERE nombre = 'Ahorros'))
+        GROUP BY categoria_id, subcategoria_id
+''')
+
+SUBCATEGORIAS_EGRESOS = _con_nombres('''
+        SELECT categoria_id, subcategoria_id, SUM(monto) AS total
+        FROM movimientos
+        WHERE tipo_id = (SELECT id FROM tipos WHERE nombre = 'Egreso')
+          AND categoria_id IN (SELECT id FROM categorias WHERE nombre IN ('Gastos basicos', 'Gastos deseo'))
+          AND mes = ?
+        GROUP BY categoria_id, subcategoria_id
+''')
+
+TOTALES_MES = _con_nombres('''
+        SELECT categoria_id, subcategoria_id, SUM(monto) AS total
+        FROM movimientos
+        WHERE mes = ?
+        GROUP BY categoria_id, subcategoria_id
+''') + '    ORDER BY categoria, subcategoria\n'
+
+# Desglose de todos los meses de un rango en una sola pasada. El GROUP BY sigue
+# el orden de idx_mes_tipo_categoria, así que no necesita ordenar aparte.
+SUBCATEGORIAS_RANGO = _con_nombres('''
+        SELECT mes, tipo_id, categoria_id, subcategoria_id, SUM(monto) AS total
+        FROM movimientos
+        WHERE mes BETWEEN ? AND ?
+        GROUP BY mes, tipo_id, categoria_id, subcategoria_id
+''', 'a.mes, t.nombre AS tipo, ') + '    JOIN tipos t ON t.id = a.tipo_id\n'
+
+# Totales de /api/datos-dashboard sobre todos los meses. Sin estadísticas el
+# planificador elige idx_tipo, que obliga a leer cada fila de la tabla; recorrer
+# el índice de cobertura completo es varias veces más rápido.
+EGRESOS_POR_CATEGORIA = '''
+    SELECT c.nombre AS categoria, a.total
+    FROM (
+        SELECT categoria_id, SUM(monto) AS total
+        FROM movimientos INDEXED BY idx_mes_tipo_categoria
+        WHERE tipo_id = (SELECT id FROM tipos WHERE nombre = 'Egreso')
+        GROUP BY categoria_id
+    ) a
+    JOIN categorias c ON c.id = a.categoria_id
+'''
+
+INGRESOS_POR_MES = '''
+    SELECT mes, SUM(monto) AS total
+    FROM movimientos INDEXED BY idx_mes_tipo_categoria
+    WHERE tipo_id = (SELECT id FROM tipos WHERE nombre = 'Ingreso')
+    GROUP BY mes
+    ORDER BY mes
+'''
+
+# Categorías de cada lado del desglose (las mismas que SUBCATEGORIAS_INGRESOS y SUBCATEGORIAS_EGRESOS)
+CATEGORIAS_EGRESOS = ('Gastos basicos', 'Gastos deseo')
+
+
+def agrupar_subcategorias(filas):
+    """Arma {mes: {'ingresos': [...], 'egresos': [...]}} a partir de las filas de SUBCATEGORIAS_RANGO."""
+    meses = {}
+    for fila in filas:
+        if fila['tipo'] == 'Ingreso' or fila['categoria'] == 'Ahorros':
+            lado = 'ingresos'
+        elif fila['tipo'] == 'Egreso' and fila['categoria'] in CATEGORIAS_EGRESOS:
+            lado = 'egresos'
+        else:
+            continue
+        totales = meses.setdefault(fila['mes'], {'ingresos': {}, 'egresos': {}})[lado]
+        clave = (fila['categoria'], fila['subcategoria'])
+        # Un ahorro puede cargarse como Ingreso o Egreso: se suman en la misma subcategoría
+        totales[clave] = totales.get(clave, 0) + fila['total']
+
+    return {
+        mes: {
+            lado: [
+                {'categoria': categoria, 'subcategoria': subcategoria, 'total': total}
+                for (categoria, subcategoria), total in totales.items()
+            ]
+            for lado, totales in lados.items()
+        }
+        for mes, lados in meses.items()
+    }
+
+
+# Consultas que no deben recorrer la tabla completa (python db.py verificar-planes)
+CONSULTAS_INDEXADAS = {
+    'detalle-movimientos': (DETALLE_MOVIMIENTOS, ('Egreso', '2024-01')),
+    'resumen-subcategorias-ingresos': (SUBCATEGORIAS_INGRESOS, ('2024-01',)),
+    'resumen-subcategorias-egresos': (SUBCATEGORIAS_EGRESOS, ('2024-01',)),
+    'dashboard': (TOTALES_MES, ('2024-01',)),
+    'resumen-subcategorias': (SUBCATEGORIAS_RANGO, ('2024-01', '2024-12')),
+    'datos-cambios': (cambios.CAMBIOS, (1000, 2000, 1000, 5000)),
+    'datos-cambios-registros': (cambios.REGISTROS, (1000, 2000)),
+}
@@ -0,0 +1,126 @@
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+
+from dimensiones import Dimensiones
+from validacion import esquema
+
+INSERTAR_PLAN = '''
+    INSERT INTO planes_cuotas
+    (fecha_inicio, tipo, categoria, subcategoria, metodoPago, monto_total, detalle, cuotas)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERTAR_CUOTA = '''
+    INSERT INTO movimientos
+    (fecha, tipo_id, categoria_id, subcategoria_id, metodo_pago_id, monto, detalle, cuotas, mes, plan_id, numero_cuota)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+COLUMNAS_PLAN = ('id', 'fecha_inicio', 'tipo', 'categoria', 'subcategoria', 'metodoPago',
+                 'monto_total', 'detalle', 'cuotas', 'estado')
+
+# Campos del plan que se copian tal cual a sus cuotas: se editan con un único UPDATE
+CAMPOS_COPIADOS = ('tipo', 'categoria', 'subcategoria', 'metodoPago', 'detalle')
+
+
+class PlanNoEncontrado(LookupError):
+    """No existe un plan de cuotas con el id pedido."""
+
+
+def expandir_plan(plan_id, fila, dimensiones, desde=1):
+    """Genera las filas de movimientos de cada cuota a partir de la fila validada del plan."""
+    fecha, _, _, _, _, monto_total, detalle, cuotas, _ = fila
+    tipo_id, categoria_id, subcategoria_id, metodo_pago_id = dimensiones.codificar([fila])[0][1:5]
+    fecha_base = date.fromisoformat(fecha)
+    monto_por_cuota = monto_total / cuotas
+    filas = []
+    for numero in range(desde, cuotas + 1):
+        fecha_cuota = fecha_base + relativedelta(months=numero - 1)
+        filas.append((
+            fecha_cuota.isoformat(), tipo_id, categoria_id, subcategoria_id, metodo_pago_id, monto_por_cuota,
+            detalle, cuotas, fecha_cuota.isoformat()[:7], plan_id, numero,
+        ))
+    return filas
+
+
+def crear_plan(conn, fila):
+    """Guarda el plan y sus cuotas (un solo executemany). Devuelve el id del plan."""
+    plan_id = conn.execute(INSERTAR_PLAN, fila[:8]).lastrowid
+    conn.executemany(INSERTAR_CUOTA, expandir_plan(plan_id, fila, Dimensiones(conn)))
+    return plan_id
+
+
+def obtener_plan(conn, plan_id):
+    """Devuelve el plan como dict o lanza PlanNoEncontrado."""
+    plan = conn.execute(
+        f'SELECT {", ".join(COLUMNAS_PLAN)} FROM planes_cuotas WHERE id = ?', (plan_id,)
+    ).fetchone()
+    if plan is None:
+        raise PlanNoEncontrado(f'No existe el plan de cuotas {plan_id}')
+    return dict(plan)
+
+
+def cuotas_del_plan(conn, plan_id):
+    """Devuelve las cuotas registradas del plan, en orden."""
+    filas = conn.execute(
+        'SELECT id, fecha, monto, numero_cuota FROM movimientos WHERE plan_id = ? ORDER BY numero_cuota',
+        (plan_id,)
+    ).fetchall()
+    return [dict(fila) for fila in filas]
+
+
+def actualizar_plan(conn, plan_id, cambios):
+    """Aplica cambios al plan y los propaga a sus cuotas con sentencias sobre todo el plan.
+
+    Los campos copiados y el monto se actualizan con un UPDATE por plan. Si
+    cambian la fecha de inicio o la cantidad de cuotas, el cronograma se
+    vuelve a generar. Lanza ErrorRegistro si el plan resultante es inválido.
+    """
+    plan = obtener_plan(conn, plan_id)
+    if plan['estado'] != 'activo':
+        raise ValueError(f'El plan de cuotas {plan_id} está cancelado')
+
+    registro = {
+        'fecha': cambios.get('fecha', plan['fecha_inicio']),
+        'monto': cambios.get('monto', plan['monto_total']),
+        'cuotas': cambios.get('cuotas', plan['cuotas']),
+    }
+    for campo in CAMPOS_COPIADOS:
+        registro[campo] = cambios.get(campo, plan[campo])
+    fila = esquema.validar(registro)
+    fecha, _, _, _, _, monto_total, detalle, cuotas, _ = fila
+
+    conn.execute('''
+        UPDATE planes_cuotas
+        SET fecha_inicio = ?, tipo = ?, categoria = ?, subcategoria = ?, metodoPago = ?,
+            monto_total = ?, detalle = ?, cuotas = ?
+        WHERE id = ?
+    ''', fila[:8] + (plan_id,))
+
+    dimensiones = Dimensiones(conn)
+    if fecha != plan['fecha_inicio'] or cuotas != plan['cuotas']:
+        conn.execute('DELETE FROM movimientos WHERE plan_id = ?', (plan_id,))
+        conn.executemany(INSERTAR_CUOTA, expandir_plan(plan_id, fila, dimensiones))
+    else:
+        tipo_id, categoria_id, subcategoria_id, metodo_pago_id = dimensiones.codificar([fila])[0][1:5]
+        conn.execute('''
+            UPDATE movimientos
+            SET tipo_id = ?, categoria_id = ?, subcategoria_id = ?, metodo_pago_id = ?, detalle = ?, monto = ?
+            WHERE plan_id = ?
+        ''', (tipo_id, categoria_id, subcategoria_id, metodo_pago_id, detalle, monto_total / cuotas, plan_id))
+    return obtener_plan(conn, plan_id)
+
+
+def cancelar_plan(conn, plan_id, desde=None):
+    """Cancela el plan: borra sus cuotas (desde una fecha, si se indica) y lo marca como cancelado.
+
+    Devuelve la cantidad de cuotas eliminadas.
+    """
+    obtener_plan(conn, plan_id)
+    if desde:
+        cursor = conn.execute('DELETE FROM movimientos WHERE plan_id = ? AND fecha >= ?', (plan_id, desde))
+    else:
+        cursor = conn.execute('DELETE FROM movimientos WHERE plan_id = ?', (plan_id,))
+    conn.execute("UPDATE planes_cuotas SET estado = 'cancelado' WHERE id = ?", (plan_id,))
+    return cursor.rowcount
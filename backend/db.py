@@ -0,0 +1,660 @@
+import os
+import queue
+import sqlite3
+import threading
+
+from dimensiones import TABLAS_DIMENSIONES
+
+# Ruta a la base de datos (se puede sobreescribir con la variable DATOS_DB)
+DB_PATH = os.environ.get('DATOS_DB', os.path.join(os.path.dirname(__file__), 'datos.db'))
+
+# Máximo de conexiones abiertas por proceso (una por hilo de trabajo alcanza)
+POOL_MAX_CONEXIONES = int(os.environ.get('DATOS_DB_POOL', '8'))
+
+# Segundos que espera un pedido por una conexión libre antes de fallar
+POOL_TIMEOUT = float(os.environ.get('DATOS_DB_POOL_TIMEOUT', '10'))
+
+# Instrumentación de consultas y pedidos (METRICAS=1, ver metricas.py); deshabilitada no cuesta nada
+METRICAS_HABILITADAS = os.environ.get('METRICAS') == '1'
+
+# Configuración aplicada una sola vez al abrir cada conexión
+PRAGMAS_CONEXION = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',      # ~16 MB de caché de páginas
+    'PRAGMA mmap_size=268435456',    # 256 MB mapeados en memoria
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+# Movimientos con tipo, categoría, subcategoría y método de pago como ids de las tablas de dimensión
+TABLA_MOVIMIENTOS = '''
+    CREATE TABLE IF NOT EXISTS movimientos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha DATE NOT NULL,
+        tipo_id INTEGER NOT NULL REFERENCES tipos(id),
+        categoria_id INTEGER NOT NULL REFERENCES categorias(id),
+        subcategoria_id INTEGER NOT NULL REFERENCES subcategorias(id),
+        metodo_pago_id INTEGER NOT NULL REFERENCES metodos_pago(id),
+        monto REAL NOT NULL,
+        detalle TEXT,
+        cuotas INTEGER DEFAULT 1,
+        mes TEXT,
+        plan_id INTEGER REFERENCES planes_cuotas(id),
+        numero_cuota INTEGER
+    );
+'''
+
+# Libro de transacciones por cuenta y territorio (transacciones.py)
+TABLA_TRANSACCIONES = '''
+    CREATE TABLE IF NOT EXISTS transacciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha DATE NOT NULL,
+        clave_cuenta TEXT NOT NULL,
+        descripcion TEXT,
+        monto REAL NOT NULL,
+        clave_territorio TEXT
+    );
+'''
+
+# Triggers que calculan mes o dependen de su corrección (la migración 3 los recrea en bases anteriores).
+# La vista calcula mes al escribir y trg_version_bajas_update no cuenta como baja la corrección de
+# trg_datos_mes_insert: una inserción sin mes no obliga al motor en memoria a recargar todo.
+TRIGGERS_MES = '''
+    CREATE TRIGGER IF NOT EXISTS trg_datos_insert INSTEAD OF INSERT ON datos
+    BEGIN
+        INSERT OR IGNORE INTO tipos (nombre) VALUES (NEW.tipo);
+        INSERT OR IGNORE INTO categorias (nombre) VALUES (NEW.categoria);
+        INSERT OR IGNORE INTO subcategorias (nombre) VALUES (NEW.subcategoria);
+        INSERT OR IGNORE INTO metodos_pago (nombre) VALUES (NEW.metodoPago);
+        INSERT INTO movimientos
+        (id, fecha, tipo_id, categoria_id, subcategoria_id, metodo_pago_id, monto, detalle, cuotas, mes, plan_id, numero_cuota)
+        VALUES (
+            NEW.id, NEW.fecha,
+            (SELECT id FROM tipos WHERE nombre = NEW.tipo),
+            (SELECT id FROM categorias WHERE nombre = NEW.categoria),
+            (SELECT id FROM subcategorias WHERE nombre = NEW.subcategoria),
+            (SELECT id FROM metodos_pago WHERE nombre = NEW.metodoPago),
+            NEW.monto, NEW.detalle, IFNULL(NEW.cuotas, 1), strftime('%Y-%m', NEW.fecha), NEW.plan_id, NEW.numero_cuota
+        );
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_datos_update INSTEAD OF UPDATE ON datos
+    BEGIN
+        INSERT OR IGNORE INTO tipos (nombre) VALUES (NEW.tipo);
+        INSERT OR IGNORE INTO categorias (nombre) VALUES (NEW.categoria);
+        INSERT OR IGNORE INTO subcategorias (nombre) VALUES (NEW.subcategoria);
+        INSERT OR IGNORE INTO metodos_pago (nombre) VALUES (NEW.metodoPago);
+        UPDATE movimientos SET
+            fecha = NEW.fecha,
+            tipo_id = (SELECT id FROM tipos WHERE nombre = NEW.tipo),
+            categoria_id = (SELECT id FROM categorias WHERE nombre = NEW.categoria),
+            subcategoria_id = (SELECT id FROM subcategorias WHERE nombre = NEW.subcategoria),
+            metodo_pago_id = (SELECT id FROM metodos_pago WHERE nombre = NEW.metodoPago),
+            monto = NEW.monto, detalle = NEW.detalle, cuotas = NEW.cuotas, mes = strftime('%Y-%m', NEW.fecha),
+            plan_id = NEW.plan_id, numero_cuota = NEW.numero_cuota
+        WHERE id = OLD.id;
+    END;
+
+    -- Un UPDATE que solo cambia mes es la corrección de trg_datos_mes_*: la fila ya se leyó corregida
+    CREATE TRIGGER IF NOT EXISTS trg_version_bajas_update AFTER UPDATE ON movimientos
+    WHEN OLD.mes IS NEW.mes
+        OR OLD.id IS NOT NEW.id OR OLD.fecha IS NOT NEW.fecha OR OLD.tipo_id IS NOT NEW.tipo_id
+        OR OLD.categoria_id IS NOT NEW.categoria_id OR OLD.subcategoria_id IS NOT NEW.subcategoria_id
+        OR OLD.metodo_pago_id IS NOT NEW.metodo_pago_id OR OLD.monto IS NOT NEW.monto
+        OR OLD.detalle IS NOT NEW.detalle OR OLD.cuotas IS NOT NEW.cuotas
+        OR OLD.plan_id IS NOT NEW.plan_id OR OLD.numero_cuota IS NOT NEW.numero_cuota
+    BEGIN
+        UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_bajas';
+    END;
+'''
+
+ESQUEMA = TABLAS_DIMENSIONES + TABLA_MOVIMIENTOS + '''
+    -- Compras en cuotas: el plan se guarda una vez y cada cuota es una fila de movimientos con plan_id
+    CREATE TABLE IF NOT EXISTS planes_cuotas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha_inicio DATE NOT NULL,
+        tipo TEXT NOT NULL,
+        categoria TEXT NOT NULL,
+        subcategoria TEXT NOT NULL,
+        metodoPago TEXT NOT NULL,
+        monto_total REAL NOT NULL,
+        detalle TEXT,
+        cuotas INTEGER NOT NULL,
+        estado TEXT NOT NULL DEFAULT 'activo'
+    );
+
+    -- datos conserva las columnas de texto de siempre: lecturas y respuestas JSON no cambian
+    CREATE VIEW IF NOT EXISTS datos AS
+    SELECT
+        m.id, m.fecha, t.nombre AS tipo, c.nombre AS categoria, s.nombre AS subcategoria,
+        p.nombre AS metodoPago, m.monto, m.detalle, m.cuotas, m.mes, m.plan_id, m.numero_cuota
+    FROM movimientos m
+    JOIN tipos t ON t.id = m.tipo_id
+    JOIN categorias c ON c.id = m.categoria_id
+    JOIN subcategorias s ON s.id = m.subcategoria_id
+    JOIN metodos_pago p ON p.id = m.metodo_pago_id;
+
+    -- Escrituras sobre la vista (las cargas masivas insertan en movimientos directamente).
+    -- trg_datos_insert y trg_datos_update están en TRIGGERS_MES
+    CREATE TRIGGER IF NOT EXISTS trg_datos_delete INSTEAD OF DELETE ON datos
+    BEGIN
+        DELETE FROM movimientos WHERE id = OLD.id;
+    END;
+
+    -- Índices para mejorar el rendimiento
+    CREATE INDEX IF NOT EXISTS idx_fecha ON movimientos(fecha);
+    CREATE INDEX IF NOT EXISTS idx_tipo ON movimientos(tipo_id);
+    CREATE INDEX IF NOT EXISTS idx_categoria ON movimientos(categoria_id);
+
+    -- Solo indexa las filas que pertenecen a un plan: editar o cancelar un plan es una búsqueda por plan_id
+    CREATE INDEX IF NOT EXISTS idx_datos_plan ON movimientos(plan_id, numero_cuota) WHERE plan_id IS NOT NULL;
+
+    -- Índice de cobertura para los desgloses por mes (búsqueda por rango sin leer la tabla)
+    CREATE INDEX IF NOT EXISTS idx_mes_tipo_categoria
+    ON movimientos(mes, tipo_id, categoria_id, subcategoria_id, monto);
+
+    -- mes = strftime('%Y-%m', fecha); los triggers lo corrigen si quien inserta no lo informa
+    CREATE TRIGGER IF NOT EXISTS trg_datos_mes_insert AFTER INSERT ON movimientos
+    WHEN NEW.mes IS NOT strftime('%Y-%m', NEW.fecha)
+    BEGIN
+        UPDATE movimientos SET mes = strftime('%Y-%m', NEW.fecha) WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_datos_mes_update AFTER UPDATE OF fecha, mes ON movimientos
+    WHEN NEW.mes IS NOT strftime('%Y-%m', NEW.fecha)
+    BEGIN
+        UPDATE movimientos SET mes = strftime('%Y-%m', NEW.fecha) WHERE id = NEW.id;
+    END;
+
+    -- Resumen mensual precalculado, mantenido por triggers sobre movimientos
+    CREATE TABLE IF NOT EXISTS resumen_mes (
+        mes TEXT PRIMARY KEY,
+        ingresos REAL NOT NULL DEFAULT 0,
+        egresos REAL NOT NULL DEFAULT 0,
+        gastos_basicos REAL NOT NULL DEFAULT 0,
+        gastos_deseo REAL NOT NULL DEFAULT 0,
+        ahorros REAL NOT NULL DEFAULT 0,
+        movimientos INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_resumen_mes_insert AFTER INSERT ON movimientos
+    BEGIN
+        INSERT INTO resumen_mes (mes, ingresos, egresos, gastos_basicos, gastos_deseo, ahorros, movimientos)
+        VALUES (
+            IFNULL(strftime('%Y-%m', NEW.fecha), ''),
+            CASE WHEN NEW.tipo_id = (SELECT id FROM tipos WHERE nombre = 'Ingreso') THEN NEW.monto ELSE 0 END,
+            CASE WHEN NEW.tipo_id = (SELECT id FROM tipos WHERE nombre = 'Egreso') THEN NEW.monto ELSE 0 END,
+            CASE WHEN NEW.categoria_id = (SELECT id FROM categorias WHERE nombre = 'Gastos basicos') THEN NEW.monto ELSE 0 END,
+            CASE WHEN NEW.categoria_id = (SELECT id FROM categorias WHERE nombre = 'Gastos deseo') THEN NEW.monto ELSE 0 END,
+            CASE WHEN NEW.categoria_id IN (SELECT id FROM categorias WHERE nombre IN ('Ahorros', 'Inversiones')) THEN NEW.monto ELSE 0 END,
+            1
+        )
+        ON CONFLICT(mes) DO UPDATE SET
+            ingresos = ingresos + excluded.ingresos,
+            egresos = egresos + excluded.egresos,
+            gastos_basicos = gastos_basicos + excluded.gastos_basicos,
+            gastos_deseo = gastos_deseo + excluded.gastos_deseo,
+            ahorros = ahorros + excluded.ahorros,
+            movimientos = movimientos + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_resumen_mes_delete AFTER DELETE ON movimientos
+    BEGIN
+        UPDATE resumen_mes SET
+            ingresos = ingresos - CASE WHEN OLD.tipo_id = (SELECT id FROM tipos WHERE nombre = 'Ingreso') THEN OLD.monto ELSE 0 END,
+            egresos = egresos - CASE WHEN OLD.tipo_id = (SELECT id FROM tipos WHERE nombre = 'Egreso') THEN OLD.monto ELSE 0 END,
+            gastos_basicos = gastos_basicos - CASE WHEN OLD.categoria_id = (SELECT id FROM categorias WHERE nombre = 'Gastos basicos') THEN OLD.monto ELSE 0 END,
+            gastos_deseo = gastos_deseo - CASE WHEN OLD.categoria_id = (SELECT id FROM categorias WHERE nombre = 'Gastos deseo') THEN OLD.monto ELSE 0 END,
+            ahorros = ahorros - CASE WHEN OLD.categoria_id IN (SELECT id FROM categorias WHERE nombre IN ('Ahorros', 'Inversiones')) THEN OLD.monto ELSE 0 END,
+            movimientos = movimientos - 1
+        WHERE mes = IFNULL(strftime('%Y-%m', OLD.fecha), '');
+        DELETE FROM resumen_mes WHERE mes = IFNULL(strftime('%Y-%m', OLD.fecha), '') AND movimientos <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_resumen_mes_update AFTER UPDATE OF fecha, tipo_id, categoria_id, monto ON movimientos
+    BEGIN
+        UPDATE resumen_mes SET
+            ingresos = ingresos - CASE WHEN OLD.tipo_id = (SELECT id FROM tipos WHERE nombre = 'Ingreso') THEN OLD.monto ELSE 0 END,
+            egresos = egresos - CASE WHEN OLD.tipo_id = (SELECT id FROM tipos WHERE nombre = 'Egreso') THEN OLD.monto ELSE 0 END,
+            gastos_basicos = gastos_basicos - CASE WHEN OLD.categoria_id = (SELECT id FROM categorias WHERE nombre = 'Gastos basicos') THEN OLD.monto ELSE 0 END,
+            gastos_deseo = gastos_deseo - CASE WHEN OLD.categoria_id = (SELECT id FROM categorias WHERE nombre = 'Gastos deseo') THEN OLD.monto ELSE 0 END,
+            ahorros = ahorros - CASE WHEN OLD.categoria_id IN (SELECT id FROM categorias WHERE nombre IN ('Ahorros', 'Inversiones')) THEN OLD.monto ELSE 0 END,
+            movimientos = movimientos - 1
+        WHERE mes = IFNULL(strftime('%Y-%m', OLD.fecha), '');
+        DELETE FROM resumen_mes WHERE mes = IFNULL(strftime('%Y-%m', OLD.fecha), '') AND movimientos <= 0;
+
+        INSERT INTO resumen_mes (mes, ingresos, egresos, gastos_basicos, gastos_deseo, ahorros, movimientos)
+        VALUES (
+            IFNULL(strftime('%Y-%m', NEW.fecha), ''),
+            CASE WHEN NEW.tipo_id = (SELECT id FROM tipos WHERE nombre = 'Ingreso') THEN NEW.monto ELSE 0 END,
+            CASE WHEN NEW.tipo_id = (SELECT id FROM tipos WHERE nombre = 'Egreso') THEN NEW.monto ELSE 0 END,
+            CASE WHEN NEW.categoria_id = (SELECT id FROM categorias WHERE nombre = 'Gastos basicos') THEN NEW.monto ELSE 0 END,
+            CASE WHEN NEW.categoria_id = (SELECT id FROM categorias WHERE nombre = 'Gastos deseo') THEN NEW.monto ELSE 0 END,
+            CASE WHEN NEW.categoria_id IN (SELECT id FROM categorias WHERE nombre IN ('Ahorros', 'Inversiones')) THEN NEW.monto ELSE 0 END,
+            1
+        )
+        ON CONFLICT(mes) DO UPDATE SET
+            ingresos = ingresos + excluded.ingresos,
+            egresos = egresos + excluded.egresos,
+            gastos_basicos = gastos_basicos + excluded.gastos_basicos,
+            gastos_deseo = gastos_deseo + excluded.gastos_deseo,
+            ahorros = ahorros + excluded.ahorros,
+            movimientos = movimientos + 1;
+    END;
+
+    -- Versión de los datos: sube con cada fila escrita, en cualquier proceso.
+    -- Invalida las respuestas cacheadas de los endpoints de lectura.
+    CREATE TABLE IF NOT EXISTS metadatos (
+        clave TEXT PRIMARY KEY,
+        valor INTEGER NOT NULL
+    ) WITHOUT ROWID;
+
+    INSERT OR IGNORE INTO metadatos (clave, valor) VALUES ('version_datos', 0);
+
+    CREATE TRIGGER IF NOT EXISTS trg_version_datos_insert AFTER INSERT ON movimientos
+    BEGIN
+        UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_datos';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_version_datos_update AFTER UPDATE ON movimientos
+    BEGIN
+        UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_datos';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_version_datos_delete AFTER DELETE ON movimientos
+    BEGIN
+        UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_datos';
+    END;
+
+    -- Sube solo con updates y deletes: si no cambió, alcanza con leer las filas nuevas (analitica.py)
+    INSERT OR IGNORE INTO metadatos (clave, valor) VALUES ('version_bajas', 0);
+
+    -- trg_version_bajas_update está en TRIGGERS_MES
+    CREATE TRIGGER IF NOT EXISTS trg_version_bajas_delete AFTER DELETE ON movimientos
+    BEGIN
+        UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_bajas';
+    END;
+
+''' + TABLA_TRANSACCIONES + '''
+    -- Listado paginado por (fecha, id) y días sueltos de los totales por rango de fechas.
+    -- Los tres índices cubren las columnas de los totales: no leen la tabla.
+    CREATE INDEX IF NOT EXISTS idx_transacciones_fecha
+    ON transacciones(fecha, clave_cuenta, clave_territorio, monto);
+    CREATE INDEX IF NOT EXISTS idx_transacciones_cuenta
+    ON transacciones(clave_cuenta, fecha, clave_territorio, monto);
+    CREATE INDEX IF NOT EXISTS idx_transacciones_territorio
+    ON transacciones(clave_territorio, fecha, monto);
+
+    CREATE TRIGGER IF NOT EXISTS trg_version_transacciones_insert AFTER INSERT ON transacciones
+    BEGIN
+        UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_datos';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_version_transacciones_update AFTER UPDATE ON transacciones
+    BEGIN
+        UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_datos';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_version_transacciones_delete AFTER DELETE ON transacciones
+    BEGIN
+        UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_datos';
+    END;
+
+    -- Totales del libro por cuenta, territorio ('' si no tiene) y mes, mantenidos por triggers.
+    -- La clave empieza por la cuenta: agrupar o filtrar por cuenta sigue su orden sin ordenar.
+    CREATE TABLE IF NOT EXISTS resumen_transacciones (
+        clave_cuenta TEXT NOT NULL,
+        clave_territorio TEXT NOT NULL,
+        mes TEXT NOT NULL,
+        total REAL NOT NULL DEFAULT 0,
+        cantidad INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (clave_cuenta, clave_territorio, mes)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_resumen_transacciones_insert AFTER INSERT ON transacciones
+    BEGIN
+        INSERT INTO resumen_transacciones (mes, clave_cuenta, clave_territorio, total, cantidad)
+        VALUES (substr(NEW.fecha, 1, 7), NEW.clave_cuenta, IFNULL(NEW.clave_territorio, ''), NEW.monto, 1)
+        ON CONFLICT(clave_cuenta, clave_territorio, mes) DO UPDATE SET
+            total = total + excluded.total,
+            cantidad = cantidad + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_resumen_transacciones_delete AFTER DELETE ON transacciones
+    BEGIN
+        UPDATE resumen_transacciones SET total = total - OLD.monto, cantidad = cantidad - 1
+        WHERE mes = substr(OLD.fecha, 1, 7) AND clave_cuenta = OLD.clave_cuenta
+          AND clave_territorio = IFNULL(OLD.clave_territorio, '');
+        DELETE FROM resumen_transacciones
+        WHERE mes = substr(OLD.fecha, 1, 7) AND clave_cuenta = OLD.clave_cuenta
+          AND clave_territorio = IFNULL(OLD.clave_territorio, '') AND cantidad <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_resumen_transacciones_update
+    AFTER UPDATE OF fecha, clave_cuenta, clave_territorio, monto ON transacciones
+    BEGIN
+        UPDATE resumen_transacciones SET total = total - OLD.monto, cantidad = cantidad - 1
+        WHERE mes = substr(OLD.fecha, 1, 7) AND clave_cuenta = OLD.clave_cuenta
+          AND clave_territorio = IFNULL(OLD.clave_territorio, '');
+        DELETE FROM resumen_transacciones
+        WHERE mes = substr(OLD.fecha, 1, 7) AND clave_cuenta = OLD.clave_cuenta
+          AND clave_territorio = IFNULL(OLD.clave_territorio, '') AND cantidad <= 0;
+        INSERT INTO resumen_transacciones (mes, clave_cuenta, clave_territorio, total, cantidad)
+        VALUES (substr(NEW.fecha, 1, 7), NEW.clave_cuenta, IFNULL(NEW.clave_territorio, ''), NEW.monto, 1)
+        ON CONFLICT(clave_cuenta, clave_territorio, mes) DO UPDATE SET
+            total = total + excluded.total,
+            cantidad = cantidad + 1;
+    END;
+
+    -- Índice de texto completo sobre detalle (busqueda.py). El texto no se duplica:
+    -- se lee de movimientos y los triggers mantienen el índice al día.
+    CREATE VIRTUAL TABLE IF NOT EXISTS movimientos_fts USING fts5(
+        detalle,
+        content='movimientos',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_insert AFTER INSERT ON movimientos
+    BEGIN
+        INSERT INTO movimientos_fts (rowid, detalle) VALUES (NEW.id, NEW.detalle);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_delete AFTER DELETE ON movimientos
+    BEGIN
+        INSERT INTO movimientos_fts (movimientos_fts, rowid, detalle) VALUES ('delete', OLD.id, OLD.detalle);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_update AFTER UPDATE OF detalle ON movimientos
+    BEGIN
+        INSERT INTO movimientos_fts (movimientos_fts, rowid, detalle) VALUES ('delete', OLD.id, OLD.detalle);
+        INSERT INTO movimientos_fts (rowid, detalle) VALUES (NEW.id, NEW.detalle);
+    END;
+''' + TRIGGERS_MES
+
+# Seguimiento de cambios (GET /api/datos/cambios, migración 2). Cada movimiento tiene la
+# revisión de su último alta o cambio; las bajas quedan como lápidas (eliminado = 1). La
+# revisión vive en una tabla aparte: escribirla en movimientos dispararía sus triggers de UPDATE.
+TABLA_REVISIONES = '''
+    CREATE TABLE IF NOT EXISTS revisiones_movimientos (
+        id INTEGER PRIMARY KEY,
+        revision INTEGER NOT NULL,
+        eliminado INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_revisiones_movimientos_revision ON revisiones_movimientos (revision);
+
+    CREATE TRIGGER IF NOT EXISTS trg_revisiones_insert AFTER INSERT ON movimientos
+    BEGIN
+        INSERT OR REPLACE INTO revisiones_movimientos (id, revision, eliminado)
+        VALUES (NEW.id, (SELECT IFNULL(MAX(revision), 0) + 1 FROM revisiones_movimientos), 0);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_revisiones_update AFTER UPDATE ON movimientos
+    BEGIN
+        INSERT OR REPLACE INTO revisiones_movimientos (id, revision, eliminado)
+        SELECT OLD.id, (SELECT IFNULL(MAX(revision), 0) + 1 FROM revisiones_movimientos), 1
+        WHERE OLD.id <> NEW.id;
+        INSERT OR REPLACE INTO revisiones_movimientos (id, revision, eliminado)
+        VALUES (NEW.id, (SELECT IFNULL(MAX(revision), 0) + 1 FROM revisiones_movimientos), 0);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_revisiones_delete AFTER DELETE ON movimientos
+    BEGIN
+        INSERT OR REPLACE INTO revisiones_movimientos (id, revision, eliminado)
+        VALUES (OLD.id, (SELECT IFNULL(MAX(revision), 0) + 1 FROM revisiones_movimientos), 1);
+    END;
+'''
+
+# Numera a continuación de la última revisión los movimientos con id mayor al indicado (0: todos)
+NUMERAR_REVISIONES = '''
+    INSERT OR REPLACE INTO revisiones_movimientos (id, revision, eliminado)
+    SELECT id, (SELECT IFNULL(MAX(revision), 0) FROM revisiones_movimientos) + ROW_NUMBER() OVER (ORDER BY id), 0
+    FROM movimientos
+    WHERE id > ?
+'''
+
+RECONSTRUIR_RESUMEN_MES = '''
+    INSERT INTO resumen_mes (mes, ingresos, egresos, gastos_basicos, gastos_deseo, ahorros, movimientos)
+    SELECT
+        IFNULL(strftime('%Y-%m', fecha), '') AS mes,
+        SUM(CASE WHEN tipo = 'Ingreso' THEN monto ELSE 0 END),
+        SUM(CASE WHEN tipo = 'Egreso' THEN monto ELSE 0 END),
+        SUM(CASE WHEN categoria = 'Gastos basicos' THEN monto ELSE 0 END),
+        SUM(CASE WHEN categoria = 'Gastos deseo' THEN monto ELSE 0 END),
+        SUM(CASE WHEN categoria IN ('Ahorros', 'Inversiones') THEN monto ELSE 0 END),
+        COUNT(*)
+    FROM datos
+    GROUP BY 1
+'''
+
+# Suma al resumen del libro las transacciones con id mayor al indicado (0: todas)
+ACUMULAR_RESUMEN_TRANSACCIONES = '''
+    INSERT INTO resumen_transacciones (mes, clave_cuenta, clave_territorio, total, cantidad)
+    SELECT substr(fecha, 1, 7), clave_cuenta, IFNULL(clave_territorio, ''), SUM(monto), COUNT(*)
+    FROM transacciones
+    WHERE id > ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT(clave_cuenta, clave_territorio, mes) DO UPDATE SET
+        total = total + excluded.total,
+        cantidad = cantidad + excluded.cantidad
+'''
+
+
+def conectar(ruta=None):
+    """Abre una conexión configurada con los PRAGMAs de rendimiento."""
+    fabrica = sqlite3.Connection
+    if METRICAS_HABILITADAS:
+        from metricas import ConexionMedida
+
+        fabrica = ConexionMedida
+    conn = sqlite3.connect(ruta or DB_PATH, timeout=POOL_TIMEOUT, check_same_thread=False, factory=fabrica)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS_CONEXION:
+        conn.execute(pragma)
+    return conn
+
+
+def verificar_planes(conn, consultas):
+    """Devuelve las consultas cuyo plan recorre por completo una tabla o índice."""
+    problemas = {}
+    for nombre, (sql, parametros) in consultas.items():
+        plan = [fila[3] for fila in conn.execute('EXPLAIN QUERY PLAN ' + sql, parametros)]
+        # Recorrer el resultado ya agregado de una subconsulta (MATERIALIZE a ... SCAN a) no es un problema
+        subconsultas = {paso.split()[1] for paso in plan if paso.startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+        if any(paso.startswith('SCAN') and paso.split()[1] not in subconsultas for paso in plan):
+            problemas[nombre] = plan
+    return problemas
+
+
+def version_datos(conn):
+    """Devuelve la versión actual de los datos (crece con cada escritura)."""
+    return conn.execute("SELECT valor FROM metadatos WHERE clave = 'version_datos'").fetchone()[0]
+
+
+def reconstruir_resumen_mes(conn):
+    """Recalcula por completo la tabla resumen_mes a partir de datos."""
+    conn.execute('DELETE FROM resumen_mes')
+    conn.execute(RECONSTRUIR_RESUMEN_MES)
+    return conn.execute('SELECT COUNT(*) FROM resumen_mes').fetchone()[0]
+
+
+def reconstruir_resumen_transacciones(conn):
+    """Recalcula por completo la tabla resumen_transacciones a partir de transacciones."""
+    conn.execute('DELETE FROM resumen_transacciones')
+    conn.execute(ACUMULAR_RESUMEN_TRANSACCIONES, (0,))
+    return conn.execute('SELECT COUNT(*) FROM resumen_transacciones').fetchone()[0]
+
+
+def numerar_revisiones(conn, desde_id=0):
+    """Asigna revisiones nuevas a los movimientos con id mayor a desde_id (cargados sin trigger)."""
+    return conn.execute(NUMERAR_REVISIONES, (desde_id,)).rowcount
+
+
+def reconstruir_busqueda(conn):
+    """Vuelve a indexar el detalle de todos los movimientos en movimientos_fts."""
+    conn.execute("INSERT INTO movimientos_fts (movimientos_fts) VALUES ('rebuild')")
+    # Deja el índice en un único segmento: las búsquedas no combinan varios
+    conn.execute("INSERT INTO movimientos_fts (movimientos_fts) VALUES ('optimize')")
+    return conn.execute('SELECT COUNT(*) FROM movimientos').fetchone()[0]
+
+
+class PoolConexiones:
+    """Pool de conexiones SQLite reutilizables, compartido por los hilos de un proceso."""
+
+    def __init__(self, ruta=None, max_conexiones=POOL_MAX_CONEXIONES, timeout=POOL_TIMEOUT):
+        self.ruta = ruta or DB_PATH
+        self.max_conexiones = max_conexiones
+        self.timeout = timeout
+        self._libres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._abiertas = 0
+        self._en_uso = 0
+        self._hits = 0
+        self._creadas = 0
+        self._esperas = 0
+        self._timeouts = 0
+
+    def _reiniciar_si_fork(self):
+        # Tras un fork (workers de gunicorn) las conexiones heredadas no se pueden usar
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._libres = queue.LifoQueue()
+                    self._pid = os.getpid()
+                    self._abiertas = self._en_uso = 0
+
+    def obtener(self):
+        """Entrega una conexión libre, abre una nueva o espera a que se libere alguna."""
+        self._reiniciar_si_fork()
+        try:
+            conn = self._libres.get_nowait()
+            with self._lock:
+                self._hits += 1
+                self._en_uso += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            crear = self._abiertas < self.max_conexiones
+            if crear:
+                self._abiertas += 1
+                self._creadas += 1
+            else:
+                self._esperas += 1
+
+        if crear:
+            try:
+                conn = conectar(self.ruta)
+            except Exception:
+                with self._lock:
+                    self._abiertas -= 1
+                raise
+        else:
+            try:
+                conn = self._libres.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._timeouts += 1
+                raise TimeoutError('No hay conexiones libres en el pool de la base de datos')
+
+        with self._lock:
+            self._en_uso += 1
+        return conn
+
+    def devolver(self, conn):
+        """Devuelve una conexión al pool, descartando cualquier transacción pendiente."""
+        with self._lock:
+            self._en_uso -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Conexión inutilizable: se cierra y deja lugar para otra
+            with self._lock:
+                self._abiertas -= 1
+            conn.close()
+            return
+        self._libres.put(conn)
+
+    def cerrar(self):
+        """Cierra todas las conexiones libres."""
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._abiertas -= 1
+
+    def estadisticas(self):
+        """Devuelve contadores de uso del pool."""
+        with self._lock:
+            return {
+                'pid': self._pid,
+                'max_conexiones': self.max_conexiones,
+                'abiertas': self._abiertas,
+                'en_uso': self._en_uso,
+                'libres': self._libres.qsize(),
+                'hits': self._hits,
+                'creadas': self._creadas,
+                'esperas': self._esperas,
+                'timeouts': self._timeouts,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """Devuelve el pool del proceso, creándolo la primera vez."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolConexiones()
+    return _pool
+
+
+if __name__ == '__main__':
+    import sys
+
+    comandos = ('inicializar', 'reconstruir-resumen', 'reconstruir-busqueda', 'verificar-planes')
+    if len(sys.argv) != 2 or sys.argv[1] not in comandos:
+        print(f"Uso: python db.py <{'|'.join(comandos)}>")
+        sys.exit(1)
+
+    from migraciones import migrar
+
+    migrar()
+    if sys.argv[1] == 'reconstruir-resumen':
+        conn = sqlite3.connect(DB_PATH)
+        with conn:
+            meses = reconstruir_resumen_mes(conn)
+            grupos = reconstruir_resumen_transacciones(conn)
+        conn.close()
+        print(f"Resumen mensual reconstruido: {meses} meses")
+        print(f"Resumen de transacciones reconstruido: {grupos} filas (cuenta, territorio, mes)")
+    elif sys.argv[1] == 'reconstruir-busqueda':
+        conn = sqlite3.connect(DB_PATH)
+        with conn:
+            filas = reconstruir_busqueda(conn)
+        conn.close()
+        print(f"Índice de búsqueda reconstruido: {filas} movimientos")
+    elif sys.argv[1] == 'verificar-planes':
+        from consultas import CONSULTAS_INDEXADAS
+
+        conn = sqlite3.connect(DB_PATH)
+        problemas = verificar_planes(conn, CONSULTAS_INDEXADAS)
+        conn.close()
+        for nombre, plan in problemas.items():
+            print(f"Recorrido completo en {nombre}: {' | '.join(plan)}")
+        if problemas:
+            sys.exit(1)
+        print(f"Planes correctos: {len(CONSULTAS_INDEXADAS)} consultas usan índices")
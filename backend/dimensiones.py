@@ -0,0 +1,77 @@
+from parametros import PARAMETROS
+
+# (tabla de dimensión, columna de texto en la vista datos, columna entera en movimientos)
+DIMENSIONES = (
+    ('tipos', 'tipo', 'tipo_id'),
+    ('categorias', 'categoria', 'categoria_id'),
+    ('subcategorias', 'subcategoria', 'subcategoria_id'),
+    ('metodos_pago', 'metodoPago', 'metodo_pago_id'),
+)
+
+# Valores iniciales de cada dimensión, en el orden de PARAMETROS
+VALORES_INICIALES = {
+    'tipos': PARAMETROS['tipos'],
+    'categorias': PARAMETROS['categorias'],
+    'subcategorias': list(dict.fromkeys(
+        subcategoria for subcategorias in PARAMETROS['subcategorias'].values() for subcategoria in subcategorias
+    )),
+    'metodos_pago': PARAMETROS['cuentas'],
+}
+
+TABLAS_DIMENSIONES = ''.join(f'''
+    CREATE TABLE IF NOT EXISTS {tabla} (
+        id INTEGER PRIMARY KEY,
+        nombre TEXT NOT NULL UNIQUE
+    );
+''' for tabla, _, _ in DIMENSIONES)
+
+INSERTAR_MOVIMIENTO = '''
+    INSERT INTO movimientos
+    (fecha, tipo_id, categoria_id, subcategoria_id, metodo_pago_id, monto, detalle, cuotas, mes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def sembrar_dimensiones(conn):
+    """Carga los valores de PARAMETROS en las tablas de dimensión (los existentes conservan su id)."""
+    for tabla, valores in VALORES_INICIALES.items():
+        conn.executemany(f'INSERT OR IGNORE INTO {tabla} (nombre) VALUES (?)', ((v,) for v in valores))
+
+
+class Dimensiones:
+    """Traduce los textos de tipo, categoría, subcategoría y método de pago a sus ids.
+
+    Los mapas se leen de la base al crear el objeto; un valor desconocido se
+    agrega a su tabla de dimensión la primera vez que aparece.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.ids = {
+            tabla: {fila[0]: fila[1] for fila in conn.execute(f'SELECT nombre, id FROM {tabla}')}
+            for tabla, _, _ in DIMENSIONES
+        }
+
+    def id(self, tabla, nombre):
+        """Devuelve el id de nombre en la dimensión, creándolo si no existe."""
+        ids = self.ids[tabla]
+        if nombre not in ids:
+            self.conn.execute(f'INSERT OR IGNORE INTO {tabla} (nombre) VALUES (?)', (nombre,))
+            ids[nombre] = self.conn.execute(f'SELECT id FROM {tabla} WHERE nombre = ?', (nombre,)).fetchone()[0]
+        return ids[nombre]
+
+    def codificar(self, filas):
+        """Convierte filas validadas (orden de COLUMNAS_INSERCION) en filas para INSERTAR_MOVIMIENTO."""
+        tipos, categorias, subcategorias, metodos = (self.ids[tabla] for tabla, _, _ in DIMENSIONES)
+        try:
+            return [
+                (f[0], tipos[f[1]], categorias[f[2]], subcategorias[f[3]], metodos[f[4]]) + tuple(f[5:])
+                for f in filas
+            ]
+        except KeyError:
+            # Algún valor nuevo: se registra y se reintenta por el camino lento
+            return [
+                (f[0], self.id('tipos', f[1]), self.id('categorias', f[2]),
+                 self.id('subcategorias', f[3]), self.id('metodos_pago', f[4])) + tuple(f[5:])
+                for f in filas
+            ]
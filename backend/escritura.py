@@ -0,0 +1,196 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as TimeoutFuturo
+
+from db import DB_PATH, conectar
+
+# Máximo de escrituras confirmadas en una misma transacción
+ESCRITURA_LOTE_MAX = int(os.environ.get('DATOS_DB_ESCRITURA_LOTE', '64'))
+
+# Milisegundos que el escritor sigue juntando escrituras cuando hay concurrencia (0: solo las ya encoladas)
+ESCRITURA_ESPERA_MS = float(os.environ.get('DATOS_DB_ESCRITURA_ESPERA_MS', '2'))
+
+# Segundos que un pedido espera a que el escritor tome su escritura antes de fallar
+ESCRITURA_TIMEOUT = float(os.environ.get('DATOS_DB_ESCRITURA_TIMEOUT', '30'))
+
+
+class EscritorAgrupado:
+    """Hilo escritor único por proceso que confirma las escrituras pendientes en lotes (group commit).
+
+    Cada operación es una función que recibe la conexión del escritor y no
+    confirma por su cuenta. Las operaciones de un lote corren en una sola
+    transacción, cada una dentro de un SAVEPOINT: si una falla solo se deshace
+    la suya y su pedido recibe la excepción; el resto se confirma con un único
+    COMMIT. Las operaciones propias (cargas grandes) manejan su transacción y
+    se ejecutan solas, entre lotes.
+    """
+
+    def __init__(self, ruta=None, lote_max=ESCRITURA_LOTE_MAX, espera_ms=ESCRITURA_ESPERA_MS,
+                 timeout=ESCRITURA_TIMEOUT):
+        self.ruta = ruta or DB_PATH
+        self.lote_max = max(1, lote_max)
+        self.espera = max(0.0, espera_ms) / 1000
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pendientes = None
+        self._lotes = 0
+        self._operaciones = 0
+        self._propias = 0
+        self._mayor_lote = 0
+        self._fallidas = 0
+        self._commits_fallidos = 0
+
+    def _iniciar(self):
+        # El hilo no sobrevive a un fork (workers de gunicorn): cada proceso arranca el suyo
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pendientes = queue.Queue()
+                    self._pid = os.getpid()
+                    threading.Thread(target=self._bucle, args=(self._pendientes,),
+                                     name='escritor-agrupado', daemon=True).start()
+        return self._pendientes
+
+    def ejecutar(self, operacion, propia=False):
+        """Encola operacion(conn) y devuelve su resultado cuando está confirmado, o relanza su excepción.
+
+        Si el escritor no la toma dentro del timeout se cancela y lanza TimeoutError.
+        """
+        futuro = Future()
+        self._iniciar().put((operacion, propia, futuro))
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutFuturo:
+            if futuro.cancel():
+                raise TimeoutError('El escritor de la base de datos no respondió a tiempo') from None
+            # Ya está en curso: se espera su resultado para no informar un error falso
+            return futuro.result()
+
+    def _bucle(self, pendientes):
+        conn = None
+        siguiente = None
+        while True:
+            operacion = siguiente or pendientes.get()
+            siguiente = None
+            lote = [operacion]
+            limite = time.monotonic() + self.espera
+            while not lote[0][1] and len(lote) < self.lote_max:
+                # Solo se espera si ya hay otros escritores: un pedido aislado se confirma sin demora
+                restante = limite - time.monotonic() if len(lote) > 1 else 0
+                try:
+                    operacion = pendientes.get(timeout=restante) if restante > 0 else pendientes.get_nowait()
+                except queue.Empty:
+                    break
+                if operacion[1]:
+                    # Una carga propia cierra el lote y corre después de él
+                    siguiente = operacion
+                    break
+                lote.append(operacion)
+
+            if conn is None:
+                try:
+                    conn = conectar(self.ruta)
+                except Exception as e:
+                    # Ruta sin permisos, archivo bloqueado o error de E/S: el hilo sigue vivo, el lote
+                    # recibe el error y la conexión se vuelve a intentar con el próximo
+                    self._fallar(lote, e)
+                    continue
+            if lote[0][1]:
+                self._ejecutar_propia(conn, lote[0])
+            else:
+                self._confirmar_lote(conn, lote)
+
+    def _fallar(self, lote, error):
+        activas = [futuro for _, _, futuro in lote if futuro.set_running_or_notify_cancel()]
+        for futuro in activas:
+            futuro.set_exception(error)
+        with self._lock:
+            self._fallidas += len(activas)
+
+    def _ejecutar_propia(self, conn, operacion):
+        funcion, _, futuro = operacion
+        if not futuro.set_running_or_notify_cancel():
+            return
+        try:
+            futuro.set_result(funcion(conn))
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            futuro.set_exception(e)
+        with self._lock:
+            self._propias += 1
+
+    def _confirmar_lote(self, conn, lote):
+        activas = [(funcion, futuro) for funcion, _, futuro in lote if futuro.set_running_or_notify_cancel()]
+        if not activas:
+            return
+        resultados = []
+        fallidas = 0
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for funcion, futuro in activas:
+                conn.execute('SAVEPOINT escritura')
+                try:
+                    resultado = funcion(conn)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO escritura')
+                    conn.execute('RELEASE escritura')
+                    futuro.set_exception(e)
+                    fallidas += 1
+                    continue
+                conn.execute('RELEASE escritura')
+                resultados.append((futuro, resultado))
+            conn.commit()
+        except BaseException as e:
+            # Sin transacción (base bloqueada) o COMMIT fallido: ninguna escritura del lote quedó guardada
+            if conn.in_transaction:
+                conn.rollback()
+            for _, futuro in activas:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            with self._lock:
+                self._commits_fallidos += 1
+                self._fallidas += len(activas)
+            return
+
+        for futuro, resultado in resultados:
+            futuro.set_result(resultado)
+        with self._lock:
+            self._lotes += 1
+            self._operaciones += len(activas)
+            self._mayor_lote = max(self._mayor_lote, len(activas))
+            self._fallidas += fallidas
+
+    def estadisticas(self):
+        """Devuelve contadores de lotes y operaciones del escritor de este proceso."""
+        with self._lock:
+            return {
+                'pid': self._pid,
+                'lote_max': self.lote_max,
+                'espera_ms': self.espera * 1000,
+                'pendientes': self._pendientes.qsize() if self._pendientes else 0,
+                'lotes': self._lotes,
+                'operaciones': self._operaciones,
+                'promedio_por_lote': round(self._operaciones / self._lotes, 2) if self._lotes else 0,
+                'mayor_lote': self._mayor_lote,
+                'cargas_propias': self._propias,
+                'fallidas': self._fallidas,
+                'commits_fallidos': self._commits_fallidos,
+            }
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+
+def obtener_escritor():
+    """Devuelve el escritor del proceso, creándolo la primera vez."""
+    global _escritor
+    if _escritor is None:
+        with _escritor_lock:
+            if _escritor is None:
+                _escritor = EscritorAgrupado()
+    return _escritor
@@ -0,0 +1,107 @@
+import csv
+from io import BytesIO, StringIO
+
+from paginacion import COLUMNAS_DATOS
+
+# Filas leídas del cursor por cada fetchmany
+TAMANO_LOTE = 2000
+
+FORMATOS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Parámetro de la query string -> condición SQL
+FILTROS = {
+    'fecha_inicio': 'fecha >= ?',
+    'fecha_fin': 'fecha <= ?',
+    'tipo': 'tipo = ?',
+    'categoria': 'categoria = ?',
+    'subcategoria': 'subcategoria = ?',
+    'metodoPago': 'metodoPago = ?',
+}
+
+
+class FormatoNoDisponible(RuntimeError):
+    """El formato pedido requiere una dependencia opcional que no está instalada."""
+
+
+def consulta_exportacion(args):
+    """Arma el SELECT de exportación con los filtros de la query string aplicados en SQL."""
+    condiciones = []
+    valores = []
+    for parametro, condicion in FILTROS.items():
+        valor = args.get(parametro)
+        if valor:
+            condiciones.append(condicion)
+            valores.append(valor)
+
+    sql = f'SELECT {", ".join(COLUMNAS_DATOS)} FROM datos'
+    if condiciones:
+        sql += ' WHERE ' + ' AND '.join(condiciones)
+    return sql + ' ORDER BY fecha, id', valores
+
+
+def _lotes(cursor):
+    while True:
+        filas = cursor.fetchmany(TAMANO_LOTE)
+        if not filas:
+            return
+        yield filas
+
+
+def generar_csv(cursor):
+    """Produce el CSV de a un lote de filas por vez."""
+    buffer = StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS_DATOS)
+    for filas in _lotes(cursor):
+        escritor.writerows(filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def libro_xlsx(cursor):
+    """Escribe las filas en un libro de openpyxl en modo write-only, en memoria."""
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Registros')
+    hoja.append(COLUMNAS_DATOS)
+    for filas in _lotes(cursor):
+        for fila in filas:
+            hoja.append(tuple(fila))
+    salida = BytesIO()
+    libro.save(salida)
+    salida.seek(0)
+    return salida
+
+
+def archivo_parquet(cursor):
+    """Escribe las filas en Parquet por grupos de filas. Requiere pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise FormatoNoDisponible('El formato parquet requiere instalar pyarrow')
+
+    esquema = pa.schema([
+        ('id', pa.int64()), ('fecha', pa.string()), ('tipo', pa.string()),
+        ('categoria', pa.string()), ('subcategoria', pa.string()), ('metodoPago', pa.string()),
+        ('monto', pa.float64()), ('detalle', pa.string()), ('cuotas', pa.int64()),
+        ('plan_id', pa.int64()), ('numero_cuota', pa.int64()),
+    ])
+    salida = BytesIO()
+    with pq.ParquetWriter(salida, esquema) as escritor:
+        for filas in _lotes(cursor):
+            columnas = list(zip(*filas))
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, esquema)],
+                schema=esquema,
+            ))
+    salida.seek(0)
+    return salida
@@ -0,0 +1,298 @@
+import csv
+import json
+import os
+import random
+from datetime import date, timedelta
+from itertools import islice
+
+from cuotas import INSERTAR_CUOTA, INSERTAR_PLAN, expandir_plan
+from dimensiones import INSERTAR_MOVIMIENTO, Dimensiones
+from parametros import PARAMETROS
+from validacion import COLUMNAS_INSERCION
+
+# Con la misma semilla y cantidad de filas se genera siempre el mismo libro
+SEMILLA = 42
+ANIOS = 5
+
+# Fecha fija (no hoy) para que el libro no cambie según el día en que se genera
+FIN = date(2024, 12, 31)
+
+# Peso relativo de cada (tipo, categoría) entre los movimientos que no son el sueldo
+PESOS_CATEGORIAS = {
+    ('Egreso', 'Gastos basicos'): 50,
+    ('Egreso', 'Gastos deseo'): 28,
+    ('Egreso', 'Ahorros'): 7,
+    ('Egreso', 'Inversiones'): 5,
+    ('Ingreso', 'Ingresos'): 4,
+}
+
+# Monto típico de cada subcategoría al inicio del período (se le aplica dispersión e inflación)
+MONTOS = {
+    'Supermercado': 85, 'Servicios': 60, 'Transporte': 12, 'Salud': 45, 'Educacion': 120, 'Vivienda': 450,
+    'Entretenimiento': 30, 'Delivery': 22, 'Ropa': 70, 'Deuda': 150,
+    'Acciones': 300, 'Bonos': 250, 'Crypto': 100, 'Cuenta': 200, 'Plazo Fijo': 500,
+    'Sueldo Empresa': 2500, 'Ingresos Propios': 400,
+}
+MONTO_POR_DEFECTO = 50
+
+# Textos de detalle por subcategoría (vocabulario realista para la búsqueda de texto)
+DETALLES = {
+    'Supermercado': ('Compra semanal', 'Coto', 'Carrefour', 'Dia', 'Verduleria', 'Almacen del barrio', 'Carniceria'),
+    'Servicios': ('Luz', 'Gas', 'Agua', 'Internet', 'Telefono celular', 'Expensas'),
+    'Transporte': ('SUBE', 'Nafta', 'Uber', 'Taxi', 'Estacionamiento', 'Peaje'),
+    'Salud': ('Farmacia', 'Consulta medica', 'Dentista', 'Prepaga', 'Analisis'),
+    'Educacion': ('Cuota colegio', 'Curso online', 'Libros', 'Universidad', 'Materiales'),
+    'Vivienda': ('Alquiler', 'Reparacion', 'Ferreteria', 'Muebles', 'Electrodomestico'),
+    'Entretenimiento': ('Cine', 'Streaming', 'Recital', 'Teatro', 'Videojuego', 'Escapada de fin de semana'),
+    'Delivery': ('Pedidos Ya', 'Rappi', 'Pizza', 'Sushi', 'Hamburguesas', 'Helado'),
+    'Ropa': ('Zapatillas', 'Campera', 'Jean', 'Remeras', 'Ropa de invierno'),
+    'Deuda': ('Pago tarjeta', 'Prestamo personal', 'Cuota prestamo'),
+    'Acciones': ('Compra acciones', 'CEDEAR', 'Fondo comun de inversion'),
+    'Bonos': ('Bono soberano', 'Obligacion negociable', 'Letras'),
+    'Crypto': ('Compra BTC', 'Compra USDT', 'Compra ETH'),
+    'Cuenta': ('Ahorro mensual', 'Reserva', 'Fondo de emergencia'),
+    'Plazo Fijo': ('Plazo fijo 30 dias', 'Renovacion plazo fijo'),
+    'Sueldo Empresa': ('Salario mensual', 'Aguinaldo', 'Bono anual'),
+    'Ingresos Propios': ('Trabajo freelance', 'Venta usados', 'Clases particulares', 'Consultoria'),
+    'Otros': ('Varios', 'Regalo', 'Reintegro', 'Otros gastos'),
+}
+
+# Peso de cada método de pago en los egresos; los ingresos entran por transferencia
+PESOS_METODOS = {
+    'Tarjeta de Credito': 40, 'Mercado Pago': 25,
+    'Cuenta Debito - Tarjeta': 20, 'Cuenta Debito - Transferencia': 15,
+}
+METODO_INGRESOS = 'Cuenta Debito - Transferencia'
+
+# Compras con tarjeta de crédito de estas subcategorías que se pagan en cuotas
+SUBCATEGORIAS_EN_CUOTAS = {'Ropa', 'Vivienda', 'Educacion', 'Entretenimiento', 'Salud'}
+PROBABILIDAD_CUOTAS = 0.15
+PESOS_CUOTAS = {3: 50, 6: 30, 12: 20}
+
+INFLACION_MENSUAL = 0.02
+
+# Libro de transacciones: cuentas contables y territorios
+CUENTAS = tuple(f'{grupo}{numero:02d}' for grupo in (11, 21, 41, 51, 52) for numero in range(1, 9))
+TERRITORIOS = tuple(f'T{numero:02d}' for numero in range(1, 25))
+
+
+def _ponderado(rng, pesos):
+    opciones = tuple(pesos)
+    acumulados = []
+    total = 0
+    for opcion in opciones:
+        total += pesos[opcion]
+        acumulados.append(total)
+    return lambda: rng.choices(opciones, cum_weights=acumulados)[0]
+
+
+class Generador:
+    """Genera un libro de movimientos sintético y reproducible.
+
+    Los movimientos salen en orden cronológico, repartidos en los últimos
+    `anios` años hasta `fin`, con un sueldo por mes, categorías y subcategorías
+    válidas de PARAMETROS, montos con inflación y compras en cuotas.
+    """
+
+    def __init__(self, semilla=SEMILLA, anios=ANIOS, fin=FIN):
+        self.rng = random.Random(semilla)
+        self.fin = fin
+        self.inicio = date(fin.year - anios + 1, 1, 1)
+        self.dias = (fin - self.inicio).days + 1
+        self._categoria = _ponderado(self.rng, PESOS_CATEGORIAS)
+        self._metodo = _ponderado(self.rng, PESOS_METODOS)
+        self._cuotas = _ponderado(self.rng, PESOS_CUOTAS)
+
+    def _monto(self, subcategoria, fecha):
+        meses = (fecha.year - self.inicio.year) * 12 + fecha.month - self.inicio.month
+        base = MONTOS.get(subcategoria, MONTO_POR_DEFECTO) * (1 + INFLACION_MENSUAL) ** meses
+        return round(base * self.rng.lognormvariate(0, 0.5), 2)
+
+    def _detalle(self, subcategoria):
+        return self.rng.choice(DETALLES.get(subcategoria, DETALLES['Otros']))
+
+    def _fila(self, fecha, tipo, categoria, subcategoria, metodo, cuotas=1):
+        texto = fecha.isoformat()
+        return (texto, tipo, categoria, subcategoria, metodo, self._monto(subcategoria, fecha),
+                self._detalle(subcategoria), cuotas, texto[:7])
+
+    def movimientos(self, n, contar_cuotas=True):
+        """Produce (fila, es_plan) hasta sumar n filas de movimientos.
+
+        fila está en el orden de COLUMNAS_INSERCION. Un plan en cuotas es una
+        sola fila con el monto total; cuenta por todas sus cuotas, o por una sola
+        fila con contar_cuotas=False (registros sueltos para bulk o CSV).
+        """
+        generadas = 0
+        mes_sueldo = None
+        while generadas < n:
+            fecha = self.inicio + timedelta(days=generadas * self.dias // n)
+            if (fecha.year, fecha.month) != mes_sueldo:
+                mes_sueldo = (fecha.year, fecha.month)
+                yield self._fila(fecha, 'Ingreso', 'Ingresos', 'Sueldo Empresa', METODO_INGRESOS), False
+                generadas += 1
+                continue
+
+            tipo, categoria = self._categoria()
+            subcategoria = self.rng.choice(PARAMETROS['subcategorias'][categoria])
+            metodo = METODO_INGRESOS if tipo == 'Ingreso' else self._metodo()
+            if (metodo == 'Tarjeta de Credito' and subcategoria in SUBCATEGORIAS_EN_CUOTAS
+                    and self.rng.random() < PROBABILIDAD_CUOTAS):
+                cuotas = self._cuotas()
+                if contar_cuotas:
+                    cuotas = min(cuotas, n - generadas)
+                if cuotas > 1:
+                    fila = self._fila(fecha, tipo, categoria, subcategoria, metodo, cuotas)
+                    # El plan se compra por varias veces el monto de una compra común
+                    yield fila[:5] + (round(fila[5] * cuotas / 2, 2),) + fila[6:], True
+                    generadas += cuotas if contar_cuotas else 1
+                    continue
+            yield self._fila(fecha, tipo, categoria, subcategoria, metodo), False
+            generadas += 1
+
+    def transacciones(self, n):
+        """Produce n tuplas (fecha, clave_cuenta, descripcion, monto, clave_territorio) en orden cronológico."""
+        for i in range(n):
+            fecha = self.inicio + timedelta(days=i * self.dias // n)
+            cuenta = self.rng.choice(CUENTAS)
+            # Ingresos (grupo 41) positivos, el resto egresos; algunas sin territorio asignado
+            signo = 1 if cuenta.startswith('41') else -1
+            territorio = None if self.rng.random() < 0.05 else self.rng.choice(TERRITORIOS)
+            yield (fecha.isoformat(), cuenta, f'Asiento {i + 1}',
+                   round(signo * 100 * self.rng.lognormvariate(0, 1), 2), territorio)
+
+
+def registros(n, semilla=SEMILLA):
+    """Produce n registros como los recibe POST /api/datos/bulk (los planes viajan con su cantidad de cuotas)."""
+    for fila, _ in Generador(semilla).movimientos(n, contar_cuotas=False):
+        yield dict(zip(COLUMNAS_INSERCION[:8], fila))
+
+
+def escribir_csv(ruta, n, semilla=SEMILLA):
+    """Escribe n registros en un CSV con las columnas de import_excel.py. Devuelve la cantidad de filas."""
+    filas = 0
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(COLUMNAS_INSERCION[:8])
+        for fila, _ in Generador(semilla).movimientos(n, contar_cuotas=False):
+            escritor.writerow(fila[:8])
+            filas += 1
+    return filas
+
+
+def escribir_ndjson(ruta, n, semilla=SEMILLA):
+    """Escribe n registros en NDJSON, como el cuerpo de /api/datos/bulk en streaming."""
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        for registro in registros(n, semilla):
+            archivo.write(json.dumps(registro) + '\n')
+
+
+# Triggers por fila que la carga inicial reemplaza por un único recálculo al final
+TRIGGERS_CARGA = ('trg_resumen_mes_insert', 'trg_version_datos_insert', 'trg_busqueda_insert', 'trg_revisiones_insert')
+
+TAMANO_LOTE = 50000
+
+
+def cargar(ruta, n, semilla=SEMILLA, transacciones=None):
+    """Crea en ruta una base nueva con n movimientos (y n // 10 transacciones por defecto).
+
+    Los planes en cuotas se guardan en planes_cuotas con una fila de
+    movimientos por cuota, igual que POST /api/datos. Índices, resumen mensual,
+    índice de búsqueda y revisiones se construyen una sola vez al final.
+    """
+    from db import (ACUMULAR_RESUMEN_TRANSACCIONES, conectar, numerar_revisiones, reconstruir_busqueda,
+                    reconstruir_resumen_mes)
+    from ingesta import indices_secundarios
+    from migraciones import migrar
+    from transacciones import INSERTAR_TRANSACCION
+
+    if os.path.exists(ruta):
+        raise FileExistsError(f'{ruta} ya existe: la carga solo crea bases nuevas')
+    migrar(ruta)
+    generador = Generador(semilla)
+    conn = conectar(ruta)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        triggers = conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+            f" AND name IN ({', '.join('?' * len(TRIGGERS_CARGA))})",
+            TRIGGERS_CARGA,
+        ).fetchall()
+        indices = indices_secundarios(conn) + indices_secundarios(conn, 'transacciones')
+        for nombre, _ in triggers:
+            conn.execute(f'DROP TRIGGER "{nombre}"')
+        for nombre, _ in indices:
+            conn.execute(f'DROP INDEX "{nombre}"')
+
+        dimensiones = Dimensiones(conn)
+        comunes, cuotas = [], []
+        for fila, es_plan in generador.movimientos(n):
+            if es_plan:
+                plan_id = conn.execute(INSERTAR_PLAN, fila[:8]).lastrowid
+                cuotas.extend(expandir_plan(plan_id, fila, dimensiones))
+            else:
+                comunes.append(fila)
+            if len(comunes) >= TAMANO_LOTE:
+                conn.executemany(INSERTAR_MOVIMIENTO, dimensiones.codificar(comunes))
+                comunes = []
+            if len(cuotas) >= TAMANO_LOTE:
+                conn.executemany(INSERTAR_CUOTA, cuotas)
+                cuotas = []
+        if comunes:
+            conn.executemany(INSERTAR_MOVIMIENTO, dimensiones.codificar(comunes))
+        if cuotas:
+            conn.executemany(INSERTAR_CUOTA, cuotas)
+
+        filas_transacciones = generador.transacciones(n // 10 if transacciones is None else transacciones)
+        while True:
+            bloque = list(islice(filas_transacciones, TAMANO_LOTE))
+            if not bloque:
+                break
+            conn.executemany(INSERTAR_TRANSACCION, bloque)
+
+        for _, sql in indices:
+            conn.execute(sql)
+        for _, sql in triggers:
+            conn.execute(sql)
+        reconstruir_resumen_mes(conn)
+        conn.execute('DELETE FROM resumen_transacciones')
+        conn.execute(ACUMULAR_RESUMEN_TRANSACCIONES, (0,))
+        reconstruir_busqueda(conn)
+        numerar_revisiones(conn)
+        conn.execute("UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_datos'")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        for archivo in (ruta, ruta + '-wal', ruta + '-shm'):
+            if os.path.exists(archivo):
+                os.remove(archivo)
+        raise
+    conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Genera un libro de movimientos sintético y reproducible.')
+    parser.add_argument('filas', type=int, help='cantidad de filas de movimientos (10000 a 10000000)')
+    parser.add_argument('--semilla', type=int, default=SEMILLA)
+    salida = parser.add_mutually_exclusive_group(required=True)
+    salida.add_argument('--db', help='crea una base SQLite nueva con los movimientos')
+    salida.add_argument('--csv', help='escribe los registros en un CSV para import_excel.py')
+    salida.add_argument('--ndjson', help='escribe los registros en NDJSON para /api/datos/bulk')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.db:
+        cargar(args.db, args.filas, args.semilla)
+        destino = args.db
+    elif args.csv:
+        escribir_csv(args.csv, args.filas, args.semilla)
+        destino = args.csv
+    else:
+        escribir_ndjson(args.ndjson, args.filas, args.semilla)
+        destino = args.ndjson
+    duracion = time.perf_counter() - inicio
+    print(f"{args.filas} filas generadas en {destino} en {duracion:.1f}s ({args.filas / duracion:,.0f} filas/s)")
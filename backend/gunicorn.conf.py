@@ -0,0 +1,9 @@
+# gunicorn carga este archivo al lanzarse desde backend/, tanto con workers sync
+# (gunicorn app:app) como en modo asyncio (gunicorn asgi:app -k uvicorn_worker.UvicornWorker)
+
+
+def on_starting(server):
+    """Aplica las migraciones pendientes una sola vez, en el proceso maestro, antes de crear los workers."""
+    from migraciones import migrar
+
+    migrar()
@@ -1,133 +1,129 @@
 import pandas as pd
-import sqlite3
 import os
-from datetime import datetime
-
-# Ruta a la base de datos
-DB_PATH = os.path.join(os.path.dirname(__file__), 'datos.db')
-
-def inicializar_db():
-    """Inicializa la base de datos creando la tabla si no existe."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Crear tabla de registros
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS datos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha DATE NOT NULL,
-            tipo TEXT NOT NULL,
-            categoria TEXT NOT NULL,
-            subcategoria TEXT NOT NULL,
-            metodoPago TEXT NOT NULL,
-            monto REAL NOT NULL,
-            detalle TEXT,
-            cuotas INTEGER DEFAULT 1
-        )
-    ''')
-    
-    # Crear índices para mejorar el rendimiento
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fecha ON datos(fecha)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tipo ON datos(tipo)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_categoria ON datos(categoria)')
-    
-    conn.commit()
-    conn.close()
-    print("Base de datos inicializada correctamente")
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from db import conectar
+from dimensiones import Dimensiones
+from ingesta import insertar_filas, reanudar_triggers_carga, suspender_triggers_carga
+from migraciones import migrar
+from validacion import COLUMNAS_INSERCION, esquema
+
+# Filas por bloque al leer CSV y al insertar
+TAMANO_BLOQUE = 50000
+
+# Errores que se detallan en el mensaje antes de resumir el resto
+MAX_ERRORES_MENSAJE = 10
 
 def validar_datos(df):
-    """Valida que el DataFrame tenga las columnas requeridas y los datos sean válidos."""
-    columnas_requeridas = ['fecha', 'tipo', 'categoria', 'subcategoria', 'metodoPago', 'monto']
-    
-    # Verificar columnas requeridas
-    columnas_faltantes = [col for col in columnas_requeridas if col not in df.columns]
-    if columnas_faltantes:
-        raise ValueError(f"Faltan las siguientes columnas en el Excel: {', '.join(columnas_faltantes)}")
-    
-    # Validar tipos de datos
-    df['fecha'] = pd.to_datetime(df['fecha']).dt.strftime('%Y-%m-%d')
-    df['monto'] = pd.to_numeric(df['monto'], errors='coerce')
-    
-    # Validar valores no nulos
-    for col in columnas_requeridas:
-        if df[col].isnull().any():
-            raise ValueError(f"La columna {col} contiene valores nulos")
-    
-    # Validar tipos de transacción
-    tipos_validos = ['Ingreso', 'Egreso']
-    if not df['tipo'].isin(tipos_validos).all():
-        raise ValueError(f"La columna 'tipo' debe contener solo: {', '.join(tipos_validos)}")
-    
-    # Validar montos positivos
-    if (df['monto'] <= 0).any():
-        raise ValueError("Todos los montos deben ser mayores a 0")
+    """Valida y normaliza el DataFrame con el esquema compartido. Devuelve las filas listas para insertar_filas."""
+    # Número de fila como en la planilla: el índice empieza en 0 y la fila 1 es el encabezado
+    primera_fila = int(df.index[0]) + 2 if len(df) else 2
+    # Si faltan columnas validar_dataframe lanza ErrorRegistro, que es un ValueError
+    validas, errores = esquema.validar_dataframe(df, primera_fila)
+    if errores:
+        detalle = '; '.join(f"fila {e['fila']}: {e['error']}" for e in errores[:MAX_ERRORES_MENSAJE])
+        if len(errores) > MAX_ERRORES_MENSAJE:
+            detalle += f' y {len(errores) - MAX_ERRORES_MENSAJE} errores más'
+        raise ValueError(f"{len(errores)} filas inválidas: {detalle}")
+    # tolist() devuelve tipos de Python, que sqlite3 acepta sin conversión
+    return list(zip(*(validas[col].tolist() for col in COLUMNAS_INSERCION)))
 
-def importar_excel(ruta_excel):
-    """Importa datos desde un archivo Excel a la base de datos."""
+def leer_bloques(ruta):
+    """Lee un archivo por bloques: CSV con read_csv por chunks, Excel de una vez."""
+    if os.path.splitext(ruta)[1].lower() == '.csv':
+        indice = 0
+        for bloque in pd.read_csv(ruta, chunksize=TAMANO_BLOQUE):
+            # Índice continuo para que los números de fila de los errores sean los del archivo
+            bloque.index = range(indice, indice + len(bloque))
+            indice += len(bloque)
+            yield bloque
+    else:
+        yield pd.read_excel(ruta)
+
+def preparar_archivo(ruta):
+    """Lee y valida un archivo completo. Se ejecuta en los procesos del pool."""
+    bloques = []
+    for bloque in leer_bloques(ruta):
+        try:
+            bloques.append(validar_datos(bloque))
+        except ValueError as e:
+            raise ValueError(f"{os.path.basename(ruta)}: {e}")
+    return bloques
+
+def _preparados(rutas, procesos):
+    """Produce (ruta, bloques) a medida que cada archivo termina de prepararse."""
+    if len(rutas) == 1 or procesos == 1:
+        for ruta in rutas:
+            yield ruta, preparar_archivo(ruta)
+        return
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = {pool.submit(preparar_archivo, ruta): ruta for ruta in rutas}
+        for futuro in as_completed(futuros):
+            yield futuros[futuro], futuro.result()
+
+def importar_archivos(rutas, procesos=None):
+    """Importa uno o más archivos Excel/CSV. Se leen y validan en paralelo y un único escritor inserta todo en una transacción."""
+    conn = None
     try:
-        # Inicializar la base de datos primero
-        print("Inicializando base de datos...")
-        inicializar_db()
-        
-        # Leer el archivo Excel
-        print(f"Leyendo archivo Excel: {ruta_excel}")
-        df = pd.read_excel(ruta_excel)
-        
-        # Validar datos
-        print("Validando datos...")
-        validar_datos(df)
-        
-        # Conectar a la base de datos
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Insertar datos
-        print("Insertando datos en la base de datos...")
+        # Aplicar las migraciones pendientes antes de insertar
+        migrar()
+
+        inicio = time.perf_counter()
+        # Lectura y validación antes de tomar el lock de escritura: read_excel tarda segundos y
+        # mientras tanto los escritores de la aplicación pueden seguir confirmando
+        preparados = list(_preparados(rutas, procesos))
+
+        conn = conectar()
+        conn.execute('BEGIN IMMEDIATE')
+
+        dimensiones = Dimensiones(conn)
+        suspendidos = suspender_triggers_carga(conn)
         registros_insertados = 0
-        for _, row in df.iterrows():
-            cursor.execute('''
-                INSERT INTO datos 
-                (fecha, tipo, categoria, subcategoria, metodoPago, monto, detalle, cuotas)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                row['fecha'],
-                row['tipo'],
-                row['categoria'],
-                row['subcategoria'],
-                row['metodoPago'],
-                float(row['monto']),
-                row.get('detalle', ''),
-                int(row.get('cuotas', 1))
-            ))
-            registros_insertados += 1
-        
+        for ruta, bloques in preparados:
+            print(f"Insertando datos de {ruta}...")
+            for filas in bloques:
+                for i in range(0, len(filas), TAMANO_BLOQUE):
+                    insertar_filas(conn, filas[i:i + TAMANO_BLOQUE], dimensiones)
+                registros_insertados += len(filas)
+        reanudar_triggers_carga(conn, suspendidos)
+
         # Guardar cambios
         conn.commit()
-        print(f"¡Importación exitosa! Se importaron {registros_insertados} registros.")
-        
+        duracion = time.perf_counter() - inicio
+        por_segundo = registros_insertados / duracion if duracion else 0
+        print(f"¡Importación exitosa! Se importaron {registros_insertados} registros "
+              f"en {duracion:.2f}s ({por_segundo:,.0f} registros/s).")
+        return registros_insertados
+
     except Exception as e:
         print(f"Error durante la importación: {str(e)}")
-        if 'conn' in locals():
+        if conn:
             conn.rollback()
         raise
     finally:
-        if 'conn' in locals():
+        if conn:
             conn.close()
 
+def importar_excel(ruta_excel):
+    """Importa datos desde un archivo Excel a la base de datos."""
+    return importar_archivos([ruta_excel])
+
 if __name__ == '__main__':
     import sys
-    
-    if len(sys.argv) != 2:
-        print("Uso: python import_excel.py <ruta_al_archivo_excel>")
-        sys.exit(1)
-    
-    ruta_excel = sys.argv[1]
-    if not os.path.exists(ruta_excel):
-        print(f"Error: El archivo {ruta_excel} no existe")
+
+    if len(sys.argv) < 2:
+        print("Uso: python import_excel.py <archivo_excel_o_csv> [<archivo> ...]")
         sys.exit(1)
-    
+
+    rutas = sys.argv[1:]
+    for ruta in rutas:
+        if not os.path.exists(ruta):
+            print(f"Error: El archivo {ruta} no existe")
+            sys.exit(1)
+
     try:
-        importar_excel(ruta_excel)
+        importar_archivos(rutas)
     except Exception as e:
         print(f"Error: {str(e)}")
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,149 @@
+import json
+
+from db import numerar_revisiones
+from dimensiones import INSERTAR_MOVIMIENTO, Dimensiones
+from validacion import REGISTRO_ILEGIBLE, esquema
+
+# Registros validados e insertados por cada executemany
+TAMANO_LOTE = 5000
+
+# Triggers por fila que las cargas reemplazan por una sola sentencia al final
+TRIGGERS_CARGA = ('trg_busqueda_insert', 'trg_revisiones_insert')
+
+
+def validar_registro(registro):
+    """Valida y normaliza un registro. Devuelve la tupla lista para insertar_filas."""
+    return esquema.validar(registro)
+
+
+def validar_lote(registros, primera_fila=1):
+    """Valida un lote completo. Devuelve (filas_validas, errores) con un error estructurado por registro."""
+    return esquema.validar_lote(registros, primera_fila)
+
+
+def insertar_filas(conn, filas, dimensiones=None):
+    """Inserta filas validadas en movimientos con un executemany, traduciendo los textos a ids de dimensión."""
+    dimensiones = dimensiones or Dimensiones(conn)
+    conn.executemany(INSERTAR_MOVIMIENTO, dimensiones.codificar(filas))
+
+
+def leer_ndjson(lineas):
+    """Decodifica un cuerpo NDJSON línea por línea. Produce (numero_linea, registro, error o None)."""
+    numero = 0
+    for linea in lineas:
+        linea = linea.strip()
+        if not linea:
+            continue
+        numero += 1
+        try:
+            yield numero, json.loads(linea), None
+        except ValueError as e:
+            yield numero, REGISTRO_ILEGIBLE, {'fila': numero, 'campo': None, 'error': f'JSON inválido: {e}'}
+
+
+def _lotes(registros_ndjson, tamano):
+    """Agrupa los registros NDJSON en lotes, separando los errores de decodificación."""
+    lote, errores, primera = [], [], 1
+    for numero, registro, error in registros_ndjson:
+        if not lote:
+            primera = numero
+        if error:
+            errores.append(error)
+        # Las líneas ilegibles conservan su lugar para que los números de fila sigan alineados
+        lote.append(registro)
+        if len(lote) >= tamano:
+            yield primera, lote, errores
+            lote, errores = [], []
+    if lote:
+        yield primera, lote, errores
+
+
+def indices_secundarios(conn, tabla='movimientos'):
+    """Devuelve (nombre, sql) de los índices creados explícitamente sobre la tabla."""
+    return conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (tabla,)
+    ).fetchall()
+
+
+def suspender_triggers_carga(conn):
+    """Quita los triggers de alta que indexan el detalle y numeran revisiones fila por fila.
+
+    Se llama dentro de la transacción en curso y devuelve lo necesario para
+    reanudar_triggers_carga. Indexar y numerar al final con una sentencia cada
+    uno es mucho más barato que una inserción en movimientos_fts y otra en
+    revisiones_movimientos por cada fila cargada.
+    """
+    triggers = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?)", TRIGGERS_CARGA
+    ).fetchall()
+    ultimo_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM movimientos').fetchone()[0]
+    for nombre, _ in triggers:
+        conn.execute(f'DROP TRIGGER "{nombre}"')
+    return triggers, ultimo_id
+
+
+def reanudar_triggers_carga(conn, suspendidos):
+    """Indexa y numera los movimientos insertados desde suspender_triggers_carga y restaura los triggers."""
+    triggers, ultimo_id = suspendidos
+    nombres = {nombre for nombre, _ in triggers}
+    if 'trg_busqueda_insert' in nombres:
+        conn.execute(
+            'INSERT INTO movimientos_fts (rowid, detalle) SELECT id, detalle FROM movimientos WHERE id > ?',
+            (ultimo_id,),
+        )
+    if 'trg_revisiones_insert' in nombres:
+        numerar_revisiones(conn, ultimo_id)
+    for _, sql in triggers:
+        conn.execute(sql)
+
+
+def importar(conn, lotes, diferir_indices=False):
+    """Valida e inserta lotes de registros dentro de una única transacción explícita.
+
+    lotes es un iterable de (primera_fila, registros, errores_previos). Con
+    diferir_indices los índices secundarios se eliminan antes de insertar y se
+    reconstruyen una sola vez al final, lo que conviene en cargas muy grandes.
+    El índice de búsqueda y las revisiones se actualizan siempre al final. Devuelve
+    (registros_insertados, errores).
+    """
+    insertados = 0
+    errores = []
+    indices = []
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        dimensiones = Dimensiones(conn)
+        suspendidos = suspender_triggers_carga(conn)
+        if diferir_indices:
+            indices = indices_secundarios(conn)
+            for nombre, _ in indices:
+                conn.execute(f'DROP INDEX "{nombre}"')
+
+        for primera_fila, registros, errores_previos in lotes:
+            filas, errores_lote = validar_lote(registros, primera_fila)
+            errores.extend(errores_previos)
+            errores.extend(errores_lote)
+            if filas:
+                insertar_filas(conn, filas, dimensiones)
+                insertados += len(filas)
+
+        for _, sql in indices:
+            conn.execute(sql)
+        reanudar_triggers_carga(conn, suspendidos)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    errores.sort(key=lambda e: e['fila'])
+    return insertados, errores
+
+
+def lotes_de_lista(registros, tamano=TAMANO_LOTE):
+    """Divide una lista de registros en lotes para importar()."""
+    for inicio in range(0, len(registros), tamano):
+        yield inicio + 1, registros[inicio:inicio + tamano], []
+
+
+def lotes_de_ndjson(lineas, tamano=TAMANO_LOTE):
+    """Lee un cuerpo NDJSON en streaming y lo divide en lotes para importar()."""
+    return _lotes(leer_ndjson(lineas), tamano)
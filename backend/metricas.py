@@ -0,0 +1,292 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+
+from flask import g, has_request_context, request
+
+# Consultas que tardan más que esto (ms) se registran con su EXPLAIN QUERY PLAN
+CONSULTA_LENTA_MS = float(os.environ.get('METRICAS_CONSULTA_LENTA_MS', '100'))
+
+# Consultas lentas que se conservan para /api/metrics/consultas-lentas
+MAX_CONSULTAS_LENTAS = int(os.environ.get('METRICAS_MAX_CONSULTAS_LENTAS', '100'))
+
+# Textos de consulta distintos que se etiquetan por separado; el resto se suma en "otras"
+MAX_CONSULTAS_DISTINTAS = 500
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PREFIJO = 'kalifinancial_'
+
+# Listas de parámetros de largo variable (IN (?, ?, ...)) cuentan como una misma consulta
+_PARAMETROS_REPETIDOS = re.compile(r'\?(\s*,\s*\?)+')
+
+
+def texto_consulta(sql):
+    """Normaliza el SQL para usarlo como etiqueta: espacios colapsados y listas de ? abreviadas."""
+    return _PARAMETROS_REPETIDOS.sub('?, ...', ' '.join(sql.split()))[:200]
+
+
+def _etiquetas(nombres, valores):
+    escapados = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in valores)
+    return ','.join(f'{n}="{v}"' for n, v in zip(nombres, escapados))
+
+
+class Histograma:
+    """Histograma acumulado por combinación de etiquetas, en el formato de Prometheus."""
+
+    def __init__(self, nombre, ayuda, etiquetas, buckets=BUCKETS_SEGUNDOS):
+        self.nombre = PREFIJO + nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series = {}
+
+    def __contains__(self, valores):
+        return valores in self._series
+
+    def __len__(self):
+        return len(self._series)
+
+    def observar(self, valores, valor):
+        serie = self._series.get(valores)
+        if serie is None:
+            serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+        serie[0][bisect_left(self.buckets, valor)] += 1
+        serie[1] += valor
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        for valores, (conteos, suma) in sorted(self._series.items()):
+            etiquetas = _etiquetas(self.etiquetas, valores)
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + ('+Inf',), conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_sum{{{etiquetas}}} {suma}')
+            lineas.append(f'{self.nombre}_count{{{etiquetas}}} {acumulado}')
+        return lineas
+
+
+class Contador:
+    """Contador acumulado por combinación de etiquetas."""
+
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = PREFIJO + nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._series = {}
+
+    def sumar(self, valores, valor=1):
+        self._series[valores] = self._series.get(valores, 0) + valor
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} counter']
+        for valores, total in sorted(self._series.items()):
+            lineas.append(f'{self.nombre}{{{_etiquetas(self.etiquetas, valores)}}} {total}')
+        return lineas
+
+
+class Metricas:
+    """Métricas de pedidos HTTP y consultas SQL de este proceso (cada worker de gunicorn tiene las suyas)."""
+
+    def __init__(self, consulta_lenta_ms=CONSULTA_LENTA_MS, max_lentas=MAX_CONSULTAS_LENTAS):
+        self.umbral_lenta = consulta_lenta_ms / 1000
+        self._lock = threading.Lock()
+        self.pedidos = Histograma('http_duracion_segundos', 'Latencia de los pedidos por ruta',
+                                  ('metodo', 'ruta', 'estado'))
+        self.bytes_respuesta = Contador('http_respuesta_bytes_total', 'Bytes de respuesta (sin streaming) por ruta',
+                                        ('ruta',))
+        self.sql_por_ruta = Contador('http_sql_segundos_total', 'Tiempo en SQL de los pedidos por ruta', ('ruta',))
+        self.consultas = Histograma('sql_duracion_segundos', 'Duración de cada consulta (ejecución y lectura)',
+                                    ('consulta',))
+        self.filas = Contador('sql_filas_total', 'Filas leídas o modificadas por consulta', ('consulta',))
+        self.lentas_total = Contador('sql_lentas_total', 'Consultas que superaron el umbral de lentitud', ('ruta',))
+        self._lentas = deque(maxlen=max_lentas)
+
+    def registrar_pedido(self, metodo, ruta, estado, segundos, tamano, sql_segundos):
+        with self._lock:
+            self.pedidos.observar((metodo, ruta, str(estado)), segundos)
+            if tamano is not None:
+                self.bytes_respuesta.sumar((ruta,), tamano)
+            self.sql_por_ruta.sumar((ruta,), sql_segundos)
+
+    def registrar_consulta(self, conn, sql, parametros, segundos, filas):
+        consulta = texto_consulta(sql)
+        ruta = ruta_actual()
+        with self._lock:
+            if (consulta,) not in self.consultas and len(self.consultas) >= MAX_CONSULTAS_DISTINTAS:
+                consulta = 'otras'
+            self.consultas.observar((consulta,), segundos)
+            if filas > 0:
+                self.filas.sumar((consulta,), filas)
+        if has_request_context():
+            g._metricas_sql = g.get('_metricas_sql', 0.0) + segundos
+        if segundos >= self.umbral_lenta:
+            self._registrar_lenta(conn, sql, parametros, segundos, filas, ruta)
+
+    def _registrar_lenta(self, conn, sql, parametros, segundos, filas, ruta):
+        try:
+            # Cursor sin medición: el plan no cuenta como consulta
+            plan = [fila[3] for fila in sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, parametros)]
+        except (sqlite3.Error, ValueError):
+            # executemany, PRAGMA o varias sentencias: no tienen un plan que mostrar
+            plan = []
+        print(f"Consulta lenta ({segundos * 1000:.1f} ms, {filas} filas) en {ruta}: {' '.join(sql.split())}")
+        for paso in plan:
+            print(f'    {paso}')
+        with self._lock:
+            self.lentas_total.sumar((ruta,))
+            self._lentas.append({
+                'momento': datetime.now().isoformat(timespec='seconds'),
+                'ruta': ruta,
+                'duracion_ms': round(segundos * 1000, 2),
+                'filas': filas,
+                'sql': ' '.join(sql.split()),
+                'plan': plan,
+            })
+
+    def consultas_lentas(self):
+        """Devuelve las últimas consultas lentas, de la más reciente a la más antigua."""
+        with self._lock:
+            return list(reversed(self._lentas))
+
+    def exportar(self):
+        """Devuelve todas las métricas en el formato de texto de Prometheus."""
+        with self._lock:
+            lineas = []
+            for metrica in (self.pedidos, self.bytes_respuesta, self.sql_por_ruta,
+                            self.consultas, self.filas, self.lentas_total):
+                lineas.extend(metrica.exportar())
+        return '\n'.join(lineas) + '\n'
+
+
+metricas = Metricas()
+
+
+def ruta_actual():
+    """Regla de la ruta del pedido en curso, o el nombre del hilo fuera de un pedido (escritor, arranque)."""
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else 'sin_ruta'
+    return threading.current_thread().name
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que mide cada sentencia desde que se ejecuta hasta que se terminan de leer sus filas."""
+
+    _sql = None
+
+    def _cerrar_medicion(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            filas = self._filas if self._leyo else max(self.rowcount, 0)
+            metricas.registrar_consulta(self.connection, sql, self._parametros, self._segundos, filas)
+
+    def _medir(self, metodo, sql, parametros):
+        self._cerrar_medicion()
+        inicio = time.perf_counter()
+        try:
+            return metodo(self, sql, parametros)
+        finally:
+            self._sql, self._parametros = sql, parametros
+            self._segundos = time.perf_counter() - inicio
+            self._filas, self._leyo = 0, False
+
+    def _leer(self, metodo, *args):
+        inicio = time.perf_counter()
+        resultado = metodo(self, *args)
+        self._segundos += time.perf_counter() - inicio
+        self._leyo = True
+        return resultado
+
+    def execute(self, sql, parametros=()):
+        return self._medir(sqlite3.Cursor.execute, sql, parametros)
+
+    def executemany(self, sql, parametros):
+        try:
+            return self._medir(sqlite3.Cursor.executemany, sql, parametros)
+        finally:
+            # Las filas modificadas ya están en rowcount; los parámetros no sirven para el plan
+            self._parametros = None
+            self._cerrar_medicion()
+
+    def fetchone(self):
+        fila = self._leer(sqlite3.Cursor.fetchone)
+        if fila is None:
+            self._cerrar_medicion()
+        else:
+            self._filas += 1
+        return fila
+
+    def fetchmany(self, size=None):
+        filas = self._leer(sqlite3.Cursor.fetchmany, self.arraysize if size is None else size)
+        self._filas += len(filas)
+        if not filas:
+            self._cerrar_medicion()
+        return filas
+
+    def fetchall(self):
+        filas = self._leer(sqlite3.Cursor.fetchall)
+        self._filas += len(filas)
+        self._cerrar_medicion()
+        return filas
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            fila = sqlite3.Cursor.__next__(self)
+        except StopIteration:
+            self._segundos += time.perf_counter() - inicio
+            self._leyo = True
+            self._cerrar_medicion()
+            raise
+        self._segundos += time.perf_counter() - inicio
+        self._filas += 1
+        self._leyo = True
+        return fila
+
+    def close(self):
+        self._cerrar_medicion()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._cerrar_medicion()
+        except Exception:
+            # Al cerrar el intérprete el módulo puede no estar disponible
+            pass
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores (incluidos los de conn.execute) miden las consultas."""
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    # Los atajos de sqlite3.Connection crean un Cursor común: se redirigen a uno medido
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+
+def instalar(app):
+    """Registra los hooks que miden cada pedido de la aplicación."""
+
+    @app.before_request
+    def iniciar_medicion():
+        g._metricas_inicio = time.perf_counter()
+
+    @app.after_request
+    def registrar_medicion(respuesta):
+        inicio = g.pop('_metricas_inicio', None)
+        if inicio is not None:
+            tamano = None if respuesta.is_streamed else respuesta.calculate_content_length()
+            metricas.registrar_pedido(request.method, ruta_actual(), respuesta.status_code,
+                                      time.perf_counter() - inicio, tamano, g.pop('_metricas_sql', 0.0))
+        return respuesta
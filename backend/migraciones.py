@@ -0,0 +1,213 @@
+import sqlite3
+
+from db import (DB_PATH, ESQUEMA, TABLA_MOVIMIENTOS, TABLA_REVISIONES, TABLA_TRANSACCIONES, TRIGGERS_MES,
+                numerar_revisiones, reconstruir_busqueda, reconstruir_resumen_mes, reconstruir_resumen_transacciones)
+from dimensiones import DIMENSIONES, TABLAS_DIMENSIONES, sembrar_dimensiones
+
+
+def ejecutar_script(conn, script):
+    """Ejecuta un script SQL sentencia por sentencia dentro de la transacción en curso.
+
+    executescript confirmaría antes la transacción pendiente: una migración que
+    falle a la mitad no se podría deshacer.
+    """
+    sentencia = ''
+    for linea in script.splitlines(keepends=True):
+        sentencia += linea
+        if sqlite3.complete_statement(sentencia):
+            conn.execute(sentencia)
+            sentencia = ''
+    if sentencia.strip():
+        conn.execute(sentencia)
+
+
+def migrar_columna_mes(conn):
+    """Agrega y completa la columna mes en bases creadas antes de que existiera."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='datos'").fetchone() is None:
+        return
+    columnas = {fila[1] for fila in conn.execute('PRAGMA table_info(datos)')}
+    if 'mes' not in columnas:
+        print("Agregando columna mes a datos...")
+        conn.execute('ALTER TABLE datos ADD COLUMN mes TEXT')
+        conn.execute("UPDATE datos SET mes = strftime('%Y-%m', fecha)")
+
+
+def migrar_columnas_plan(conn):
+    """Agrega las columnas plan_id y numero_cuota en bases creadas antes de los planes de cuotas."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='datos'").fetchone() is None:
+        return
+    columnas = {fila[1] for fila in conn.execute('PRAGMA table_info(datos)')}
+    for columna, tipo in (('plan_id', 'INTEGER REFERENCES planes_cuotas(id)'), ('numero_cuota', 'INTEGER')):
+        if columna not in columnas:
+            print(f"Agregando columna {columna} a datos...")
+            conn.execute(f'ALTER TABLE datos ADD COLUMN {columna} {tipo}')
+
+
+def migrar_dimensiones(conn):
+    """Convierte la tabla datos con columnas de texto en movimientos con ids de dimensión.
+
+    Los ids de los registros se conservan y datos pasa a ser una vista (la crea ESQUEMA).
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='datos'").fetchone() is None:
+        return
+    print("Migrando datos a movimientos con tablas de dimensión...")
+    ejecutar_script(conn, TABLAS_DIMENSIONES + TABLA_MOVIMIENTOS)
+    sembrar_dimensiones(conn)
+    for tabla, columna, _ in DIMENSIONES:
+        conn.execute(f'INSERT OR IGNORE INTO {tabla} (nombre) SELECT DISTINCT {columna} FROM datos')
+    # Los índices y triggers de movimientos se crean después, con la tabla ya cargada
+    conn.execute('''
+        INSERT INTO movimientos
+        (id, fecha, tipo_id, categoria_id, subcategoria_id, metodo_pago_id, monto, detalle, cuotas, mes, plan_id, numero_cuota)
+        SELECT d.id, d.fecha, t.id, c.id, s.id, p.id, d.monto, d.detalle, d.cuotas, d.mes, d.plan_id, d.numero_cuota
+        FROM datos d
+        JOIN tipos t ON t.nombre = d.tipo
+        JOIN categorias c ON c.nombre = d.categoria
+        JOIN subcategorias s ON s.nombre = d.subcategoria
+        JOIN metodos_pago p ON p.nombre = d.metodoPago
+    ''')
+    # Conserva el contador de AUTOINCREMENT para no reutilizar ids de registros borrados
+    conn.execute('''
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'movimientos', 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'movimientos')
+    ''')
+    conn.execute('''
+        UPDATE sqlite_sequence
+        SET seq = MAX(seq, IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'datos'), 0))
+        WHERE name = 'movimientos'
+    ''')
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'datos'")
+    conn.execute('DROP TABLE datos')
+
+
+def migrar_transacciones(conn):
+    """Reconstruye con el esquema actual una tabla transacciones creada sin la columna id."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='transacciones'").fetchone() is None:
+        return
+    columnas = {fila[1] for fila in conn.execute('PRAGMA table_info(transacciones)')}
+    if 'id' in columnas:
+        return
+    print("Migrando transacciones al esquema con id...")
+    conn.execute('ALTER TABLE transacciones RENAME TO transacciones_anterior')
+    ejecutar_script(conn, TABLA_TRANSACCIONES)
+    conn.execute('''
+        INSERT INTO transacciones (fecha, clave_cuenta, descripcion, monto, clave_territorio)
+        SELECT fecha, clave_cuenta, descripcion, monto, clave_territorio FROM transacciones_anterior ORDER BY rowid
+    ''')
+    conn.execute('DROP TABLE transacciones_anterior')
+
+
+def _existe_tabla(conn, nombre):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (nombre,)).fetchone() is not None
+
+
+def esquema_inicial(conn):
+    """Lleva una base vacía, o una creada antes de las migraciones versionadas, al esquema completo.
+
+    Las bases anteriores pasan primero por las migraciones de columnas y tablas
+    heredadas; los resúmenes y el índice de búsqueda se calculan si son nuevos.
+    """
+    migrar_columna_mes(conn)
+    migrar_columnas_plan(conn)
+    migrar_dimensiones(conn)
+    migrar_transacciones(conn)
+    resumen_existia = _existe_tabla(conn, 'resumen_mes')
+    resumen_transacciones_existia = _existe_tabla(conn, 'resumen_transacciones')
+    busqueda_existia = _existe_tabla(conn, 'movimientos_fts')
+    ejecutar_script(conn, ESQUEMA)
+    sembrar_dimensiones(conn)
+    if not resumen_existia:
+        # Base existente sin resumen: se calcula a partir de los movimientos cargados
+        reconstruir_resumen_mes(conn)
+    if not resumen_transacciones_existia:
+        reconstruir_resumen_transacciones(conn)
+    if not busqueda_existia:
+        reconstruir_busqueda(conn)
+
+
+def seguimiento_cambios(conn):
+    """Crea revisiones_movimientos y sus triggers, y numera los movimientos existentes en orden de id."""
+    ejecutar_script(conn, TABLA_REVISIONES)
+    numerar_revisiones(conn)
+
+
+def mes_calculado(conn):
+    """Recrea los triggers de TRIGGERS_MES creados con su versión anterior."""
+    for nombre in ('trg_datos_insert', 'trg_datos_update', 'trg_version_bajas_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+    ejecutar_script(conn, TRIGGERS_MES)
+
+
+# (versión, descripción, función). Los cambios de esquema se agregan al final con la versión
+# siguiente y nunca se editan una vez publicados: cada base aplica solo las que le faltan
+MIGRACIONES = (
+    (1, 'Esquema completo: movimientos, dimensiones, planes, resúmenes, transacciones y búsqueda', esquema_inicial),
+    (2, 'Seguimiento de cambios: revisión por movimiento y lápidas de las bajas', seguimiento_cambios),
+    (3, 'Mes calculado por la vista: corregir mes no cuenta como baja para el motor en memoria', mes_calculado),
+)
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+def version_esquema(conn):
+    """Versión de esquema registrada en la base (PRAGMA user_version, 0 si nunca se migró)."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrar(ruta=None):
+    """Aplica las migraciones pendientes y devuelve sus versiones (vacío si la base estaba al día).
+
+    Con la base al día solo lee PRAGMA user_version. Cada migración se confirma
+    junto con su número de versión; si falla, la base queda en la versión anterior.
+    """
+    ruta = ruta or DB_PATH
+    # Sin transacciones implícitas: cada migración abre la suya con BEGIN IMMEDIATE
+    conn = sqlite3.connect(ruta, isolation_level=None)
+    try:
+        actual = version_esquema(conn)
+        if actual >= VERSION_ESQUEMA:
+            return []
+        print(f"Migrando base de datos en {ruta}: versión {actual} -> {VERSION_ESQUEMA}")
+        aplicadas = []
+        for version, descripcion, migracion in MIGRACIONES:
+            if version <= actual:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Con el lock tomado: otro proceso pudo aplicarla mientras tanto
+                if version_esquema(conn) >= version:
+                    conn.execute('ROLLBACK')
+                    continue
+                print(f"  {version}: {descripcion}")
+                migracion(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.execute('COMMIT')
+            except Exception as e:
+                print(f"Error en la migración {version}: {str(e)}")
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            aplicadas.append(version)
+        print("Base de datos actualizada")
+        return aplicadas
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 2 or sys.argv[1:] not in ([], ['--estado']):
+        print("Uso: python migraciones.py [--estado]")
+        sys.exit(1)
+
+    if sys.argv[1:] == ['--estado']:
+        conn = sqlite3.connect(DB_PATH)
+        actual = version_esquema(conn)
+        conn.close()
+        pendientes = [v for v, _, _ in MIGRACIONES if v > actual]
+        print(f"Versión de esquema: {actual} (última: {VERSION_ESQUEMA}, pendientes: {len(pendientes)})")
+        sys.exit(0)
+
+    migrar()
+    print(f"Esquema en la versión {VERSION_ESQUEMA}")
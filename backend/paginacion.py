@@ -0,0 +1,92 @@
+import base64
+import json
+
+# Columnas públicas de datos, en el orden en que se devuelven
+COLUMNAS_DATOS = (
+    'id', 'fecha', 'tipo', 'categoria', 'subcategoria', 'metodoPago', 'monto', 'detalle', 'cuotas',
+    'plan_id', 'numero_cuota',
+)
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+
+def codificar_cursor(fecha, id_registro):
+    """Codifica la posición (fecha, id) del último registro entregado."""
+    crudo = json.dumps([fecha, id_registro], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Decodifica un cursor generado por codificar_cursor."""
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        fecha, id_registro = json.loads(crudo)
+        if not isinstance(id_registro, int):
+            raise ValueError
+        return fecha, id_registro
+    except (ValueError, TypeError):
+        raise ValueError(f'Cursor inválido: {cursor}')
+
+
+def leer_parametros(args, columnas_validas=COLUMNAS_DATOS):
+    """Lee limit, cursor y fields de la query string. Sin limit ni cursor no se pagina."""
+    limite = args.get('limit')
+    cursor = args.get('cursor')
+    fields = args.get('fields')
+
+    if limite is not None:
+        try:
+            limite = int(limite)
+        except ValueError:
+            raise ValueError(f'limit inválido: {limite}')
+        if limite < 1 or limite > LIMITE_MAXIMO:
+            raise ValueError(f'limit debe estar entre 1 y {LIMITE_MAXIMO}')
+    elif cursor:
+        limite = LIMITE_POR_DEFECTO
+
+    cursor = decodificar_cursor(cursor) if cursor else None
+
+    if fields:
+        columnas = tuple(c.strip() for c in fields.split(',') if c.strip())
+        invalidas = [c for c in columnas if c not in columnas_validas]
+        if invalidas or not columnas:
+            raise ValueError(f'Campos inválidos: {", ".join(invalidas)}. Deben ser de: {", ".join(columnas_validas)}')
+    else:
+        columnas = tuple(columnas_validas)
+
+    return limite, cursor, columnas
+
+
+def construir_consulta(tabla, columnas, filtros=None, parametros=(), limite=None, cursor=None):
+    """Arma el SELECT ordenado por (fecha, id) descendente, con búsqueda por keyset desde el cursor."""
+    # fecha e id se leen siempre para poder generar el siguiente cursor
+    seleccion = list(columnas) + [c for c in ('fecha', 'id') if c not in columnas]
+    condiciones = [filtros] if filtros else []
+    valores = list(parametros)
+    if cursor:
+        condiciones.append('(fecha, id) < (?, ?)')
+        valores.extend(cursor)
+
+    sql = f'SELECT {", ".join(seleccion)} FROM {tabla}'
+    if condiciones:
+        sql += ' WHERE ' + ' AND '.join(f'({c})' for c in condiciones)
+    sql += ' ORDER BY fecha DESC, id DESC'
+    if limite:
+        sql += ' LIMIT ?'
+        valores.append(limite)
+    return sql, valores
+
+
+def consultar_pagina(conn, tabla, columnas, filtros=None, parametros=(), limite=None, cursor=None):
+    """Devuelve (registros, siguiente_cursor). siguiente_cursor es None en la última página."""
+    # Se pide una fila extra para saber si hay una página siguiente
+    sql, valores = construir_consulta(tabla, columnas, filtros, parametros, limite and limite + 1, cursor)
+    filas = conn.execute(sql, valores).fetchall()
+
+    siguiente = None
+    if limite and len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(filas[-1]['fecha'], filas[-1]['id'])
+
+    return [{c: fila[c] for c in columnas} for fila in filas], siguiente
@@ -0,0 +1,12 @@
+PARAMETROS = {
+    'tipos': ['Ingreso', 'Egreso'],
+    'categorias': ['Gastos basicos', 'Gastos deseo', 'Inversiones', 'Ahorros', 'Ingresos'],
+    'cuentas': ['Tarjeta de Credito', 'Mercado Pago', 'Cuenta Debito - Tarjeta', 'Cuenta Debito - Transferencia'],
+    'subcategorias': {
+        'Gastos basicos': ['Supermercado', 'Servicios', 'Transporte', 'Salud', 'Educacion', 'Vivienda'],
+        'Gastos deseo': ['Entretenimiento', 'Delivery', 'Ropa', 'Deuda', 'Otros'],
+        'Inversiones': ['Acciones', 'Bonos', 'Crypto', 'Otros'],
+        'Ahorros': ['Cuenta', 'Plazo Fijo', 'Otros'],
+        'Ingresos': ['Sueldo Empresa', 'Ingresos Propios', 'Otros']
+    }
+}
@@ -0,0 +1,47 @@
+import json
+
+# Filas leídas del cursor por cada fetchmany
+TAMANO_LOTE = 500
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def formato_pedido(args, accept_mimetypes):
+    """Devuelve 'ndjson' o 'json' si el pedido solicita streaming, o None si no."""
+    formato = args.get('stream')
+    if formato:
+        if formato not in FORMATOS:
+            raise ValueError(f'stream inválido: {formato}. Debe ser uno de: {", ".join(FORMATOS)}')
+        return formato
+    if accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        return 'ndjson'
+    return None
+
+
+def generar_filas(cursor, columnas, formato, tamano_lote=TAMANO_LOTE):
+    """Recorre el cursor por lotes y produce los registros codificados de a poco.
+
+    Con formato 'ndjson' emite un objeto JSON por línea; con 'json' emite un único
+    array. Solo se proyectan las primeras len(columnas) columnas de cada fila.
+    """
+    codificar = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    separador = '\n' if formato == 'ndjson' else ','
+    primero = True
+
+    if formato == 'json':
+        yield '['
+    while True:
+        filas = cursor.fetchmany(tamano_lote)
+        if not filas:
+            break
+        bloque = separador.join(codificar(dict(zip(columnas, fila))) for fila in filas)
+        if formato == 'ndjson':
+            yield bloque + '\n'
+        else:
+            yield bloque if primero else ',' + bloque
+        primero = False
+    if formato == 'json':
+        yield ']'
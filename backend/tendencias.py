@@ -0,0 +1,183 @@
+import calendar
+from datetime import date
+
+# numpy se importa dentro de cada función: app.py importa este módulo por PRESUPUESTO
+# y los workers no pagan la carga de numpy hasta el primer pedido de tendencias
+
+# Distribución del presupuesto sobre los ingresos del mes (regla 60/30/10)
+PRESUPUESTO = {'basicos': 0.6, 'deseo': 0.3, 'ahorros': 0.1}
+
+# Meses de cada promedio móvil por defecto
+VENTANAS = (3, 6, 12)
+MAX_VENTANA = 120
+
+COLUMNAS = ('ingresos', 'egresos', 'gastos_basicos', 'gastos_deseo', 'ahorros')
+
+# Egresos de cada día de un mes (la columna mes filtra por idx_mes_tipo_categoria)
+EGRESOS_POR_DIA = '''
+    SELECT CAST(substr(fecha, 9, 2) AS INTEGER) AS dia, SUM(monto) AS total
+    FROM movimientos
+    WHERE mes = ? AND tipo_id = (SELECT id FROM tipos WHERE nombre = 'Egreso')
+    GROUP BY dia
+'''
+
+
+def _mes(valor, parametro):
+    if len(valor) != 7 or valor[4] != '-' or not (valor[:4] + valor[5:]).isdigit() or not 1 <= int(valor[5:]) <= 12:
+        raise ValueError(f'{parametro} inválido: {valor}. Debe tener formato AAAA-MM')
+    return valor
+
+
+def leer_parametros(args):
+    """Lee ventanas, presupuesto_*, desde, hasta, hoy y mes de la query string. Lanza ValueError si son inválidos."""
+    try:
+        ventanas = tuple(int(v) for v in args['ventanas'].split(',') if v.strip()) if args.get('ventanas') else VENTANAS
+    except ValueError:
+        raise ValueError(f'ventanas inválidas: {args["ventanas"]}')
+    if any(v < 1 or v > MAX_VENTANA for v in ventanas):
+        raise ValueError(f'Cada ventana debe estar entre 1 y {MAX_VENTANA} meses')
+
+    presupuesto = {}
+    for nombre, por_defecto in PRESUPUESTO.items():
+        valor = args.get(f'presupuesto_{nombre}', por_defecto)
+        try:
+            presupuesto[nombre] = float(valor)
+        except ValueError:
+            presupuesto[nombre] = -1.0
+        if not 0 <= presupuesto[nombre] <= 1:
+            raise ValueError(f'presupuesto_{nombre} debe ser una proporción entre 0 y 1: {valor}')
+    if sum(presupuesto.values()) > 1 + 1e-9:
+        raise ValueError('Las proporciones del presupuesto suman más de 1')
+
+    desde = _mes(args['desde'], 'desde') if args.get('desde') else None
+    hasta = _mes(args['hasta'], 'hasta') if args.get('hasta') else None
+    try:
+        hoy = date.fromisoformat(args['hoy']) if args.get('hoy') else date.today()
+    except ValueError:
+        raise ValueError(f'hoy inválido: {args["hoy"]}. Debe tener formato AAAA-MM-DD')
+    # Mes de la proyección: por defecto el de hoy
+    mes = _mes(args['mes'], 'mes') if args.get('mes') else f'{hoy:%Y-%m}'
+    return ventanas, presupuesto, desde, hasta, hoy, mes
+
+
+def _promedio_movil(serie, ventana):
+    """Promedio de los últimos `ventana` meses; NaN mientras no haya meses suficientes."""
+    import numpy as np
+
+    acumulado = np.concatenate(([0.0], np.cumsum(serie)))
+    promedio = np.full(len(serie), np.nan)
+    if len(serie) >= ventana:
+        promedio[ventana - 1:] = (acumulado[ventana:] - acumulado[:-ventana]) / ventana
+    return promedio
+
+
+def series_mensuales(filas, ventanas=VENTANAS, presupuesto=PRESUPUESTO):
+    """Calcula las series por mes a partir de las filas de resumen_mes (mes, ingresos, egresos, ...).
+
+    Los meses sin movimientos entre el primero y el último cuentan como 0 para
+    los acumulados y los promedios móviles. Devuelve un dict de arreglos NumPy.
+    """
+    import numpy as np
+
+    filas = [fila for fila in filas if fila['mes']]
+    if not filas:
+        return {'mes': [], **{columna: np.zeros(0) for columna in COLUMNAS}}
+    ordinales = np.array([int(f['mes'][:4]) * 12 + int(f['mes'][5:]) - 1 for f in filas])
+    inicio = ordinales.min()
+    meses = np.arange(inicio, ordinales.max() + 1)
+    posiciones = ordinales - inicio
+
+    series = {'mes': [f'{m // 12:04d}-{m % 12 + 1:02d}' for m in meses.tolist()]}
+    for columna in COLUMNAS:
+        valores = np.zeros(len(meses))
+        valores[posiciones] = [f[columna] for f in filas]
+        series[columna] = valores
+
+    ingresos, egresos = series['ingresos'], series['egresos']
+    series['saldo'] = ingresos - egresos
+    series['saldo_acumulado'] = np.cumsum(series['saldo'])
+
+    # Acumulado del año: acumulado total menos lo acumulado hasta el fin del año anterior
+    anios = meses // 12
+    inicio_anio = np.flatnonzero(np.r_[True, anios[1:] != anios[:-1]])
+    largo_anio = np.diff(np.r_[inicio_anio, len(meses)])
+    for columna in ('ingresos', 'egresos', 'saldo'):
+        acumulado = np.cumsum(series[columna])
+        previo = np.r_[0.0, acumulado][inicio_anio]
+        series[f'{columna}_anual'] = acumulado - np.repeat(previo, largo_anio)
+
+    for ventana in ventanas:
+        series[f'egresos_promedio_{ventana}'] = _promedio_movil(egresos, ventana)
+        series[f'ingresos_promedio_{ventana}'] = _promedio_movil(ingresos, ventana)
+
+    for nombre, proporcion in presupuesto.items():
+        real = series['ahorros'] if nombre == 'ahorros' else series[f'gastos_{nombre}']
+        series[f'presupuesto_{nombre}'] = ingresos * proporcion
+        series[f'desvio_{nombre}'] = real - ingresos * proporcion
+        with np.errstate(divide='ignore', invalid='ignore'):
+            series[f'real_{nombre}'] = np.where(ingresos != 0, real / ingresos * 100, 0.0)
+    return series
+
+
+def proyectar_mes(conn, mes, hoy):
+    """Proyección lineal de los egresos del mes al último día, con lo gastado hasta hoy.
+
+    Ajusta una recta por mínimos cuadrados al gasto acumulado día a día. Un mes
+    ya terminado devuelve lo gastado; uno futuro solo lo ya cargado (cuotas).
+    """
+    import numpy as np
+
+    anio, numero = int(mes[:4]), int(mes[5:])
+    dias = calendar.monthrange(anio, numero)[1]
+    if (anio, numero) < (hoy.year, hoy.month):
+        corte = dias
+    elif (anio, numero) == (hoy.year, hoy.month):
+        corte = hoy.day
+    else:
+        corte = 0
+
+    diario = np.zeros(dias)
+    for fila in conn.execute(EGRESOS_POR_DIA, (mes,)):
+        if fila['dia'] and 1 <= fila['dia'] <= dias:
+            diario[fila['dia'] - 1] += fila['total']
+    acumulado = np.cumsum(diario)
+    gastado = float(acumulado[corte - 1]) if corte else 0.0
+    # Movimientos con fecha posterior a hoy dentro del mes (p. ej. cuotas ya programadas)
+    comprometido = float(acumulado[-1]) - gastado
+
+    if corte == dias:
+        proyeccion = gastado
+    elif corte >= 2:
+        pendiente, ordenada = np.polyfit(np.arange(1, corte + 1), acumulado[:corte], 1)
+        proyeccion = max(float(pendiente * dias + ordenada), gastado)
+    elif corte == 1:
+        proyeccion = gastado * dias
+    else:
+        proyeccion = None
+    return {
+        'mes': mes,
+        'dias_mes': dias,
+        'dia_corte': corte,
+        'gastado': round(gastado, 2),
+        'comprometido': round(comprometido, 2),
+        'proyeccion_egresos': None if proyeccion is None else round(proyeccion, 2),
+    }
+
+
+def filas_json(series, desde=None, hasta=None):
+    """Convierte las series en una fila por mes (redondeada a 2 decimales, NaN -> None) entre desde y hasta."""
+    import numpy as np
+
+    meses = series['mes']
+    desde_i = 0 if desde is None else int(np.searchsorted(meses, desde, 'left'))
+    hasta_i = len(meses) if hasta is None else int(np.searchsorted(meses, hasta, 'right'))
+    columnas = {}
+    for nombre, valores in series.items():
+        if nombre == 'mes':
+            continue
+        recorte = np.round(valores[desde_i:hasta_i], 2)
+        columnas[nombre] = [None if v != v else v for v in recorte.tolist()]
+    return [
+        {'mes': mes, **{nombre: valores[i] for nombre, valores in columnas.items()}}
+        for i, mes in enumerate(meses[desde_i:hasta_i])
+    ]
@@ -0,0 +1,35 @@
+# Pruebas del backend: python -m pytest backend/tests (necesita pytest además de requirements.txt)
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Los módulos del backend se importan por nombre, como en app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Base temporal para toda la sesión: db.DB_PATH se lee al importar, antes que cualquier módulo del backend
+_DIRECTORIO = tempfile.mkdtemp(prefix='kalifinancial-pruebas-')
+os.environ['DATOS_DB'] = os.path.join(_DIRECTORIO, 'datos.db')
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DIRECTORIO, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def base():
+    """Ruta de la base temporal, con el esquema al día."""
+    from migraciones import migrar
+
+    migrar()
+    return os.environ['DATOS_DB']
+
+
+@pytest.fixture(scope='session')
+def cliente(base):
+    """Cliente de pruebas de la aplicación Flask sobre la base temporal."""
+    from app import app
+
+    return app.test_client()
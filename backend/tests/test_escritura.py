@@ -0,0 +1,22 @@
+import sqlite3
+
+import pytest
+
+from escritura import EscritorAgrupado
+from migraciones import migrar
+
+
+def test_error_al_conectar_se_informa_y_el_escritor_se_recupera(tmp_path):
+    ruta = str(tmp_path / 'datos.db')
+    migrar(ruta)
+    escritor = EscritorAgrupado(ruta=str(tmp_path / 'no-existe' / 'datos.db'), timeout=5)
+
+    # Cada pedido recibe el error de conexión en lugar de esperar el timeout
+    for propia in (False, True, False):
+        with pytest.raises(sqlite3.OperationalError):
+            escritor.ejecutar(lambda conn: None, propia=propia)
+    assert escritor.estadisticas()['fallidas'] == 3
+
+    # El mismo hilo vuelve a intentar la conexión con el próximo lote
+    escritor.ruta = ruta
+    assert escritor.ejecutar(lambda conn: conn.execute('SELECT COUNT(*) FROM movimientos').fetchone()[0]) == 0
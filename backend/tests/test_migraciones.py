@@ -0,0 +1,76 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import migraciones
+
+# datos.db del repositorio: esquema anterior a las migraciones versionadas (tabla datos con texto)
+BASE_ANTERIOR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'datos.db')
+
+
+def _esquema(ruta):
+    conn = sqlite3.connect(ruta)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0], sorted(
+            conn.execute('SELECT type, name, sql FROM sqlite_master').fetchall(), key=lambda fila: fila[:2])
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def base_anterior(tmp_path):
+    ruta = tmp_path / 'anterior.db'
+    shutil.copy(BASE_ANTERIOR, ruta)
+    return str(ruta)
+
+
+def test_base_nueva_y_anterior_terminan_con_el_mismo_esquema(tmp_path, base_anterior):
+    nueva = str(tmp_path / 'nueva.db')
+    assert migraciones.migrar(nueva) == [v for v, _, _ in migraciones.MIGRACIONES]
+    assert migraciones.migrar(base_anterior) == [v for v, _, _ in migraciones.MIGRACIONES]
+    assert _esquema(nueva) == _esquema(base_anterior)
+    assert migraciones.migrar(base_anterior) == []
+
+
+def test_migracion_que_falla_deja_la_base_en_la_version_anterior(base_anterior, monkeypatch):
+    antes = _esquema(base_anterior)
+
+    def falla(conn):
+        raise RuntimeError('falla a mitad de la migración')
+
+    # Falla después de que las migraciones heredadas ya modificaron el esquema
+    monkeypatch.setattr(migraciones, 'migrar_transacciones', falla)
+    with pytest.raises(RuntimeError):
+        migraciones.migrar(base_anterior)
+    assert _esquema(base_anterior) == antes
+
+
+def test_falla_en_la_segunda_migracion_conserva_la_primera(tmp_path, monkeypatch):
+    ruta = str(tmp_path / 'nueva.db')
+
+    def seguimiento_fallido(conn):
+        migraciones.seguimiento_cambios(conn)
+        raise RuntimeError('falla después de crear revisiones_movimientos')
+
+    monkeypatch.setattr(migraciones, 'MIGRACIONES', (
+        migraciones.MIGRACIONES[0], (2, 'Seguimiento de cambios', seguimiento_fallido),
+    ))
+    with pytest.raises(RuntimeError):
+        migraciones.migrar(ruta)
+    version, objetos = _esquema(ruta)
+    assert version == 1
+    assert 'revisiones_movimientos' not in {nombre for _, nombre, _ in objetos}
+
+
+def test_base_en_version_2_recibe_los_triggers_de_mes(tmp_path, monkeypatch):
+    nueva = str(tmp_path / 'nueva.db')
+    anterior = str(tmp_path / 'version2.db')
+    migraciones.migrar(nueva)
+    with monkeypatch.context() as m:
+        m.setattr(migraciones, 'MIGRACIONES', migraciones.MIGRACIONES[:2])
+        m.setattr(migraciones, 'VERSION_ESQUEMA', 2)
+        migraciones.migrar(anterior)
+    assert migraciones.migrar(anterior) == [3]
+    assert _esquema(anterior) == _esquema(nueva)
@@ -0,0 +1,32 @@
+import sqlite3
+
+import pytest
+
+from consultas import CONSULTAS_INDEXADAS
+from db import verificar_planes
+from migraciones import migrar
+
+
+@pytest.fixture(scope='module', params=['vacia', 'con-datos'])
+def conn(request, tmp_path_factory):
+    """Base recién migrada, sin filas y con un libro sintético con estadísticas (ANALYZE)."""
+    ruta = str(tmp_path_factory.mktemp('planes') / 'datos.db')
+    if request.param == 'vacia':
+        migrar(ruta)
+    else:
+        import generador
+
+        generador.cargar(ruta, 10000)
+    conn = sqlite3.connect(ruta)
+    if request.param == 'con-datos':
+        conn.execute('ANALYZE')
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('nombre', sorted(CONSULTAS_INDEXADAS))
+def test_consulta_no_recorre_movimientos(conn, nombre):
+    sql, parametros = CONSULTAS_INDEXADAS[nombre]
+    plan = [fila[3] for fila in conn.execute('EXPLAIN QUERY PLAN ' + sql, parametros)]
+    assert not [paso for paso in plan if paso.startswith('SCAN movimientos')], plan
+    assert verificar_planes(conn, {nombre: CONSULTAS_INDEXADAS[nombre]}) == {}
@@ -0,0 +1,112 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+REGISTRO = {
+    'fecha': '2024-03-01',
+    'tipo': 'Egreso',
+    'categoria': 'Gastos basicos',
+    'subcategoria': 'Supermercado',
+    'metodoPago': 'Tarjeta de Credito',
+    'monto': 1500,
+    'detalle': 'prueba de validación',
+}
+
+# (cambios sobre REGISTRO, se acepta). Los tres caminos deben coincidir en cada caso
+CASOS = [
+    ({}, True),
+    ({'cuotas': 3}, True),
+    ({'cuotas': 3.0}, True),
+    ({'cuotas': '3'}, True),
+    ({'cuotas': '3.0'}, True),
+    ({'cuotas': ''}, True),
+    ({'cuotas': 36}, True),
+    ({'cuotas': 0}, False),
+    ({'cuotas': '0'}, False),
+    ({'cuotas': -3}, False),
+    ({'cuotas': 37}, False),
+    ({'cuotas': 500}, False),
+    ({'cuotas': 2.5}, False),
+    ({'cuotas': '2.5'}, False),
+    ({'cuotas': 'tres'}, False),
+    ({'tipo': 'Otro'}, False),
+    ({'categoria': 'Inexistente'}, False),
+    ({'subcategoria': 'Sueldo Empresa'}, False),
+    ({'metodoPago': 'Efectivo'}, False),
+    ({'monto': -5}, False),
+    ({'monto': 'mucho'}, False),
+    ({'monto': 'inf'}, False),
+    ({'monto': 1e999}, False),
+    ({'monto': '-inf'}, False),
+    ({'fecha': '2024-02-30'}, False),
+]
+
+
+def _contar(base):
+    conn = sqlite3.connect(base)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM movimientos').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _post(cliente, registro):
+    respuesta = cliente.post('/api/datos', json=registro)
+    assert respuesta.status_code in (201, 400), respuesta.get_data(as_text=True)
+    return respuesta.status_code == 201
+
+
+def _bulk(cliente, registro):
+    respuesta = cliente.post('/api/datos/bulk', json=[registro])
+    assert respuesta.status_code == 201, respuesta.get_data(as_text=True)
+    cuerpo = respuesta.get_json()
+    assert cuerpo['registros_importados'] + len(cuerpo['detalle_errores']) == 1
+    return cuerpo['registros_importados'] == 1
+
+
+def _import_excel(base, registro, tmp_path):
+    from import_excel import importar_archivos
+
+    ruta = tmp_path / 'registro.xlsx'
+    pd.DataFrame([registro]).to_excel(ruta, index=False)
+    antes = _contar(base)
+    try:
+        importar_archivos([str(ruta)])
+    except ValueError:
+        assert _contar(base) == antes
+        return False
+    assert _contar(base) == antes + 1
+    return True
+
+
+@pytest.mark.parametrize('cambios, aceptado', CASOS)
+def test_post_bulk_e_import_excel_coinciden(cliente, base, tmp_path, cambios, aceptado):
+    registro = {**REGISTRO, **cambios}
+    assert _post(cliente, registro) is aceptado
+    assert _bulk(cliente, registro) is aceptado
+    assert _import_excel(base, registro, tmp_path) is aceptado
+
+
+@pytest.mark.parametrize('tipo', [['Egreso'], {}, {'nombre': 'Egreso'}, 5])
+def test_tipo_que_no_es_texto_se_rechaza_con_json(cliente, tipo):
+    registro = {**REGISTRO, 'tipo': tipo}
+    respuesta = cliente.post('/api/datos', json=registro)
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['campo'] == 'tipo'
+
+    respuesta = cliente.post('/api/datos/bulk', json=[registro, REGISTRO])
+    assert respuesta.status_code == 201
+    cuerpo = respuesta.get_json()
+    assert cuerpo['registros_importados'] == 1
+    assert [(e['fila'], e['campo']) for e in cuerpo['detalle_errores']] == [(1, 'tipo')]
+
+
+
+@pytest.mark.parametrize('cuotas', [0, -3, 37])
+def test_editar_plan_con_cuotas_fuera_de_rango(cliente, cuotas):
+    plan_id = cliente.post('/api/datos', json={**REGISTRO, 'cuotas': 3}).get_json()['plan_id']
+    respuesta = cliente.put(f'/api/planes-cuotas/{plan_id}', json={'cuotas': cuotas})
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['campo'] == 'cuotas'
+    assert cliente.get(f'/api/planes-cuotas/{plan_id}').get_json()['cuotas'] == 3
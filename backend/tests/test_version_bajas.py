@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from dimensiones import INSERTAR_MOVIMIENTO, Dimensiones
+from migraciones import migrar
+
+FILA = ('2024-03-15', 'Egreso', 'Gastos basicos', 'Supermercado', 'Tarjeta de Credito', 100.0, 'prueba', 1)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    ruta = str(tmp_path / 'datos.db')
+    migrar(ruta)
+    conn = sqlite3.connect(ruta, isolation_level=None)
+    yield conn
+    conn.close()
+
+
+def _versiones(conn):
+    return dict(conn.execute("SELECT clave, valor FROM metadatos WHERE clave IN ('version_datos', 'version_bajas')"))
+
+
+def _mes(conn):
+    return conn.execute('SELECT mes FROM movimientos ORDER BY id DESC LIMIT 1').fetchone()[0]
+
+
+def test_insertar_en_la_vista_sin_mes_no_es_una_baja(conn):
+    antes = _versiones(conn)
+    conn.execute('INSERT INTO datos (fecha, tipo, categoria, subcategoria, metodoPago, monto) VALUES (?, ?, ?, ?, ?, ?)',
+                 FILA[:6])
+    assert _mes(conn) == '2024-03'
+    despues = _versiones(conn)
+    assert despues['version_bajas'] == antes['version_bajas']
+    assert despues['version_datos'] == antes['version_datos'] + 1
+
+
+@pytest.mark.parametrize('mes', [None, '1999-01'])
+def test_corregir_mes_en_movimientos_no_es_una_baja(conn, mes):
+    antes = _versiones(conn)
+    fila = Dimensiones(conn).codificar([FILA + (mes,)])
+    conn.executemany(INSERTAR_MOVIMIENTO, fila)
+    assert _mes(conn) == '2024-03'
+    assert _versiones(conn)['version_bajas'] == antes['version_bajas']
+
+
+def test_editar_o_borrar_sigue_siendo_una_baja(conn):
+    conn.executemany(INSERTAR_MOVIMIENTO, Dimensiones(conn).codificar([FILA + ('2024-03',)]))
+    antes = _versiones(conn)['version_bajas']
+    conn.execute("UPDATE datos SET fecha = '2024-05-01' WHERE id = (SELECT MAX(id) FROM movimientos)")
+    assert _mes(conn) == '2024-05'
+    assert _versiones(conn)['version_bajas'] == antes + 1
+    conn.execute('UPDATE movimientos SET monto = 50 WHERE id = (SELECT MAX(id) FROM movimientos)')
+    assert _versiones(conn)['version_bajas'] == antes + 2
+    conn.execute('DELETE FROM datos WHERE id = (SELECT MAX(id) FROM movimientos)')
+    assert _versiones(conn)['version_bajas'] == antes + 3
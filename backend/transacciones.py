@@ -0,0 +1,283 @@
+import calendar
+import csv
+import math
+from datetime import date, timedelta
+
+from agregados import leer_fecha
+from db import ACUMULAR_RESUMEN_TRANSACCIONES
+from ingesta import indices_secundarios
+from validacion import REGISTRO_ILEGIBLE, ErrorRegistro
+
+# Columnas públicas de transacciones, en el orden en que se devuelven
+COLUMNAS_TRANSACCIONES = ('id', 'fecha', 'clave_cuenta', 'descripcion', 'monto', 'clave_territorio')
+
+CAMPOS_REQUERIDOS = ('fecha', 'clave_cuenta', 'monto')
+
+INSERTAR_TRANSACCION = '''
+    INSERT INTO transacciones (fecha, clave_cuenta, descripcion, monto, clave_territorio)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# Agrupaciones de /api/transacciones/totales -> columna
+AGRUPACIONES = {'cuenta': 'clave_cuenta', 'territorio': 'clave_territorio'}
+
+# Triggers por fila que importar() reemplaza por una sola sentencia al final de la carga
+TRIGGERS_CARGA = ('trg_version_transacciones_insert', 'trg_resumen_transacciones_insert')
+
+# Filas leídas del CSV por cada lote de importar()
+TAMANO_LOTE = 5000
+
+
+def _clave(valor):
+    # Las claves pueden llegar como número desde JSON o Excel: se guardan siempre como texto
+    if isinstance(valor, str):
+        return valor.strip()
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def validar_transaccion(registro):
+    """Valida y normaliza una transacción. Devuelve la tupla en el orden de INSERTAR_TRANSACCION."""
+    if not isinstance(registro, dict):
+        raise ErrorRegistro(None, 'El registro debe ser un objeto')
+
+    faltantes = [campo for campo in CAMPOS_REQUERIDOS if registro.get(campo) in (None, '')]
+    if faltantes:
+        raise ErrorRegistro(faltantes[0], f'Campos requeridos faltantes: {", ".join(faltantes)}')
+
+    fecha = registro['fecha']
+    try:
+        if len(fecha) != 10:
+            raise ValueError
+        date.fromisoformat(fecha)
+    except (TypeError, ValueError):
+        raise ErrorRegistro('fecha', f'Fecha inválida: {fecha}. Debe tener formato AAAA-MM-DD')
+
+    try:
+        monto = float(registro['monto'])
+    except (TypeError, ValueError):
+        monto = math.nan
+    # Los montos de un libro pueden ser negativos (débitos); solo se rechaza lo que no es un número
+    if not math.isfinite(monto):
+        raise ErrorRegistro('monto', f'Monto inválido: {registro["monto"]}. Debe ser un número')
+
+    clave_cuenta = _clave(registro['clave_cuenta'])
+    if not clave_cuenta:
+        raise ErrorRegistro('clave_cuenta', 'Campos requeridos faltantes: clave_cuenta')
+    territorio = registro.get('clave_territorio')
+    territorio = _clave(territorio) if territorio is not None else ''
+
+    return fecha, clave_cuenta, registro.get('descripcion') or '', monto, territorio or None
+
+
+def validar_lote(registros, primera_fila=1):
+    """Valida una lista de transacciones. Devuelve (filas_validas, errores) con un error por registro rechazado."""
+    filas = []
+    errores = []
+    for numero, registro in enumerate(registros, primera_fila):
+        if registro is REGISTRO_ILEGIBLE:
+            continue
+        try:
+            filas.append(validar_transaccion(registro))
+        except ErrorRegistro as e:
+            errores.append({'fila': numero, 'campo': e.campo, 'error': str(e)})
+    return filas, errores
+
+
+def importar(conn, lotes, diferir_indices=False):
+    """Valida e inserta lotes de transacciones en una única transacción explícita.
+
+    lotes es un iterable de (primera_fila, registros, errores_previos), como los
+    de ingesta.lotes_de_lista y ingesta.lotes_de_ndjson. El resumen y la versión
+    de los datos se actualizan una sola vez al final en lugar de con cada fila,
+    y con diferir_indices también los índices. Devuelve (registros_insertados, errores).
+    """
+    insertados = 0
+    errores = []
+    indices = []
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Dentro de la transacción: ninguna otra conexión ve la tabla sin los triggers
+        triggers = conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+            f" AND name IN ({', '.join('?' * len(TRIGGERS_CARGA))})",
+            TRIGGERS_CARGA,
+        ).fetchall()
+        ultimo_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM transacciones').fetchone()[0]
+        for nombre, _ in triggers:
+            conn.execute(f'DROP TRIGGER "{nombre}"')
+        if diferir_indices:
+            indices = indices_secundarios(conn, 'transacciones')
+            for nombre, _ in indices:
+                conn.execute(f'DROP INDEX "{nombre}"')
+
+        for primera_fila, registros, errores_previos in lotes:
+            filas, errores_lote = validar_lote(registros, primera_fila)
+            errores.extend(errores_previos)
+            errores.extend(errores_lote)
+            if filas:
+                conn.executemany(INSERTAR_TRANSACCION, filas)
+                insertados += len(filas)
+
+        for _, sql in indices:
+            conn.execute(sql)
+        for _, sql in triggers:
+            conn.execute(sql)
+        if insertados:
+            conn.execute(ACUMULAR_RESUMEN_TRANSACCIONES, (ultimo_id,))
+            conn.execute("UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_datos'")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    errores.sort(key=lambda e: e['fila'])
+    return insertados, errores
+
+
+def lotes_de_csv(archivo, tamano=TAMANO_LOTE):
+    """Lee un CSV con encabezado (fecha, clave_cuenta, descripcion, monto, clave_territorio) en lotes para importar()."""
+    lote, primera = [], 1
+    # La fila 1 es la primera transacción (el encabezado no se cuenta)
+    for numero, registro in enumerate(csv.DictReader(archivo), 1):
+        if not lote:
+            primera = numero
+        lote.append(registro)
+        if len(lote) >= tamano:
+            yield primera, lote, []
+            lote = []
+    if lote:
+        yield primera, lote, []
+
+
+def leer_filtros(args):
+    """Arma el WHERE (sin la palabra WHERE) de clave_cuenta, clave_territorio, desde y hasta. Lanza ValueError si son inválidos."""
+    condiciones, valores = [], []
+    for columna in ('clave_cuenta', 'clave_territorio'):
+        if args.get(columna):
+            condiciones.append(f'{columna} = ?')
+            valores.append(args[columna])
+    for parametro, condicion in (('desde', 'fecha >= ?'), ('hasta', 'fecha <= ?')):
+        if args.get(parametro):
+            condiciones.append(condicion)
+            valores.append(leer_fecha(args[parametro], parametro))
+    return ' AND '.join(condiciones) or None, valores
+
+
+def leer_agrupacion(args):
+    """Lee el parámetro por (cuenta, territorio o ambos separados por coma). Lanza ValueError si es inválido."""
+    por = tuple(v.strip() for v in args.get('por', 'cuenta').split(',') if v.strip())
+    invalidos = [v for v in por if v not in AGRUPACIONES]
+    if invalidos or not por:
+        raise ValueError(f'por inválido: {", ".join(invalidos)}. Debe ser de: {", ".join(AGRUPACIONES)}')
+    if len(set(por)) != len(por):
+        raise ValueError('por tiene valores repetidos')
+    return por
+
+
+def leer_totales(args):
+    """Lee por, clave_cuenta, clave_territorio, desde y hasta. Lanza ValueError si son inválidos."""
+    filtros = {columna: args[columna] for columna in ('clave_cuenta', 'clave_territorio') if args.get(columna)}
+    desde = leer_fecha(args['desde'], 'desde') if args.get('desde') else None
+    hasta = leer_fecha(args['hasta'], 'hasta') if args.get('hasta') else None
+    return leer_agrupacion(args), filtros, desde, hasta
+
+
+def dividir_rango(desde, hasta):
+    """Divide [desde, hasta] en meses completos y los días sueltos de los bordes.
+
+    Devuelve ((primer_mes, ultimo_mes) o None si no hay meses completos, [(desde, hasta) de cada borde]).
+    Un límite None deja el rango abierto de ese lado.
+    """
+    primer_mes = ultimo_mes = None
+    bordes = []
+    if desde:
+        inicio = date.fromisoformat(desde)
+        if inicio.day == 1:
+            primer_mes = desde[:7]
+        else:
+            fin_mes = inicio.replace(day=calendar.monthrange(inicio.year, inicio.month)[1])
+            bordes.append((desde, min(fin_mes.isoformat(), hasta) if hasta else fin_mes.isoformat()))
+            primer_mes = f'{fin_mes + timedelta(days=1):%Y-%m}'
+    if hasta:
+        fin = date.fromisoformat(hasta)
+        if fin.day == calendar.monthrange(fin.year, fin.month)[1]:
+            ultimo_mes = hasta[:7]
+        else:
+            inicio_mes = fin.replace(day=1)
+            # Si desde cae en el mismo mes, el primer borde ya cubre hasta `hasta`
+            if not (bordes and desde[:7] == hasta[:7]):
+                bordes.append((max(inicio_mes.isoformat(), desde) if desde else inicio_mes.isoformat(), hasta))
+            ultimo_mes = f'{inicio_mes - timedelta(days=1):%Y-%m}'
+    if primer_mes and ultimo_mes and primer_mes > ultimo_mes:
+        return None, bordes
+    return (primer_mes, ultimo_mes), bordes
+
+
+def totales(conn, por, filtros, desde=None, hasta=None):
+    """Suma y cantidad de transacciones por cada grupo de `por`, más el total general.
+
+    Los meses completos del rango se leen de resumen_transacciones (una fila por
+    cuenta, territorio y mes) y solo los días sueltos de los bordes de
+    transacciones, con una búsqueda por rango en un índice de cobertura. Cada
+    parte se agrupa por separado y los resultados se vuelven a sumar.
+    """
+    columnas = [AGRUPACIONES[p] for p in por]
+    posiciones = ', '.join(str(i) for i in range(1, len(columnas) + 1))
+    meses, bordes = dividir_rango(desde, hasta)
+    partes, valores, fuentes = [], [], []
+
+    def parte(origen, seleccion, medidas, limites):
+        condiciones = [f'{columna} = ?' for columna in filtros] + [c for c, v in limites if v]
+        valores.extend(filtros.values())
+        valores.extend(v for _, v in limites if v)
+        donde = ' WHERE ' + ' AND '.join(condiciones) if condiciones else ''
+        partes.append(f'SELECT {", ".join(seleccion)}, {medidas} FROM {origen}{donde} GROUP BY {posiciones}')
+
+    if meses is not None:
+        fuentes.append('resumen_transacciones')
+        parte('resumen_transacciones', columnas, 'SUM(total) AS total, SUM(cantidad) AS cantidad',
+              (('mes >= ?', meses[0]), ('mes <= ?', meses[1])))
+    if bordes:
+        fuentes.append('transacciones')
+    # El resumen guarda '' para las transacciones sin territorio
+    seleccion = [f"IFNULL({c}, '') AS {c}" if c == 'clave_territorio' else c for c in columnas]
+    for inicio, fin in bordes:
+        parte('transacciones', seleccion, 'SUM(monto) AS total, COUNT(*) AS cantidad',
+              (('fecha >= ?', inicio), ('fecha <= ?', fin)))
+
+    grupos = []
+    if partes:
+        seleccion = [f"NULLIF({c}, '') AS {c}" if c == 'clave_territorio' else c for c in columnas]
+        sql = (
+            f'SELECT {", ".join(seleccion)}, SUM(total) AS total, SUM(cantidad) AS cantidad'
+            f' FROM ({" UNION ALL ".join(partes)}) GROUP BY {posiciones} ORDER BY {posiciones}'
+        )
+        grupos = [dict(fila) for fila in conn.execute(sql, valores)]
+    return {
+        'fuentes': fuentes,
+        'grupos': grupos,
+        'total': sum(g['total'] for g in grupos),
+        'cantidad': sum(g['cantidad'] for g in grupos),
+    }
+
+
+if __name__ == '__main__':
+    import sys
+
+    from db import conectar
+    from migraciones import migrar
+
+    if len(sys.argv) not in (3, 4) or sys.argv[1] != 'cargar' or sys.argv[3:] not in ([], ['--diferir-indices']):
+        print("Uso: python transacciones.py cargar <archivo.csv> [--diferir-indices]")
+        sys.exit(1)
+
+    migrar()
+    conn = conectar()
+    with open(sys.argv[2], newline='', encoding='utf-8-sig') as archivo:
+        insertados, errores = importar(conn, lotes_de_csv(archivo), diferir_indices=len(sys.argv) == 4)
+    conn.close()
+    for error in errores:
+        print(f"Error en fila {error['fila']}: {error['error']}")
+    print(f"Transacciones cargadas: {insertados}, con errores: {len(errores)}")
@@ -0,0 +1,263 @@
+import math
+import re
+from datetime import date
+from functools import lru_cache
+
+from parametros import PARAMETROS
+
+# Cuotas permitidas en un registro o plan (POST, cargas masivas, import_excel y edición de planes)
+MAX_CUOTAS = 36
+
+CAMPOS_REQUERIDOS = ('fecha', 'tipo', 'categoria', 'subcategoria', 'metodoPago', 'monto')
+
+# Orden de los valores que devuelve EsquemaValidacion.validar (y de las columnas de INSERT)
+COLUMNAS_INSERCION = ('fecha', 'tipo', 'categoria', 'subcategoria', 'metodoPago', 'monto', 'detalle', 'cuotas', 'mes')
+
+# Ocupa en un lote el lugar de una línea NDJSON que no se pudo decodificar, cuyo error ya se
+# informó. Un null del JSON es un registro más y se rechaza como cualquier otro que no sea objeto
+REGISTRO_ILEGIBLE = object()
+
+# Caracteres acentuados y guiones tipográficos -> equivalente sin acento
+_SIN_ACENTO = {
+    'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u', 'ñ': 'n', 'ü': 'u',
+    'Á': 'A', 'É': 'E', 'Í': 'I', 'Ó': 'O', 'Ú': 'U', 'Ñ': 'N', 'Ü': 'U',
+    '–': '-', '—': '-',
+}
+_TABLA_SIN_ACENTO = str.maketrans(_SIN_ACENTO)
+
+# Las mismas letras leídas como UTF-8 mal decodificado (cp1252 o latin-1), p. ej. 'Ã¡' o 'â€“'
+_MOJIBAKE = {}
+for _caracter, _reemplazo in _SIN_ACENTO.items():
+    for _codificacion in ('cp1252', 'latin-1'):
+        try:
+            _MOJIBAKE[_caracter.encode('utf-8').decode(_codificacion)] = _reemplazo
+        except UnicodeDecodeError:
+            pass
+_PATRON_MOJIBAKE = re.compile('|'.join(re.escape(s) for s in sorted(_MOJIBAKE, key=len, reverse=True)))
+
+
+def normalizar_texto(texto):
+    """Normaliza el texto para manejar problemas de codificación y acentos."""
+    if not texto:
+        return texto
+    # Todas las secuencias mal decodificadas empiezan con 'Ã' o 'â'
+    if 'Ã' in texto or 'â' in texto:
+        texto = _PATRON_MOJIBAKE.sub(lambda m: _MOJIBAKE[m.group()], texto)
+    return texto.translate(_TABLA_SIN_ACENTO)
+
+
+def leer_cuotas(valor):
+    """Cantidad de cuotas como entero de 1 a MAX_CUOTAS: vacío es una cuota; acepta 3, 3.0 y '3.0', no 0 ni 2.5.
+
+    Es la regla de validar(); validar_dataframe() aplica la misma con pandas. Lanza ValueError.
+    """
+    # NaN es la celda vacía de pandas
+    if valor is None or valor == '' or valor != valor:
+        return 1
+    if isinstance(valor, str):
+        valor = float(valor)
+    elif not isinstance(valor, (int, float)):
+        raise ValueError(valor)
+    if not math.isfinite(valor) or valor != int(valor) or not 1 <= valor <= MAX_CUOTAS:
+        raise ValueError(valor)
+    return int(valor)
+
+
+class ErrorRegistro(ValueError):
+    """Error de validación de un registro, con el campo que lo provocó."""
+
+    def __init__(self, campo, mensaje):
+        super().__init__(mensaje)
+        self.campo = campo
+
+
+class EsquemaValidacion:
+    """Reglas de validación compiladas una vez a partir de PARAMETROS.
+
+    validar() valida un registro (dict) y validar_dataframe() aplica las mismas
+    reglas a un DataFrame completo con operaciones vectorizadas.
+    """
+
+    def __init__(self, parametros):
+        self.tipos = frozenset(parametros['tipos'])
+        self.categorias = frozenset(parametros['categorias'])
+        self.cuentas = frozenset(parametros['cuentas'])
+        self.subcategorias = {cat: frozenset(subcats) for cat, subcats in parametros['subcategorias'].items()}
+        self.pares = frozenset(
+            f'{cat}|{subcat}' for cat, subcats in parametros['subcategorias'].items() for subcat in subcats
+        )
+        self._lista_tipos = ', '.join(parametros['tipos'])
+        self._lista_categorias = ', '.join(parametros['categorias'])
+        self._lista_cuentas = ', '.join(parametros['cuentas'])
+        self._lista_subcategorias = {cat: ', '.join(subcats) for cat, subcats in parametros['subcategorias'].items()}
+        # Categorías, subcategorías y cuentas se repiten: cada valor distinto se normaliza una vez
+        self.normalizar = lru_cache(maxsize=4096)(normalizar_texto)
+
+    def validar(self, registro):
+        """Valida y normaliza un registro. Devuelve una tupla en el orden de COLUMNAS_INSERCION."""
+        if not isinstance(registro, dict):
+            raise ErrorRegistro(None, 'El registro debe ser un objeto')
+
+        faltantes = [campo for campo in CAMPOS_REQUERIDOS if not registro.get(campo)]
+        if faltantes:
+            raise ErrorRegistro(faltantes[0], f'Campos requeridos faltantes: {", ".join(faltantes)}')
+
+        tipo = registro['tipo']
+        if not isinstance(tipo, str):
+            raise ErrorRegistro('tipo', f'Tipo inválido: {tipo}. Debe ser uno de: {self._lista_tipos}')
+        try:
+            categoria = self.normalizar(registro['categoria'])
+            subcategoria = self.normalizar(registro['subcategoria'])
+            metodo_pago = self.normalizar(registro['metodoPago'])
+        except (AttributeError, TypeError):
+            raise ErrorRegistro(None, 'categoria, subcategoria y metodoPago deben ser texto')
+
+        fecha = registro['fecha']
+        try:
+            # Python 3.11 acepta otras variantes ISO (20240320); se exige AAAA-MM-DD
+            if len(fecha) != 10:
+                raise ValueError
+            date.fromisoformat(fecha)
+        except (TypeError, ValueError):
+            raise ErrorRegistro('fecha', f'Fecha inválida: {fecha}. Debe tener formato AAAA-MM-DD')
+
+        if tipo not in self.tipos:
+            raise ErrorRegistro('tipo', f'Tipo inválido: {tipo}. Debe ser uno de: {self._lista_tipos}')
+
+        if categoria not in self.categorias:
+            raise ErrorRegistro('categoria', f'Categoría inválida: {categoria}. Debe ser una de: {self._lista_categorias}')
+
+        if subcategoria not in self.subcategorias[categoria]:
+            raise ErrorRegistro(
+                'subcategoria',
+                f'Subcategoría inválida: {subcategoria}. Para la categoría {categoria}, '
+                f'debe ser una de: {self._lista_subcategorias[categoria]}'
+            )
+
+        if metodo_pago not in self.cuentas:
+            raise ErrorRegistro('metodoPago', f'Método de pago inválido: {metodo_pago}. Debe ser uno de: {self._lista_cuentas}')
+
+        try:
+            monto = float(registro['monto'])
+        except (TypeError, ValueError):
+            monto = 0.0
+        # inf pasaría como positivo y dejaría Infinity en resumen_mes y en las respuestas JSON
+        if not (monto > 0 and math.isfinite(monto)):
+            raise ErrorRegistro('monto', f'Monto inválido: {registro["monto"]}. Debe ser un número mayor a 0')
+
+        try:
+            cuotas = leer_cuotas(registro.get('cuotas'))
+        except ValueError:
+            raise ErrorRegistro(
+                'cuotas', f'Cuotas inválidas: {registro.get("cuotas")}. Debe ser un entero entre 1 y {MAX_CUOTAS}')
+
+        return (fecha, tipo, categoria, subcategoria, metodo_pago, monto,
+                registro.get('detalle') or '', cuotas, fecha[:7])
+
+    def validar_lote(self, registros, primera_fila=1):
+        """Valida una lista de registros. Devuelve (filas_validas, errores) con un error por registro rechazado."""
+        filas = []
+        errores = []
+        for numero, registro in enumerate(registros, primera_fila):
+            if registro is REGISTRO_ILEGIBLE:
+                continue
+            try:
+                filas.append(self.validar(registro))
+            except ErrorRegistro as e:
+                errores.append({'fila': numero, 'campo': e.campo, 'error': str(e)})
+        return filas, errores
+
+    def normalizar_serie(self, serie):
+        """Normaliza una columna de texto aplicando normalizar_texto una vez por valor distinto."""
+        return serie.map({valor: self.normalizar(str(valor)) for valor in serie.dropna().unique()})
+
+    def validar_dataframe(self, df, primera_fila=1):
+        """Versión vectorizada de validar para un DataFrame.
+
+        Devuelve (validas, errores): validas es un DataFrame con las columnas de
+        COLUMNAS_INSERCION y solo las filas correctas; errores es una lista con el
+        primer error de cada fila rechazada, numerada desde primera_fila.
+        """
+        import numpy as np
+        import pandas as pd
+
+        faltantes = [col for col in CAMPOS_REQUERIDOS if col not in df.columns]
+        if faltantes:
+            raise ErrorRegistro(faltantes[0], f'Faltan las siguientes columnas: {", ".join(faltantes)}')
+
+        # Las fechas se aceptan en cualquier formato que pandas reconozca y se llevan a AAAA-MM-DD
+        fecha_original = df['fecha']
+        fecha = pd.to_datetime(fecha_original, errors='coerce').dt.strftime('%Y-%m-%d')
+        monto = pd.to_numeric(df['monto'], errors='coerce')
+        categoria = self.normalizar_serie(df['categoria'])
+        subcategoria = self.normalizar_serie(df['subcategoria'])
+        metodo_pago = self.normalizar_serie(df['metodoPago'])
+        tipo = df['tipo']
+        if 'cuotas' in df.columns:
+            # Misma regla que leer_cuotas: vacío es una cuota; el resto, un entero entre 1 y MAX_CUOTAS
+            cuotas_original = df['cuotas']
+            cuotas_vacias = cuotas_original.isna() | (cuotas_original == '')
+            cuotas = pd.to_numeric(cuotas_original.mask(cuotas_vacias), errors='coerce')
+            cuotas_invalidas = ~cuotas_vacias & ~((cuotas % 1 == 0) & cuotas.between(1, MAX_CUOTAS))
+            cuotas = cuotas.where(~cuotas_vacias & ~cuotas_invalidas, 1).astype('int64')
+        else:
+            cuotas = pd.Series(1, index=df.index)
+            cuotas_invalidas = pd.Series(False, index=df.index)
+        detalle = df['detalle'].fillna('').astype(str) if 'detalle' in df.columns else pd.Series('', index=df.index)
+
+        cuotas_texto = df['cuotas'] if 'cuotas' in df.columns else cuotas
+        # Los mensajes se arman solo para las filas que fallan (m es la máscara de esas filas)
+        texto = lambda serie, m: serie[m].astype(str)
+        reglas = [
+            ('fecha', fecha.isna(), lambda m:
+             'Fecha inválida: ' + texto(fecha_original, m) + '. Debe tener formato AAAA-MM-DD'),
+            ('tipo', ~tipo.isin(self.tipos), lambda m:
+             'Tipo inválido: ' + texto(tipo, m) + f'. Debe ser uno de: {self._lista_tipos}'),
+            ('categoria', ~categoria.isin(self.categorias), lambda m:
+             'Categoría inválida: ' + texto(categoria, m) + f'. Debe ser una de: {self._lista_categorias}'),
+            ('subcategoria', ~(categoria + '|' + subcategoria).isin(self.pares), lambda m:
+             'Subcategoría inválida: ' + texto(subcategoria, m) + '. Para la categoría ' + texto(categoria, m)
+             + ', debe ser una subcategoría válida'),
+            ('metodoPago', ~metodo_pago.isin(self.cuentas), lambda m:
+             'Método de pago inválido: ' + texto(metodo_pago, m) + f'. Debe ser uno de: {self._lista_cuentas}'),
+            ('monto', ~((monto > 0) & np.isfinite(monto)), lambda m:
+             'Monto inválido: ' + texto(df['monto'], m) + '. Debe ser un número mayor a 0'),
+            ('cuotas', cuotas_invalidas, lambda m:
+             'Cuotas inválidas: ' + texto(cuotas_texto, m) + f'. Debe ser un entero entre 1 y {MAX_CUOTAS}'),
+        ]
+        # Los campos vacíos (o 0, como en validar()) se informan antes que cualquier otra regla
+        vacios = pd.DataFrame({col: ~df[col].fillna('').astype(bool) for col in CAMPOS_REQUERIDOS})
+        hay_vacios = vacios.any(axis=1)
+
+        rechazadas = hay_vacios.copy()
+        campo_error = pd.Series(None, index=df.index, dtype=object)
+        mensaje_error = pd.Series(None, index=df.index, dtype=object)
+        if hay_vacios.any():
+            nombres = vacios[hay_vacios].apply(lambda fila: ', '.join(fila.index[fila]), axis=1)
+            campo_error[hay_vacios] = nombres.str.split(', ').str[0]
+            mensaje_error[hay_vacios] = 'Campos requeridos faltantes: ' + nombres
+        for campo, falla, mensaje in reglas:
+            nuevas = falla & ~rechazadas
+            if nuevas.any():
+                campo_error[nuevas] = campo
+                mensaje_error[nuevas] = mensaje(nuevas)
+                rechazadas |= nuevas
+
+        posiciones = pd.Series(range(primera_fila, primera_fila + len(df)), index=df.index)
+        errores = [
+            {'fila': fila, 'campo': campo, 'error': mensaje}
+            for fila, campo, mensaje in zip(
+                posiciones[rechazadas].tolist(), campo_error[rechazadas].tolist(), mensaje_error[rechazadas].tolist()
+            )
+        ]
+
+        validas = pd.DataFrame({
+            'fecha': fecha, 'tipo': tipo, 'categoria': categoria, 'subcategoria': subcategoria,
+            'metodoPago': metodo_pago, 'monto': monto, 'detalle': detalle, 'cuotas': cuotas,
+            'mes': fecha.str[:7],
+        })[~rechazadas]
+        return validas, errores
+
+
+# Esquema compartido por POST /api/datos, /api/datos/bulk e import_excel.py
+esquema = EsquemaValidacion(PARAMETROS)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   PieChart, Pie, Cell, BarChart, Bar, AreaChart, Area,
   XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, LabelList
@@ -30,63 +30,35 @@ function getMonthString(mes) {
 
 export default function Dashboard() {
   const [resumen, setResumen] = useState([]);
-  const [datos, setDatos] = useState([]);
+  const [resumenIngresos, setResumenIngresos] = useState([]);
+  const [resumenEgresos, setResumenEgresos] = useState([]);
   const [parametros, setParametros] = useState({ categorias: [], subcategorias: {} });
   const [meses, setMeses] = useState([]);
   const [mesSeleccionado, setMesSeleccionado] = useState('');
   const [loading, setLoading] = useState(true);
+  const mesCargado = useRef(null);
 
+  // Una sola petición: resumen mensual, totales por subcategoría del mes y parámetros vienen calculados del servidor
   useEffect(() => {
-    Promise.all([
-      fetch('http://localhost:5000/api/resumen-mensual').then(res => res.json()),
-      fetch('http://localhost:5000/api/datos').then(res => res.json()),
-      fetch('http://localhost:5000/api/parametros').then(res => res.json())
-    ]).then(([dataResumen, dataDatos, dataParametros]) => {
-      setResumen(dataResumen);
-      setDatos(dataDatos);
-      setParametros(dataParametros);
-      const mesesUnicos = dataResumen.filter(r => r.mes).map(r => r.mes);
-      setMeses(mesesUnicos);
-      setMesSeleccionado(mesesUnicos[0] || '');
-      setLoading(false);
-    });
-  }, []);
-
-  // Función para normalizar cadenas (quita tildes, pasa a minúsculas y quita espacios)
-  const normalizar = s => (s || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '').toLowerCase().trim();
+    // El primer snapshot ya trae el mes más reciente: no se vuelve a pedir al seleccionarlo
+    if (mesSeleccionado && mesSeleccionado === mesCargado.current) return;
+    const consulta = mesSeleccionado ? `?mes=${mesSeleccionado}` : '';
+    fetch(`http://localhost:5000/api/dashboard${consulta}`)
+      .then(res => res.json())
+      .then(snapshot => {
+        setResumen(snapshot.resumen);
+        setResumenIngresos(snapshot.ingresos);
+        setResumenEgresos(snapshot.egresos);
+        setParametros(snapshot.parametros);
+        setMeses(snapshot.resumen.filter(r => r.mes).map(r => r.mes));
+        mesCargado.current = snapshot.mes;
+        if (!mesSeleccionado && snapshot.mes) setMesSeleccionado(snapshot.mes);
+        setLoading(false);
+      });
+  }, [mesSeleccionado]);
 
-  // Filtrar registros por mes seleccionado
-  const registrosMes = datos.filter(r => {
-    if (!r.fecha || !mesSeleccionado) return false;
-    const [anio, mes] = r.fecha.split(/[-/]/);
-    return `${anio}-${mes.padStart(2, '0')}` === mesSeleccionado;
-  });
-
-  // Agrupar ingresos (Ingresos y Ahorros)
-  const ingresos = registrosMes.filter(r => {
-    const cat = normalizar(r.categoria);
-    return cat === 'ingresos' || cat === 'ahorros';
-  });
-  const ingresosPorSubcat = {};
-  ingresos.forEach(r => {
-    const subcat = (r.subcategoria || 'Sin subcategoría').trim();
-    if (!ingresosPorSubcat[subcat]) ingresosPorSubcat[subcat] = 0;
-    ingresosPorSubcat[subcat] += parseFloat(r.monto);
-  });
-  const resumenIngresos = Object.entries(ingresosPorSubcat).map(([subcat, monto]) => ({ subcategoria: subcat, monto }));
-
-  // Agrupar egresos (Gastos básicos y Gastos deseo)
-  const egresos = registrosMes.filter(r => {
-    const cat = normalizar(r.categoria);
-    return cat === 'gastos basicos' || cat === 'gastos deseo';
-  });
-  const egresosPorSubcat = {};
-  egresos.forEach(r => {
-    const subcat = (r.subcategoria || 'Sin subcategoría').trim();
-    if (!egresosPorSubcat[subcat]) egresosPorSubcat[subcat] = 0;
-    egresosPorSubcat[subcat] += parseFloat(r.monto);
-  });
-  const resumenEgresos = Object.entries(egresosPorSubcat).map(([subcat, monto]) => ({ subcategoria: subcat, monto }));
+  const ingresosPorSubcat = Object.fromEntries(resumenIngresos.map(r => [r.subcategoria, r.monto]));
+  const egresosPorSubcat = Object.fromEntries(resumenEgresos.map(r => [r.subcategoria, r.monto]));
 
   // Para gráfico de área: ingresos vs egresos
   const datosMes = resumen.find(r => r.mes === mesSeleccionado) || {};
@@ -1,48 +1,110 @@
 import React, { useEffect, useState } from 'react';
 import axios from 'axios';
 
+const API = 'http://localhost:5000/api/transacciones';
+
+// Últimas transacciones que se muestran debajo de los totales
+const ULTIMAS = 20;
+
+const estiloTabla = { width: '100%', backgroundColor: 'rgba(0,0,0,0.5)', borderRadius: '12px', marginBottom: '2rem' };
+
+function TablaTotales({ titulo, columna, totales }) {
+  return (
+    <table style={estiloTabla}>
+      <thead>
+        <tr>
+          <th>{titulo}</th>
+          <th>Transacciones</th>
+          <th>Total</th>
+        </tr>
+      </thead>
+      <tbody>
+        {totales.grupos.map((grupo) => (
+          <tr key={grupo[columna] ?? ''}>
+            <td>{grupo[columna] ?? 'Sin asignar'}</td>
+            <td>{grupo.cantidad}</td>
+            <td>{grupo.total.toFixed(2)}</td>
+          </tr>
+        ))}
+        <tr>
+          <td><strong>Total</strong></td>
+          <td><strong>{totales.cantidad}</strong></td>
+          <td><strong>{totales.total.toFixed(2)}</strong></td>
+        </tr>
+      </tbody>
+    </table>
+  );
+}
+
 export default function FinancialOverviewDashboard() {
-  const [data, setData] = useState([]);
+  const [desde, setDesde] = useState('');
+  const [hasta, setHasta] = useState('');
+  const [porCuenta, setPorCuenta] = useState(null);
+  const [porTerritorio, setPorTerritorio] = useState(null);
+  const [ultimas, setUltimas] = useState([]);
 
   useEffect(() => {
-    axios.get('http://localhost:5000/api/transacciones')
-      .then(response => {
-        setData(response.data);
+    // Los totales se calculan en el servidor: solo viaja una fila por cuenta o territorio
+    const rango = {};
+    if (desde) rango.desde = desde;
+    if (hasta) rango.hasta = hasta;
+    Promise.all([
+      axios.get(`${API}/totales`, { params: { por: 'cuenta', ...rango } }),
+      axios.get(`${API}/totales`, { params: { por: 'territorio', ...rango } }),
+      axios.get(API, { params: { limit: ULTIMAS, ...rango } }),
+    ])
+      .then(([cuentas, territorios, recientes]) => {
+        setPorCuenta(cuentas.data);
+        setPorTerritorio(territorios.data);
+        setUltimas(recientes.data);
       })
       .catch(error => {
         console.error('Error al obtener datos:', error);
       });
-  }, []);
+  }, [desde, hasta]);
 
   return (
     <div style={{ backgroundImage: "url('/Finanzaempresarial.jpg')", backgroundSize: 'cover', minHeight: '100vh', padding: '2rem', color: '#fff' }}>
       <h1 style={{ textAlign: 'center', marginBottom: '2rem' }}>Dashboard Empresarial</h1>
-      {data.length === 0 ? (
+      <div style={{ display: 'flex', gap: '1rem', justifyContent: 'center', marginBottom: '2rem' }}>
+        <label>
+          Desde <input type="date" value={desde} onChange={(e) => setDesde(e.target.value)} />
+        </label>
+        <label>
+          Hasta <input type="date" value={hasta} onChange={(e) => setHasta(e.target.value)} />
+        </label>
+      </div>
+      {!porCuenta || !porTerritorio ? (
         <p>Cargando datos...</p>
       ) : (
-        <table style={{ width: '100%', backgroundColor: 'rgba(0,0,0,0.5)', borderRadius: '12px' }}>
-          <thead>
-            <tr>
-              <th>Fecha</th>
-              <th>Cuenta</th>
-              <th>Descripción</th>
-              <th>Monto</th>
-              <th>Territorio</th>
-            </tr>
-          </thead>
-          <tbody>
-            {data.map((registro, index) => (
-              <tr key={index}>
-                <td>{registro.fecha}</td>
-                <td>{registro.clave_cuenta}</td>
-                <td>{registro.descripcion}</td>
-                <td>{registro.monto}</td>
-                <td>{registro.clave_territorio}</td>
+        <>
+          <TablaTotales titulo="Cuenta" columna="clave_cuenta" totales={porCuenta} />
+          <TablaTotales titulo="Territorio" columna="clave_territorio" totales={porTerritorio} />
+          <h2>Últimas transacciones</h2>
+          <table style={estiloTabla}>
+            <thead>
+              <tr>
+                <th>Fecha</th>
+                <th>Cuenta</th>
+                <th>Descripción</th>
+                <th>Monto</th>
+                <th>Territorio</th>
               </tr>
-            ))}
-          </tbody>
-        </table>
+            </thead>
+            <tbody>
+              {ultimas.map((registro) => (
+                <tr key={registro.id}>
+                  <td>{registro.fecha}</td>
+                  <td>{registro.clave_cuenta}</td>
+                  <td>{registro.descripcion}</td>
+                  <td>{registro.monto}</td>
+                  <td>{registro.clave_territorio}</td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        </>
       )}
     </div>
   );
-}
\ No newline at end of file
+}
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import DatePicker from 'react-datepicker';
 import 'react-datepicker/dist/react-datepicker.css';
 import * as XLSX from 'xlsx';
@@ -29,6 +29,9 @@ function RegistroForm() {
   const [error, setError] = useState(null);
   const [loading, setLoading] = useState(true);
 
+  // Revisión de los registros cargados: al refrescar se piden solo los cambios posteriores
+  const revisionRef = useRef(null);
+
   // Función para cargar parámetros y registros completos
   const cargarDatosIniciales = async () => {
     setLoading(true);
@@ -50,6 +53,7 @@ function RegistroForm() {
         throw new Error(`Error al cargar registros: ${resAll.statusText}`);
       }
       const listaRegistros = await resAll.json();
+      revisionRef.current = resAll.headers.get('X-Revision');
       console.log('Registros cargados:', listaRegistros);
 
       setParametros({
@@ -333,10 +337,46 @@ function RegistroForm() {
     XLSX.writeFile(wb, "registros_financieros.xlsx");
   };
 
-  // Modificar refrescarRegistros para ajustar el rango de fechas
-  const refrescarRegistros = async () => {
+  // Vuelve a cargar todos los registros (si no hay revisión o el servidor no puede dar los cambios)
+  const recargarRegistros = async () => {
     const resAll = await fetch(`${API_BASE_URL}/api/datos`);
     const listaRegistros = await resAll.json();
+    revisionRef.current = resAll.headers.get('X-Revision');
+    setAllDatos(listaRegistros);
+    ajustarRangoFechas(listaRegistros);
+  };
+
+  // Aplica sobre allDatos solo los registros agregados, modificados o eliminados desde la última carga
+  const refrescarRegistros = async () => {
+    if (revisionRef.current === null) {
+      await recargarRegistros();
+      return;
+    }
+    const porId = new Map(allDatos.map(r => [r.id, r]));
+    let desde = revisionRef.current;
+    let hayMas = true;
+    let huboCambios = false;
+    while (hayMas) {
+      const res = await fetch(`${API_BASE_URL}/api/datos/cambios?desde=${desde}`);
+      if (!res.ok) {
+        await recargarRegistros();
+        return;
+      }
+      const cambios = await res.json();
+      // Cada página se aplica en orden: un registro puede volver a aparecer, ya eliminado, en la siguiente
+      cambios.eliminados.forEach(id => porId.delete(id));
+      cambios.registros.forEach(r => porId.set(r.id, r));
+      huboCambios = huboCambios || cambios.registros.length > 0 || cambios.eliminados.length > 0;
+      desde = cambios.revision;
+      hayMas = cambios.hay_mas;
+    }
+    revisionRef.current = desde;
+    if (!huboCambios) return;
+
+    // Mismo orden que /api/datos: fecha e id descendentes
+    const listaRegistros = Array.from(porId.values()).sort(
+      (a, b) => (a.fecha < b.fecha) - (a.fecha > b.fecha) || b.id - a.id
+    );
     setAllDatos(listaRegistros);
     ajustarRangoFechas(listaRegistros);
   };
@@ -495,7 +535,7 @@ function RegistroForm() {
                       <td>{r.categoria}</td>
                       <td>{r.subcategoria}</td>
                       <td>${parseFloat(r.monto).toFixed(2)}</td>
-                      <td>{r.cuotas}</td>
+                      <td>{r.numero_cuota ? `${r.numero_cuota}/${r.cuotas}` : r.cuotas}</td>
                       <td>{r.detalle}</td>
                     </tr>
                   ))
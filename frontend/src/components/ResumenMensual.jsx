@@ -6,8 +6,7 @@ const ResumenMensual = () => {
     const [error, setError] = useState(null);
     const [mesSeleccionado, setMesSeleccionado] = useState('');
     const [meses, setMeses] = useState([]);
-    const [subcatIngresos, setSubcatIngresos] = useState([]);
-    const [subcatEgresos, setSubcatEgresos] = useState([]);
+    const [subcategoriasPorMes, setSubcategoriasPorMes] = useState({});
     const [loadingSubcats, setLoadingSubcats] = useState(false);
 
     // Función para normalizar cadenas (quita tildes, pasa a minúsculas y quita espacios)
@@ -41,17 +40,18 @@ const ResumenMensual = () => {
         cargarResumen();
     }, []);
 
+    // Desglose de todos los meses en una sola petición; cambiar de mes ya no consulta al servidor
     useEffect(() => {
-        if (!mesSeleccionado) return;
+        if (meses.length === 0) return;
         setLoadingSubcats(true);
-        Promise.all([
-            fetch(`http://localhost:5000/api/resumen-subcategorias-ingresos?mes=${mesSeleccionado}`).then(r => r.json()),
-            fetch(`http://localhost:5000/api/resumen-subcategorias-egresos?mes=${mesSeleccionado}`).then(r => r.json())
-        ]).then(([ing, egr]) => {
-            setSubcatIngresos(ing);
-            setSubcatEgresos(egr);
-        }).finally(() => setLoadingSubcats(false));
-    }, [mesSeleccionado]);
+        fetch(`http://localhost:5000/api/resumen-subcategorias?desde=${meses[meses.length - 1]}&hasta=${meses[0]}`)
+            .then(r => r.json())
+            .then(setSubcategoriasPorMes)
+            .finally(() => setLoadingSubcats(false));
+    }, [meses]);
+
+    const subcatIngresos = subcategoriasPorMes[mesSeleccionado]?.ingresos || [];
+    const subcatEgresos = subcategoriasPorMes[mesSeleccionado]?.egresos || [];
 
     const formatoMoneda = (valor) => {
         return new Intl.NumberFormat('es-AR', {